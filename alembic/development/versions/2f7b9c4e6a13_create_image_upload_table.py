@@ -0,0 +1,46 @@
+"""create image_upload table
+
+Revision ID: 2f7b9c4e6a13
+Revises: 8d2e4b7a1f05
+Create Date: 2026-10-18 14:05:41.277310
+
+Uploads stored before this revision are indexed by running, once upgraded:
+    python -m app.commands.reconcile_upload_index
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2f7b9c4e6a13"
+down_revision: Union[str, None] = "8d2e4b7a1f05"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+INDEX_NAME = "ix_image_upload_user_id_uploaded_at_id"
+
+
+def upgrade() -> None:
+    op.create_table(
+        "image_upload",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.String, nullable=False),
+        sa.Column("s3_key", sa.String, nullable=False, unique=True),
+        sa.Column("content_hash", sa.String(64), nullable=False),
+        sa.Column("size", sa.BigInteger, nullable=False),
+        sa.Column("width", sa.Integer, nullable=True),
+        sa.Column("height", sa.Integer, nullable=True),
+        sa.Column(
+            "uploaded_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+    )
+    op.create_index(INDEX_NAME, "image_upload", ["user_id", "uploaded_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index(INDEX_NAME, table_name="image_upload")
+    op.drop_table("image_upload")
@@ -0,0 +1,31 @@
+"""create background_lease table
+
+Revision ID: 4c8e2a6f1b93
+Revises: 9e4a7c2d5b18
+Create Date: 2026-10-18 19:02:17.536104
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4c8e2a6f1b93"
+down_revision: Union[str, None] = "9e4a7c2d5b18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "background_lease",
+        sa.Column("name", sa.String, primary_key=True),
+        sa.Column("holder", sa.String, nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("background_lease")
@@ -0,0 +1,26 @@
+"""add thumbnail_sizes to image_upload
+
+Revision ID: 6b1e3d8f2c47
+Revises: 2f7b9c4e6a13
+Create Date: 2026-10-18 17:02:13.641905
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6b1e3d8f2c47"
+down_revision: Union[str, None] = "2f7b9c4e6a13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("image_upload", sa.Column("thumbnail_sizes", sa.JSON, nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("image_upload", "thumbnail_sizes")
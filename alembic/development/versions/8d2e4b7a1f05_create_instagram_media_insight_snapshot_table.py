@@ -0,0 +1,49 @@
+"""create instagram_media_insight_snapshot table
+
+Revision ID: 8d2e4b7a1f05
+Revises: c3f1a9d27e41
+Create Date: 2026-10-18 11:37:52.904417
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2e4b7a1f05"
+down_revision: Union[str, None] = "c3f1a9d27e41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+INDEX_NAME = "ix_instagram_media_insight_snapshot_auth_id_media_id_fetched_at"
+
+
+def upgrade() -> None:
+    op.create_table(
+        "instagram_media_insight_snapshot",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("media_id", sa.String, nullable=False),
+        sa.Column("auth_id", sa.String, nullable=False),
+        sa.Column("likes", sa.Integer, nullable=True),
+        sa.Column("comments", sa.Integer, nullable=True),
+        sa.Column("reach", sa.Integer, nullable=True),
+        sa.Column("impressions", sa.Integer, nullable=True),
+        sa.Column("payload", sa.JSON, nullable=False),
+        sa.Column(
+            "fetched_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+    )
+    op.create_index(
+        INDEX_NAME,
+        "instagram_media_insight_snapshot",
+        ["auth_id", "media_id", "fetched_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(INDEX_NAME, table_name="instagram_media_insight_snapshot")
+    op.drop_table("instagram_media_insight_snapshot")
@@ -0,0 +1,56 @@
+"""index instagram_image_publishing_metadata history
+
+Revision ID: 9e4a7c2d5b18
+Revises: 6b1e3d8f2c47
+Create Date: 2026-10-18 18:24:51.207364
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9e4a7c2d5b18"
+down_revision: Union[str, None] = "6b1e3d8f2c47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+TABLE = "instagram_image_publishing_metadata"
+# a user and a business account publish many images, these columns were never unique
+NOT_UNIQUE_COLUMNS = ("instagram_business_account_id", "auth_id")
+# id ends the key so that ORDER BY created_at, id is read from the index as it is
+INCLUDED_COLUMNS = ("instagram_media_container_id", "instagram_media_published_id")
+
+
+def upgrade() -> None:
+    # the constraint names were generated by Postgres and may have been truncated
+    for constraint in sa.inspect(op.get_bind()).get_unique_constraints(TABLE):
+        if len(constraint["column_names"]) == 1 and constraint["column_names"][0] in NOT_UNIQUE_COLUMNS:
+            op.drop_constraint(constraint["name"], TABLE, type_="unique")
+    # built without locking the table against writes, which CREATE INDEX CONCURRENTLY cannot do in a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_image_publishing_metadata_business_account_id_created_at",
+            TABLE,
+            ["instagram_business_account_id", "created_at", "id"],
+            postgresql_include=["auth_id", *INCLUDED_COLUMNS],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_image_publishing_metadata_auth_id_created_at",
+            TABLE,
+            ["auth_id", "created_at", "id"],
+            postgresql_include=["instagram_business_account_id", *INCLUDED_COLUMNS],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_image_publishing_metadata_auth_id_created_at", TABLE, postgresql_concurrently=True)
+        op.drop_index(
+            "ix_image_publishing_metadata_business_account_id_created_at", TABLE, postgresql_concurrently=True
+        )
+    for column in NOT_UNIQUE_COLUMNS:
+        op.create_unique_constraint(f"{TABLE}_{column}_key", TABLE, [column])
@@ -0,0 +1,59 @@
+"""create instagram_publish_job table
+
+Revision ID: c3f1a9d27e41
+Revises: 5a6cce653bd9
+Create Date: 2026-10-18 09:12:05.418233
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c3f1a9d27e41"
+down_revision: Union[str, None] = "5a6cce653bd9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "instagram_publish_job",
+        sa.Column("id", sa.String(32), primary_key=True),
+        sa.Column("auth_id", sa.String, nullable=False),
+        sa.Column("instagram_business_account_id", sa.String, nullable=False),
+        sa.Column("image_url", sa.String, nullable=False),
+        sa.Column("caption", sa.String, nullable=True),
+        sa.Column("access_token", sa.String, nullable=True),
+        sa.Column("status", sa.String, nullable=False),
+        sa.Column("instagram_media_container_id", sa.String, nullable=True),
+        sa.Column("instagram_media_published_id", sa.String, nullable=True),
+        sa.Column("error", sa.String, nullable=True),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default="0"),
+        sa.Column(
+            "next_run_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index(
+        "ix_instagram_publish_job_status_next_run_at",
+        "instagram_publish_job",
+        ["status", "next_run_at"],
+    )
+    op.create_index(
+        "ix_instagram_publish_job_auth_id", "instagram_publish_job", ["auth_id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_instagram_publish_job_auth_id", table_name="instagram_publish_job")
+    op.drop_index(
+        "ix_instagram_publish_job_status_next_run_at", table_name="instagram_publish_job"
+    )
+    op.drop_table("instagram_publish_job")
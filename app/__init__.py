@@ -0,0 +1,3 @@
+import time
+
+IMPORTS_STARTED_AT = time.perf_counter()  # the first import of the app, start of the startup report
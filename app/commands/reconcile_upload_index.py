@@ -0,0 +1,30 @@
+"""
+Index the uploads stored in the image bucket, once, e.g. to backfill the uploads made before
+the `image_upload` table existed (they are missing from GET /image until then):
+
+    DB_URL=... ENV_NAME=production python -m app.commands.reconcile_upload_index
+
+Run it after `alembic upgrade head`. It can be run again safely, it only adds what is missing
+and drops what is gone from the bucket.
+"""
+import argparse
+import json
+import logging
+
+from app.container.containers import Container
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bucket", help="bucket to list, the image bucket of ENV_NAME by default")
+    args = parser.parse_args()
+
+    container = Container()
+    container.config()
+    logging.basicConfig(level=logging.INFO)
+    bucket_name = args.bucket or container.s3_image_bucket()
+    print(json.dumps({"bucket": bucket_name, **container.content_hash_index().reconcile(bucket_name)}))
+
+
+if __name__ == "__main__":
+    main()
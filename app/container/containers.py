@@ -1,19 +1,47 @@
 """Containers module."""
 
 import logging.config
+from typing import TYPE_CHECKING
 
-import boto3
-import sentry_sdk
-from botocore.client import BaseClient
 from dependency_injector import containers, providers
 from dependency_injector.providers import Resource
+from app.infrastructure.aws.clients import create_client, create_session
+from app.infrastructure.aws.presigned_url_cache import PresignedUrlCache
 from app.infrastructure.aws.s3 import S3Service
+from app.infrastructure.cache.backends import InProcessCacheBackend, SQLiteCacheBackend
+from app.infrastructure.cache.redis_backend import RedisCacheBackend
+from app.infrastructure.cache.shared_cache import SharedCache
 from app.infrastructure.db.database import Database
 from app.infrastructure.meta.instagram_platform.graph_api import InstagramGraphApiClient
+from app.infrastructure.meta.instagram_platform.rate_limit import GraphApiRateLimiter
+from app.infrastructure.meta.instagram_platform.resilience import GraphApiResilience, RetryPolicy
+from app.infrastructure.meta.instagram_platform.single_flight import SingleFlight
+from app.infrastructure.meta.instagram_platform.transport import (
+    GraphApiTransportSettings,
+    create_async_http_client,
+    create_http_client,
+)
+from app.infrastructure.monitoring.sentry import init_sentry
+from app.infrastructure.token_cipher import TokenCipher
+from app.repositories.background_lease_repository import BackgroundLeaseRepository
+from app.repositories.image_upload_repository import ImageUploadRepository
 from app.repositories.instagram_image_upload_history_repository import InstagramImageUploadMetadataRepository
+from app.repositories.instagram_media_insight_snapshot_repository import InstagramMediaInsightSnapshotRepository
+from app.repositories.instagram_publish_job_repository import InstagramPublishJobRepository
+from app.services.content_hash_index import ContentHashIndex
+from app.services.instagram_account_discovery import InstagramAccountDiscoveryService
 from app.services.instagram_account_management import InstagramAccountManageService
+from app.services.instagram_image_normalisation import ImageProcessPool, InstagramImageSpec
 from app.services.instagram_media_insights import MediaInsightService
+from app.services.instagram_media_publish_job_service import MediaPublishJobService
 from app.services.instagram_media_upload_service import MediaUploadService
+from app.services.publishing_metadata_write_behind import PublishingMetadataWriteBehind
+from app.services.thumbnail_queue import ThumbnailQueue
+from app.services.token_verification_cache import TokenVerificationCache
+
+if TYPE_CHECKING:
+    import boto3
+    from botocore.client import BaseClient
 
 
 class Container(containers.DeclarativeContainer):
@@ -22,6 +50,7 @@ class Container(containers.DeclarativeContainer):
             "app.routes.api_v1.endpoints.image",
             "app.routes.api_v1.endpoints.auth",
             "app.routes.api_v1.endpoints.instagram",
+            "app.routes.api_v1.endpoints.monitoring",
         ]
     )
 
@@ -35,16 +64,27 @@ class Container(containers.DeclarativeContainer):
     )
 
     sentry_sdk = providers.Resource(  # type: ignore [var-annotated]
-        sentry_sdk.init,
+        init_sentry,
         dsn=config.infrastructures.sentry.dsn[env_name],
         traces_sample_rate=1.0,
         environment=env_name,
     )
 
-    db = providers.Singleton(Database, db_url=config.infrastructures.db.url)
+    db = providers.Singleton(
+        Database,
+        db_url=config.infrastructures.db.url,
+        echo=config.infrastructures.db.echo,
+        pool_size=config.infrastructures.db.pool_size,
+        max_overflow=config.infrastructures.db.max_overflow,
+        async_pool_size=config.infrastructures.db.async_pool_size,
+        async_max_overflow=config.infrastructures.db.async_max_overflow,
+        pool_pre_ping=config.infrastructures.db.pool_pre_ping,
+        pool_recycle=config.infrastructures.db.pool_recycle,
+        pool_timeout=config.infrastructures.db.pool_timeout,
+    )
 
-    sts_client: Resource[BaseClient] = providers.Resource(
-        boto3.client,
+    sts_client: Resource["BaseClient"] = providers.Resource(
+        create_client,
         "sts",
         aws_access_key_id=config.infrastructures.aws.aws_access_key_id,
         aws_secret_access_key=config.infrastructures.aws.aws_secret_access_key,
@@ -52,8 +92,8 @@ class Container(containers.DeclarativeContainer):
 
     temp_credentials = providers.Resource(sts_client.provided.get_session_token.call())
 
-    session: Resource[boto3.session.Session] = providers.Resource(
-        boto3.session.Session,
+    session: Resource["boto3.session.Session"] = providers.Resource(
+        create_session,
         aws_access_key_id=temp_credentials.provided["Credentials"]["AccessKeyId"],
         aws_secret_access_key=temp_credentials.provided["Credentials"][
             "SecretAccessKey"
@@ -61,19 +101,105 @@ class Container(containers.DeclarativeContainer):
         aws_session_token=temp_credentials.provided["Credentials"]["SessionToken"],
     )
 
-    s3_client = providers.Resource(
+    # thread safe: in the lazy mode the warm-up thread and a first request may both ask for it
+    s3_client = providers.ThreadSafeSingleton(
         session.provided.client.call(),
         service_name="s3",
     )
 
+    graph_api_transport_settings = providers.Singleton(
+        GraphApiTransportSettings,
+        max_connections=config.infrastructures.meta.graph_api.http.max_connections,
+        max_keepalive_connections=config.infrastructures.meta.graph_api.http.max_keepalive_connections,
+        keepalive_expiry=config.infrastructures.meta.graph_api.http.keepalive_expiry,
+        connect_timeout=config.infrastructures.meta.graph_api.http.connect_timeout,
+        read_timeout=config.infrastructures.meta.graph_api.http.read_timeout,
+        write_timeout=config.infrastructures.meta.graph_api.http.write_timeout,
+        pool_timeout=config.infrastructures.meta.graph_api.http.pool_timeout,
+        http2=config.infrastructures.meta.graph_api.http.http2,
+    )
+
+    cache_backend = providers.Selector(
+        config.infrastructures.cache.backend,
+        memory=providers.Singleton(
+            InProcessCacheBackend,
+            max_size=config.infrastructures.cache.memory.max_size,
+        ),
+        sqlite=providers.Singleton(
+            SQLiteCacheBackend,
+            path=config.infrastructures.cache.sqlite.path,
+            max_size=config.infrastructures.cache.sqlite.max_size,
+        ),
+        redis=providers.Singleton(
+            RedisCacheBackend,
+            url=config.infrastructures.cache.redis.url,
+            pool_size=config.infrastructures.cache.redis.pool_size,
+            timeout=config.infrastructures.cache.redis.timeout,
+        ),
+    )
+
+    cache = providers.Singleton(
+        SharedCache,
+        backend=cache_backend,
+        ttls=config.infrastructures.cache.ttls,
+        key_prefix=config.infrastructures.cache.key_prefix,
+        lock_timeout=config.infrastructures.cache.lock_timeout,
+    )
+
+    token_verification_cache = providers.Singleton(
+        TokenVerificationCache,
+        cache=cache.provided.namespace.call("tokens"),
+        negative_ttl=config.infrastructures.meta.graph_api.token_cache.negative_ttl,
+    )
+
+    graph_api_rate_limiter = providers.Singleton(
+        GraphApiRateLimiter,
+        max_rate=config.infrastructures.meta.graph_api.rate_limit.max_rate,
+        burst=config.infrastructures.meta.graph_api.rate_limit.burst,
+        min_rate=config.infrastructures.meta.graph_api.rate_limit.min_rate,
+        soft_limit=config.infrastructures.meta.graph_api.rate_limit.soft_limit,
+        hard_limit=config.infrastructures.meta.graph_api.rate_limit.hard_limit,
+        throttle_cooldown=config.infrastructures.meta.graph_api.rate_limit.throttle_cooldown,
+        max_wait=config.infrastructures.meta.graph_api.rate_limit.max_wait,
+        max_businesses=config.infrastructures.meta.graph_api.rate_limit.max_businesses,
+    )
+
+    graph_api_resilience = providers.Singleton(
+        GraphApiResilience,
+        retry_policy=providers.Factory(
+            RetryPolicy,
+            max_attempts=config.infrastructures.meta.graph_api.resilience.max_attempts,
+            base_delay=config.infrastructures.meta.graph_api.resilience.base_delay,
+            max_delay=config.infrastructures.meta.graph_api.resilience.max_delay,
+        ),
+        failure_threshold=config.infrastructures.meta.graph_api.resilience.failure_threshold,
+        recovery_timeout=config.infrastructures.meta.graph_api.resilience.recovery_timeout,
+    )
+
     instagram_graph_api_client = providers.Singleton(
         InstagramGraphApiClient,
         environment=env_name,
+        http_client=providers.Singleton(create_http_client, graph_api_transport_settings),
+        async_http_client=providers.Singleton(create_async_http_client, graph_api_transport_settings),
+        on_oauth_error=token_verification_cache.provided.evict,
+        rate_limiter=graph_api_rate_limiter,
+        resilience=graph_api_resilience,
+        graph_domain=config.infrastructures.meta.graph_api.domain,
+        single_flight=providers.Singleton(SingleFlight, enabled=config.infrastructures.meta.graph_api.coalesce_gets),
+        batch_concurrency=config.infrastructures.meta.graph_api.batch_concurrency,
+    )
+
+    presigned_url_cache = providers.Singleton(
+        PresignedUrlCache,
+        max_size=config.infrastructures.aws.presigned_url_cache.max_size,
+        expiration=config.infrastructures.aws.presigned_url_cache.expiration,
+        min_remaining=config.infrastructures.aws.presigned_url_cache.min_remaining,
     )
 
     s3_service = providers.Factory(
         S3Service,
         s3_client=s3_client,
+        presigned_url_cache=presigned_url_cache,
     )
 
     s3_image_bucket = providers.Resource(
@@ -82,22 +208,129 @@ class Container(containers.DeclarativeContainer):
 
     image_upload_metadata_repository = providers.Factory(
         InstagramImageUploadMetadataRepository,
+        session_factory=db.provided.session,
+        async_session_factory=db.provided.async_session_factory,
+    )
+
+    background_lease_repository = providers.Factory(
+        BackgroundLeaseRepository,
+        session_factory=db.provided.session
+    )
+
+    image_upload_repository = providers.Factory(
+        ImageUploadRepository,
+        session_factory=db.provided.session
+    )
+
+    publish_job_repository = providers.Factory(
+        InstagramPublishJobRepository,
         session_factory=db.provided.session
     )
 
+    # thread safe like s3_client, created by the warm-up or a first upload and shut down by the lifespan
+    image_process_pool = providers.ThreadSafeSingleton(
+        ImageProcessPool,
+        max_workers=config.core.image_upload.normalisation.max_workers,
+    )
+
+    instagram_image_spec = providers.Singleton(
+        InstagramImageSpec,
+        max_side=config.core.image_upload.normalisation.max_side,
+        min_aspect_ratio=config.core.image_upload.normalisation.min_aspect_ratio,
+        max_aspect_ratio=config.core.image_upload.normalisation.max_aspect_ratio,
+        quality=config.core.image_upload.normalisation.quality,
+    )
+
+    content_hash_index = providers.Singleton(
+        ContentHashIndex,
+        image_upload_repository=image_upload_repository,
+        s3=s3_service,
+        bloom_capacity=config.core.image_upload.content_index.bloom_capacity,
+        bloom_error_rate=config.core.image_upload.content_index.bloom_error_rate,
+        bloom_sync_interval=config.core.image_upload.content_index.bloom_sync_interval,
+    )
+
+    thumbnail_queue = providers.Singleton(
+        ThumbnailQueue,
+        concurrency=config.core.image_upload.thumbnails.concurrency,
+        max_queued=config.core.image_upload.thumbnails.max_queued,
+    )
+
     media_upload_service = providers.Factory(
         MediaUploadService,
+        s3=s3_service,
+        image_upload_repository=image_upload_repository,
+        content_hash_index=content_hash_index,
+        part_size=config.core.image_upload.part_size,
+        image_process_pool=image_process_pool,
+        instagram_image_spec=instagram_image_spec,
+        thumbnail_sizes=config.core.image_upload.thumbnails.sizes,
+        thumbnail_queue=thumbnail_queue,
+    )
+
+    publishing_metadata_write_behind = providers.Singleton(
+        PublishingMetadataWriteBehind,
+        image_upload_metadata_repository=image_upload_metadata_repository,
+        max_size=config.core.publish_jobs.metadata_write_behind.max_size,
+        batch_size=config.core.publish_jobs.metadata_write_behind.batch_size,
+        linger=config.core.publish_jobs.metadata_write_behind.linger,
+        spill_path=config.core.publish_jobs.metadata_write_behind.spill_path,
+    )
+
+    token_cipher = providers.Singleton(  # user tokens of the publish jobs stored in the DB
+        TokenCipher,
+        keys=config.core.publish_jobs.token_key,
+    )
+
+    page_token_cipher = providers.Singleton(  # page tokens of the discovered accounts, None when not cached
+        TokenCipher.optional,
+        keys=config.core.account_discovery.token_key,
+        setting="ACCOUNT_DISCOVERY_TOKEN_KEY",
+    )
+
+    media_publish_job_service = providers.Singleton(
+        MediaPublishJobService,
         instagram_graph_api_client=instagram_graph_api_client,
+        publish_job_repository=publish_job_repository,
         image_upload_metadata_repository=image_upload_metadata_repository,
-        s3=s3_service
+        initial_poll_delay=config.core.publish_jobs.container_poll.initial_delay,
+        max_poll_delay=config.core.publish_jobs.container_poll.max_delay,
+        poll_backoff_factor=config.core.publish_jobs.container_poll.backoff_factor,
+        max_polls=config.core.publish_jobs.container_poll.max_polls,
+        lease=config.core.publish_jobs.lease,
+        token_cipher=token_cipher,
+        call_deadline=config.core.publish_jobs.call_deadline,
+        metadata_write_behind=publishing_metadata_write_behind,
+    )
+
+    insight_snapshot_repository = providers.Factory(
+        InstagramMediaInsightSnapshotRepository,
+        session_factory=db.provided.session
     )
 
     media_insight_service = providers.Singleton(
         MediaInsightService,
         instagram_graph_api_client=instagram_graph_api_client,
+        insight_snapshot_repository=insight_snapshot_repository,
+        freshness_window=config.core.insights.freshness_window,
+        stable_freshness_window=config.core.insights.stable_freshness_window,
+        max_refresh=config.core.insights.max_refresh,
+        passthrough=config.infrastructures.meta.graph_api.passthrough,
+    )
+
+    account_discovery_service = providers.Singleton(
+        InstagramAccountDiscoveryService,
+        instagram_graph_api_client=instagram_graph_api_client,
+        cache=cache.provided.namespace.call("accounts"),
+        refresh_ahead=config.core.account_discovery.refresh_ahead,
+        token_cipher=page_token_cipher,
+        enabled=config.core.account_discovery.enabled,
     )
 
     account_management_service = providers.Singleton(
         InstagramAccountManageService,
         instagram_graph_api_client=instagram_graph_api_client,
+        token_verification_cache=token_verification_cache,
+        passthrough=config.infrastructures.meta.graph_api.passthrough,
+        account_discovery=account_discovery_service,
     )
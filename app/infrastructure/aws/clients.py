@@ -0,0 +1,17 @@
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import boto3
+    from botocore.client import BaseClient
+
+
+# boto3 takes a few hundred milliseconds to import, it is only loaded once a client is built
+
+def create_client(service_name: str, **kwargs: Any) -> "BaseClient":
+    import boto3
+    return boto3.client(service_name, **kwargs)
+
+
+def create_session(**kwargs: Any) -> "boto3.session.Session":
+    import boto3
+    return boto3.session.Session(**kwargs)
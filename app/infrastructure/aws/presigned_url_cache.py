@@ -0,0 +1,47 @@
+import time
+from typing import Callable, Dict, Hashable, List, Tuple
+
+from app.infrastructure.cache.ttl_cache import TTLCache
+
+
+class PresignedUrlCache:
+    """
+    Presigned URLs by (bucket, key). A URL signed for `expiration` seconds is handed out again
+    until less than `min_remaining` seconds of its validity are left, so the receiver always gets
+    at least that long to use it.
+    """
+
+    def __init__(
+            self,
+            max_size: int,
+            expiration: int,
+            min_remaining: int,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.expiration = expiration
+        self.min_remaining = min(min_remaining, expiration)
+        self.urls: TTLCache[str] = TTLCache(max_size, ttl=expiration - self.min_remaining, clock=clock)
+
+    def get_many(
+            self,
+            bucket_name: str,
+            object_names: List[str],
+            sign: Callable[[str], str],
+    ) -> List[str]:
+        """URLs in the order of `object_names`, only the misses are signed, in one pass"""
+        urls: Dict[str, str] = {}
+        missing: List[Tuple[Hashable, str]] = []
+        for object_name in object_names:
+            url = self.urls.get((bucket_name, object_name))
+            if url is None:
+                missing.append(((bucket_name, object_name), object_name))
+            else:
+                urls[object_name] = url
+        for key, object_name in missing:
+            if object_name not in urls:
+                urls[object_name] = sign(object_name)
+                self.urls.set(key, urls[object_name])
+        return [urls[object_name] for object_name in object_names]
+
+    def stats(self) -> Dict[str, int]:
+        return self.urls.stats()
@@ -1,23 +1,34 @@
 import logging
 from io import BytesIO
-from typing import Any
+from typing import TYPE_CHECKING, Any, BinaryIO, Iterator, List, Optional
 
-from boto3_type_annotations.s3 import Client
-from botocore.exceptions import ClientError
+from app.infrastructure.aws.presigned_url_cache import PresignedUrlCache
+from app.infrastructure.monitoring.timing import s3_operation
+
+if TYPE_CHECKING:
+    from boto3_type_annotations.s3 import Client
 
 
 class S3Service:
-    s3_client: Client
+    s3_client: "Client"
 
-    def __init__(self, s3_client: Client) -> None:
+    def __init__(self, s3_client: "Client", presigned_url_cache: Optional[PresignedUrlCache] = None) -> None:
         self.logger = logging.getLogger(
             f"{__name__}.{self.__class__.__name__}",
         )
         self.s3_client = s3_client
+        self.presigned_url_cache = presigned_url_cache
+
+    def call(self, operation: str, *args: Any, **kwargs: Any) -> Any:
+        """Run an S3 client operation, timed into the metrics and the current request timings"""
+        with s3_operation(operation):
+            return getattr(self.s3_client, operation)(*args, **kwargs)
 
     def get_file_path(self, bucket_name: str, file_path: str) -> str:
+        from botocore.exceptions import ClientError  # loaded with the client, not by the boot
+
         try:
-            self.s3_client.head_object(Bucket=bucket_name, Key=file_path)
+            self.call("head_object", Bucket=bucket_name, Key=file_path)
             return file_path
         except ClientError:
             return ""
@@ -25,17 +36,68 @@ class S3Service:
     def upload_file(
             self, file: BytesIO, bucket_name: str, key: str
     ) -> None:
-        self.s3_client.upload_fileobj(
+        self.call(
+            "upload_fileobj",
             file,
             Bucket=bucket_name,
             Key=key,
         )
 
+    def put_file(self, body: bytes, bucket_name: str, key: str) -> None:
+        self.call("put_object", Body=body, Bucket=bucket_name, Key=key)
+
+    def create_multipart_upload(self, bucket_name: str, key: str) -> str:
+        return self.call("create_multipart_upload", Bucket=bucket_name, Key=key)["UploadId"]
+
+    def upload_part(
+            self, body: bytes, bucket_name: str, key: str, upload_id: str, part_number: int
+    ) -> dict:
+        response = self.call(
+            "upload_part",
+            Body=body,
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+        )
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
+    def complete_multipart_upload(
+            self, bucket_name: str, key: str, upload_id: str, parts: List[dict]
+    ) -> None:
+        self.call(
+            "complete_multipart_upload",
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+
+    def abort_multipart_upload(self, bucket_name: str, key: str, upload_id: str) -> None:
+        self.call("abort_multipart_upload", Bucket=bucket_name, Key=key, UploadId=upload_id)
+
+    def copy_file(self, bucket_name: str, source_key: str, key: str) -> None:
+        """Server side copy, the bytes do not go through this worker"""
+        self.call(
+            "copy_object",
+            Bucket=bucket_name,
+            Key=key,
+            CopySource={"Bucket": bucket_name, "Key": source_key},
+        )
+
+    def delete_file(self, bucket_name: str, key: str) -> None:
+        self.call("delete_object", Bucket=bucket_name, Key=key)
+
     def get_file(self, file_path: str, bucket_name: str) -> Any:
-        obj = self.s3_client.get_object(Bucket=bucket_name, Key=file_path)
-        obj = obj["Body"].read()
+        with s3_operation("get_object"):  # the body is streamed, reading it is part of the operation
+            obj = self.s3_client.get_object(Bucket=bucket_name, Key=file_path)
+            obj = obj["Body"].read()
         return obj
 
+    def download_file(self, bucket_name: str, key: str, file: BinaryIO) -> None:
+        """Stream an object into `file` chunk by chunk, it is never held whole in memory"""
+        self.call("download_fileobj", bucket_name, key, file)
+
     def create_pre_signed_url(
             self, bucket_name: str, object_name: str, expiration: int = 3600
     ) -> str:
@@ -45,6 +107,21 @@ class S3Service:
         :param expiration: Time in seconds for the presigned URL to remain valid
         :return: Presigned URL as string. If error, returns None.
         """
+        return self.create_pre_signed_urls(bucket_name, [object_name], expiration)[0]
+
+    def create_pre_signed_urls(
+            self, bucket_name: str, object_names: List[str], expiration: int = 3600
+    ) -> List[str]:
+        """Presigned URLs of many objects, the ones still cached with enough validity left are reused"""
+        if self.presigned_url_cache is None or expiration != self.presigned_url_cache.expiration:
+            return [self.sign_url(bucket_name, object_name, expiration) for object_name in object_names]
+        return self.presigned_url_cache.get_many(
+            bucket_name,
+            object_names,
+            lambda object_name: self.sign_url(bucket_name, object_name, expiration),
+        )
+
+    def sign_url(self, bucket_name: str, object_name: str, expiration: int) -> str:
         # Generate a preSigned URL for the S3 object
         response = self.s3_client.generate_presigned_url(
             "get_object",
@@ -54,6 +131,16 @@ class S3Service:
         # The response contains the preSigned URL
         return response
 
+    def iter_objects(self, bucket_name: str, prefix: str) -> Iterator[dict]:
+        """Every object under `prefix`, following the continuation of `list_objects_v2` page by page"""
+        pages = iter(self.s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket_name, Prefix=prefix))
+        while True:
+            with s3_operation("list_objects_v2"):  # the paginator sends a request per page
+                page = next(pages, None)
+            if page is None:
+                return
+            yield from page.get("Contents", [])
+
     def list_s3_objects_in_bucket(
             self,
             user_id: str,
@@ -64,4 +151,4 @@ class S3Service:
         :return: None
         """
         prefix = f"user/{user_id}"
-        return self.s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
+        return self.call("list_objects_v2", Bucket=bucket_name, Prefix=prefix)
@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.infrastructure.cache.ttl_cache import TTLCache
+
+
+class CacheBackend:
+    """
+    Byte values by string key, each with its own expiry. `blocking` backends do I/O,
+    their calls are moved off the event loop by `SharedCache`.
+    """
+
+    name = ""
+    blocking = False
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Set `key` only when it is absent or expired, True when it was set: the lock of a loader"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+    def close(self) -> None:
+        pass
+
+
+class InProcessCacheBackend(CacheBackend):
+    """LRU of this worker only: every gunicorn worker warms its own"""
+
+    name = "memory"
+
+    def __init__(self, max_size: int) -> None:
+        self._entries: TTLCache[bytes] = TTLCache(max_size=max_size, ttl=0)
+        self._add_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._entries.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries.set(key, value, ttl=ttl)
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        with self._add_lock:
+            if self._entries.get(key) is not None:
+                return False
+            self._entries.set(key, value, ttl=ttl)
+            return True
+
+    def delete(self, key: str) -> bool:
+        return self._entries.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self._entries.stats()}
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Cache shared by the workers of one host through a SQLite file in WAL mode: readers never wait
+    for the writer, a value loaded by one worker is a hit for the others. Expiries are wall clock
+    times since they are compared across processes. Expired rows are purged every `purge_every` writes,
+    beyond `max_size` rows the ones expiring first go.
+    """
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_size: int, purge_every: int = 1000, busy_timeout: float = 5.0) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.purge_every = purge_every
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()  # a sqlite3 connection is only used by the thread which opened it
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self.connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_expires_at ON cache_entries (expires_at)")
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():  # not inherited over a fork
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # a cache may lose its last writes on power loss
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self.connection().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.connection().execute(
+            "INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, time.time() + ttl),
+        )
+        self.after_write()
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        now = time.time()
+        cursor = self.connection().execute(
+            "INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE cache_entries.expires_at <= ?",
+            (key, value, now + ttl, now),
+        )
+        self.after_write()
+        return cursor.rowcount == 1
+
+    def delete(self, key: str) -> bool:
+        return self.connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,)).rowcount == 1
+
+    def after_write(self) -> None:
+        with self._writes_lock:
+            self._writes += 1
+            if self._writes % self.purge_every:
+                return
+        self.purge()
+
+    def purge(self) -> None:
+        connection = self.connection()
+        connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+        connection.execute(
+            "DELETE FROM cache_entries WHERE key IN "
+            "(SELECT key FROM cache_entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        size = self.connection().execute("SELECT count(*) FROM cache_entries").fetchone()[0]
+        return {"backend": self.name, "path": self.path, "size": size, "max_size": self.max_size}
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,38 @@
+import hashlib
+import math
+import threading
+
+
+class BloomFilter:
+    """
+    Set membership in a fixed bit array: `in` answers False only for items never added,
+    True is wrong for about `error_rate` of the items never added while fewer than
+    `capacity` items are in it
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def positions(self, item: str) -> list[int]:
+        # double hashing, two 64 bits halves of one digest stand for `hash_count` hash functions
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return [(first + index * second) % self.size for index in range(self.hash_count)]
+
+    def add(self, item: str) -> None:
+        positions = self.positions(item)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+    def __len__(self) -> int:
+        return self.count
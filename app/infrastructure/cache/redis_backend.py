@@ -0,0 +1,155 @@
+import queue
+import socket
+import ssl
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import unquote, urlsplit
+
+from app.infrastructure.cache.backends import CacheBackend
+
+Reply = Union[None, int, bytes, List[Any]]
+
+
+class RedisError(Exception):
+    """Error reply of the server"""
+
+
+class RedisConnection:
+    """One socket speaking RESP2, the Redis protocol, enough of it for a cache"""
+
+    def __init__(self, host: str, port: int, timeout: float, ssl_context: Optional[ssl.SSLContext] = None) -> None:
+        self.socket = socket.create_connection((host, port), timeout=timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if ssl_context is not None:
+            try:
+                self.socket = ssl_context.wrap_socket(self.socket, server_hostname=host)
+            except BaseException:
+                self.socket.close()
+                raise
+        self.reader = self.socket.makefile("rb")
+
+    def command(self, *arguments: Union[str, bytes, int, float]) -> Reply:
+        encoded = [argument if isinstance(argument, bytes) else str(argument).encode() for argument in arguments]
+        request = [b"*%d\r\n" % len(encoded)]
+        for argument in encoded:
+            request.append(b"$%d\r\n" % len(argument))
+            request.append(argument)
+            request.append(b"\r\n")
+        self.socket.sendall(b"".join(request))
+        return self.read_reply()
+
+    def read_reply(self) -> Reply:
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the Redis server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise RedisError(payload.decode(errors="replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [self.read_reply() for _ in range(count)]
+        raise ConnectionError(f"Unexpected Redis reply {line!r}")
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.socket.close()
+        except OSError:
+            pass
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache shared by every worker of every host, on any server speaking the Redis protocol
+    (Redis, Valkey, KeyDB, `benchmarks/fake_redis.py` for local runs). Connections are pooled,
+    one is opened per blocking thread using it at most. A connection failing mid-command is dropped.
+    A `rediss://` URL connects over TLS, the certificate verified against the host name.
+    """
+
+    name = "redis"
+    blocking = True
+
+    def __init__(self, url: str, pool_size: int = 10, timeout: float = 1.0) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("redis", "rediss"):
+            raise ValueError(f"Unsupported Redis URL scheme {parts.scheme!r}, use redis:// or rediss:// (TLS)")
+        self.ssl_context = ssl.create_default_context() if parts.scheme == "rediss" else None
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.username = unquote(parts.username) if parts.username else None
+        self.db = int(parts.path.strip("/") or 0)
+        self.timeout = timeout
+        self._pool: queue.LifoQueue[RedisConnection] = queue.LifoQueue(maxsize=pool_size)
+
+    def connect(self) -> RedisConnection:
+        connection = RedisConnection(self.host, self.port, self.timeout, self.ssl_context)
+        try:
+            if self.password is not None:
+                credentials = [self.username, self.password] if self.username else [self.password]
+                connection.command("AUTH", *credentials)
+            if self.db:
+                connection.command("SELECT", self.db)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    def command(self, *arguments: Union[str, bytes, int, float]) -> Reply:
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            connection = self.connect()
+        try:
+            reply = connection.command(*arguments)
+        except RedisError:
+            self.release(connection)
+            raise
+        except BaseException:
+            connection.close()
+            raise
+        self.release(connection)
+        return reply
+
+    def release(self, connection: RedisConnection) -> None:
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    @staticmethod
+    def milliseconds(ttl: float) -> int:
+        return max(1, int(ttl * 1000))
+
+    def get(self, key: str) -> Optional[bytes]:
+        reply = self.command("GET", key)
+        return reply if isinstance(reply, bytes) else None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.command("SET", key, value, "PX", self.milliseconds(ttl))
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return self.command("SET", key, value, "PX", self.milliseconds(ttl), "NX") is not None
+
+    def delete(self, key: str) -> bool:
+        return bool(self.command("DEL", key))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "host": self.host, "port": self.port, "db": self.db,
+                "tls": self.ssl_context is not None, "idle_connections": self._pool.qsize()}
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, TypeVar
+
+from app.infrastructure.cache.backends import CacheBackend
+from app.infrastructure.monitoring.timing import CACHE_REQUESTS
+from app.infrastructure.serialization import dumps, loads
+
+T = TypeVar("T")
+
+LOCK_POLL_DELAY = 0.05  # seconds between two reads while another worker loads the value, doubled up to 0.5
+
+
+class CacheNamespace:
+    """Keys of one kind (tokens, accounts, insights...) with their own TTL, values are stored as JSON"""
+
+    def __init__(self, cache: "SharedCache", name: str, ttl: float) -> None:
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+
+    def key(self, key: str) -> str:
+        return f"{self.cache.key_prefix}:{self.name}:{key}"
+
+    @property
+    def min_ttl(self) -> float:
+        """Shortest time an entry is kept, once its TTL is jittered"""
+        return self.ttl * (1 - self.cache.ttl_jitter)
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.decode(self.cache.call(self.cache.backend.get, self.key(key)))
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.cache.call(self.cache.backend.set, self.key(key), dumps(value), self.cache.jittered(ttl or self.ttl))
+
+    def delete(self, key: str) -> bool:
+        return bool(self.cache.call(self.cache.backend.delete, self.key(key)))
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        return self.decode(await self.cache.call_async(self.cache.backend.get, self.key(key)))
+
+    async def set_async(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self.set_raw_async(self.key(key), dumps(value), ttl)
+
+    async def delete_async(self, key: str) -> bool:
+        return bool(await self.cache.call_async(self.cache.backend.delete, self.key(key)))
+
+    async def claim_async(self, key: str, ttl: float) -> bool:
+        """
+        True for the first caller of every worker sharing the backend until `ttl` passes, e.g. to run
+        a refresh once. A failing backend cannot tell, every caller gets True then.
+        """
+        claimed = await self.cache.call_async(self.cache.backend.add, f"{self.key(key)}:claim", b"1", ttl)
+        return claimed is not False
+
+    async def get_or_load_async(self, key: str, load: Callable[[], Awaitable[T]], ttl: Optional[float] = None) -> T:
+        """
+        The cached value, or the one `load` returns, cached in turn. On a miss only one caller loads:
+        callers of this worker wait for the same load, the other workers of a shared backend for the
+        value it stores, until the lock expires. A `load` raising caches nothing.
+        """
+        full_key = self.key(key)
+        raw = await self.cache.call_async(self.cache.backend.get, full_key)
+        if raw is not None:
+            CACHE_REQUESTS.inc(namespace=self.name, result="hit")
+            return loads(raw)
+        CACHE_REQUESTS.inc(namespace=self.name, result="miss")
+        return await self.cache.coalesce(full_key, lambda: self.load(full_key, load, ttl))
+
+    async def load(self, full_key: str, load: Callable[[], Awaitable[T]], ttl: Optional[float]) -> T:
+        lock_key = f"{full_key}:lock"
+        locked = await self.cache.call_async(self.cache.backend.add, lock_key, b"1", self.cache.lock_timeout)
+        if locked is False:  # None when the backend failed, there is nothing to wait for then
+            raw = await self.wait_for_value(full_key)
+            if raw is not None:
+                return loads(raw)
+            self.cache.logger.warning(f"{full_key} still missing after {self.cache.lock_timeout}s, loading it too")
+        try:
+            value = await load()
+            await self.set_raw_async(full_key, dumps(value), ttl)
+            return value
+        finally:
+            if locked:
+                await self.cache.call_async(self.cache.backend.delete, lock_key)
+
+    async def wait_for_value(self, full_key: str) -> Optional[bytes]:
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + self.cache.lock_timeout
+        delay = LOCK_POLL_DELAY
+        while loop.time() < give_up_at:
+            await asyncio.sleep(delay)
+            raw = await self.cache.call_async(self.cache.backend.get, full_key)
+            if raw is not None:
+                return raw
+            delay = min(delay * 2, 0.5)
+        return None
+
+    async def set_raw_async(self, full_key: str, raw: bytes, ttl: Optional[float]) -> None:
+        await self.cache.call_async(self.cache.backend.set, full_key, raw, self.cache.jittered(ttl or self.ttl))
+
+    def decode(self, raw: Optional[bytes]) -> Optional[Any]:
+        CACHE_REQUESTS.inc(namespace=self.name, result="miss" if raw is None else "hit")
+        return None if raw is None else loads(raw)
+
+
+class SharedCache:
+    """
+    Front of the configured `CacheBackend`, split in namespaces with a TTL each (`ttls`, `default`
+    for the others). TTLs are shortened by up to `ttl_jitter` so that entries written together do not
+    all expire together. A backend failing is logged and reads as a miss, it never fails a request.
+    """
+
+    def __init__(
+            self,
+            backend: CacheBackend,
+            ttls: Mapping[str, float],
+            key_prefix: str,
+            lock_timeout: float,
+            ttl_jitter: float = 0.1,
+    ) -> None:
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self.backend = backend
+        self.ttls = {name: float(ttl) for name, ttl in ttls.items()}
+        self.key_prefix = key_prefix
+        self.lock_timeout = lock_timeout
+        self.ttl_jitter = ttl_jitter
+        self._namespaces: Dict[str, CacheNamespace] = {}
+        self._loading: Dict[str, asyncio.Task] = {}  # in-process loads by key
+
+    def namespace(self, name: str) -> CacheNamespace:
+        if name not in self._namespaces:
+            self._namespaces[name] = CacheNamespace(self, name, self.ttls.get(name, self.ttls.get("default", 300.0)))
+        return self._namespaces[name]
+
+    def jittered(self, ttl: float) -> float:
+        return ttl * (1 - random.uniform(0, self.ttl_jitter))
+
+    def call(self, operation: Callable[..., T], *arguments: Any) -> Optional[T]:
+        try:
+            return operation(*arguments)
+        except Exception as e:
+            self.logger.warning(f"{self.backend.name} cache {operation.__name__} failed: {e!r}")
+            CACHE_REQUESTS.inc(namespace="*", result="error")
+            return None
+
+    async def call_async(self, operation: Callable[..., T], *arguments: Any) -> Optional[T]:
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.call, operation, *arguments)
+        return self.call(operation, *arguments)
+
+    async def coalesce(self, key: str, load: Callable[[], Awaitable[T]]) -> T:
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self._loading[key] = task
+            task.add_done_callback(lambda done: self.forget(key, done))
+        return await asyncio.shield(task)
+
+    def forget(self, key: str, task: asyncio.Task) -> None:
+        if self._loading.get(key) is task:
+            del self._loading[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here as well, in case every caller went away
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.backend.stats(), "ttls": self.ttls, "loading": len(self._loading)}
+
+    def close(self) -> None:
+        self.backend.close()
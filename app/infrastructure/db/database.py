@@ -1,11 +1,15 @@
+import importlib.util
 import logging
-from contextlib import AbstractContextManager, contextmanager
-from typing import Callable
+from contextlib import AbstractAsyncContextManager, AbstractContextManager, asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Optional
 
-from sqlalchemy import create_engine, create_mock_engine, orm
+from sqlalchemy import create_engine, create_mock_engine, make_url, orm
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session
 
+from app.infrastructure.monitoring.timing import db_session
+
 Base = declarative_base()
 
 
@@ -13,38 +17,109 @@ def dump(sql, *multiparams, **params):  # type: ignore
     print()
 
 
+def is_asyncpg_available() -> bool:
+    """The async engine depends on the optional `asyncpg` driver"""
+    return importlib.util.find_spec("asyncpg") is not None
+
+
+def async_database_url(db_url: Optional[str]) -> Optional[str]:
+    """The asyncpg flavour of a PostgreSQL URL, None when there is no async driver for it"""
+    if not db_url:
+        return None
+    url = make_url(db_url)
+    if url.get_backend_name() != "postgresql" or not is_asyncpg_available():
+        return None
+    return url.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
 class Database:
 
-    def __init__(self, db_url: str) -> None:
+    def __init__(
+            self,
+            db_url: str,
+            echo: bool = False,
+            pool_size: int = 5,
+            max_overflow: int = 10,
+            async_pool_size: int = 2,
+            async_max_overflow: int = 3,
+            pool_pre_ping: bool = True,
+            pool_recycle: int = 1800,
+            pool_timeout: float = 30,
+    ) -> None:
         self.logger = logging.getLogger(
             f"{__name__}.{self.__class__.__name__}",
         )
+        # the sync and the async engine have a pool each, sized separately
+        engine_options = dict(
+            echo=echo,
+            pool_pre_ping=pool_pre_ping,
+            pool_recycle=pool_recycle,
+            pool_timeout=pool_timeout,
+        )
 
         self._engine = (
-            create_engine(db_url, echo=True)
+            create_engine(db_url, pool_size=pool_size, max_overflow=max_overflow, **engine_options)
             if db_url
             else create_mock_engine("postgresql+psycopg2://", dump)
         )
 
-        self._session_factory = orm.scoped_session(
-            orm.sessionmaker(
-                autocommit=False,
-                autoflush=False,
-                bind=self._engine,
-            ),
+        # a new session per unit of work, whatever thread or task it runs in
+        self._session_factory = orm.sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            bind=self._engine,
+        )
+
+        async_url = async_database_url(db_url)
+        self._async_engine = (
+            create_async_engine(async_url, pool_size=async_pool_size, max_overflow=async_max_overflow, **engine_options)
+            if async_url
+            else None
+        )
+        self._async_session_factory = (
+            async_sessionmaker(self._async_engine, autoflush=False, expire_on_commit=False)
+            if self._async_engine is not None
+            else None
         )
 
     def create_database(self) -> None:
         Base.metadata.create_all(self._engine)
 
+    async def dispose(self) -> None:
+        if self._async_engine is not None:
+            await self._async_engine.dispose()
+        if hasattr(self._engine, "dispose"):  # the mock engine has no pool
+            self._engine.dispose()
+
     @contextmanager  # type: ignore
     def session(self) -> Callable[..., AbstractContextManager[Session]]:  # type: ignore
-        session: Session = self._session_factory()
-        try:
-            yield session
-        except Exception:
-            self.logger.exception("Session rollback because of exception")
-            session.rollback()
-            raise
-        finally:
-            session.close()
+        with db_session("sync"):
+            session: Session = self._session_factory()
+            try:
+                yield session
+            except Exception:
+                self.logger.exception("Session rollback because of exception")
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+    @asynccontextmanager
+    async def async_session(self) -> AsyncIterator[AsyncSession]:
+        if self._async_session_factory is None:
+            raise RuntimeError("No async engine, the database URL is not PostgreSQL or asyncpg is not installed")
+        with db_session("async"):
+            session: AsyncSession = self._async_session_factory()
+            try:
+                yield session
+            except Exception:
+                self.logger.exception("Session rollback because of exception")
+                await session.rollback()
+                raise
+            finally:
+                await session.close()
+
+    @property
+    def async_session_factory(self) -> Optional[Callable[..., AbstractAsyncContextManager[AsyncSession]]]:
+        """`async_session` when an async engine is configured, None otherwise"""
+        return self.async_session if self._async_engine is not None else None
@@ -1,43 +1,283 @@
+import asyncio
+import hashlib
 import json
 import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
 from fastapi import HTTPException
-from typing import Any
+from typing import Any, AsyncIterator, Callable, Optional
 from http import HTTPStatus
+from urllib.parse import parse_qsl, urlencode, urlsplit
 
-import requests
+import httpx
 
+from app.infrastructure.meta.instagram_platform.rate_limit import GraphApiRateLimitedError, GraphApiRateLimiter
+from app.infrastructure.meta.instagram_platform.resilience import (
+    GraphApiResilience,
+    GraphApiUnavailableError,
+    RetryPolicy,
+    context_without_deadline,
+    remaining_time,
+)
+from app.infrastructure.meta.instagram_platform.single_flight import SingleFlight
+from app.infrastructure.monitoring.timing import graph_api_call
+from app.infrastructure.serialization import dumps, loads
 from app.models.schemas.instagram import Me
 
+GRAPH_BATCH_MAX_SIZE = 50  # hard limit of sub-requests in one Graph API batch call
+GRAPH_BATCH_CONCURRENCY = 2  # batch calls of a client in flight at once, each reserves GRAPH_BATCH_MAX_SIZE calls
+GRAPH_MEDIA_PAGE_SIZE = 100  # medias requested per page when following the cursors
+GRAPH_PAGE_DISCOVERY_PAGE_SIZE = 100  # pages of a user requested per `me/accounts` call
+# fields of a page as answered by each lookup, `id` always comes along
+USER_PAGE_FIELDS = ('access_token', 'category', 'category_list', 'name', 'id', 'tasks')  # `me/accounts` defaults
+INSTAGRAM_ACCOUNTS_FIELDS = ('instagram_business_account', 'about', 'bio', 'name')
+INSTAGRAM_ACCOUNT_FIELDS = ('about', 'instagram_business_account', 'genre', 'bio', 'category')
+
+
+@dataclass
+class GraphApiRawResponse:
+    """A Graph answer relayed without being parsed"""
+    url: str
+    status_code: int
+    content: bytes
+
+    def envelope(self) -> bytes:
+        """Same document as `build_response` gives, with the body spliced in as is"""
+        return b'{"url":' + dumps(self.url) + b',"json_data":' + self.content + b'}'
+
+
+@dataclass
+class GraphApiRequest:
+    method: str
+    url: str
+    params: dict[str, Any] = field(default_factory=dict)
+    data: Optional[dict[str, Any]] = None
+    calls: int = 1  # calls Meta counts against the budgets, one per sub-request of a batch
+    idempotent: Optional[bool] = None  # sent again when it may have reached Graph and failed, GETs by default
+
+    def __post_init__(self) -> None:
+        if self.idempotent is None:
+            self.idempotent = self.method == 'GET'
+
 
 class InstagramGraphApiClient:
-    def __init__(self, environment: str) -> None:
+    """
+    Every Graph call is described once as a `GraphApiRequest` and can be sent through
+    the shared async pool (`*_async` methods, used by the API routes) or through the
+    blocking pool by the sync methods, which stay as thin wrappers for scripts & shells
+    """
+
+    def __init__(
+            self,
+            environment: str,
+            http_client: httpx.Client,
+            async_http_client: httpx.AsyncClient,
+            on_oauth_error: Optional[Callable[[str], None]] = None,
+            rate_limiter: Optional[GraphApiRateLimiter] = None,
+            resilience: Optional[GraphApiResilience] = None,
+            graph_domain: str = 'https://graph.facebook.com/',
+            single_flight: Optional[SingleFlight] = None,
+            batch_concurrency: int = GRAPH_BATCH_CONCURRENCY,
+    ) -> None:
         self.logger = logging.getLogger(
             f"{__name__}.{self.__class__.__name__}",
         )
         self.environment = environment
+        self.http_client = http_client
+        self.async_http_client = async_http_client
+        self.on_oauth_error = on_oauth_error  # notified with the token when Graph rejects it, must not block
+        self.rate_limiter = rate_limiter  # paces the calls on the usage headers sent back by Graph
+        self.resilience = resilience or GraphApiResilience(RetryPolicy(max_attempts=1), 5, 30)
+        self.single_flight = single_flight or SingleFlight(enabled=False)  # shares identical concurrent GETs
+        # bounds the batches waiting on the rate limiter, a large request would otherwise outwait max_wait
+        self.batch_semaphore = asyncio.Semaphore(batch_concurrency)
         self.is_debug = self.environment != 'production'  # debug mode for api call
-        self.graph_domain = 'https://graph.facebook.com/'  # base domain for api calls
+        self.graph_domain = graph_domain  # base domain for api calls
         self.graph_version = 'v18.0'  # version of the meta graph api we are hitting
         self.endpoint_base = self.graph_domain + self.graph_version + '/'  # base endpoint with domain and version
 
+    async def aclose(self) -> None:
+        """Release the pooled connections, called on application shutdown"""
+        await self.async_http_client.aclose()
+        self.http_client.close()
+
+    def request_endpoint(self, request: GraphApiRequest) -> dict[str, str | Any]:
+        return self.build_response(request, self.send(request))
+
+    def request_endpoint_raw(self, request: GraphApiRequest) -> GraphApiRawResponse:
+        return self.build_raw_response(request, self.send(request))
+
+    async def request_endpoint_async(self, request: GraphApiRequest) -> dict[str, str | Any]:
+        return self.build_response(request, await self.fetch_async(request))
+
+    async def request_endpoint_raw_async(self, request: GraphApiRequest) -> GraphApiRawResponse:
+        return self.build_raw_response(request, await self.fetch_async(request))
+
+    async def fetch_async(self, request: GraphApiRequest) -> httpx.Response:
+        """
+        `send_async`, where a GET identical to one in flight waits for its answer instead of calling again.
+        Every caller builds its own response from the shared one, the parsed payloads are not shared.
+        """
+        if request.method != 'GET':
+            return await self.send_async(request)
+        return await self.single_flight.do(
+            self.coalescing_key(request), lambda: self.send_async(request), self.endpoint_name(request)
+        )
+
+    @staticmethod
+    def coalescing_key(request: GraphApiRequest) -> str:
+        """
+        Digest of the URL and its normalised params, the `paging.next` URLs carrying theirs in the query.
+        The token is hashed apart so that the calls of two users are never shared.
+        """
+        url = urlsplit(request.url)
+        params = {key: str(value) for key, value in parse_qsl(url.query)}
+        params.update({key: str(value) for key, value in request.params.items()})
+        token = params.pop('access_token', '')
+        digest = hashlib.sha256()
+        digest.update(f"{url.netloc}{url.path}?{urlencode(sorted(params.items()))}".encode())
+        digest.update(hashlib.sha256(token.encode()).digest())
+        return digest.hexdigest()[:16]
+
+    def send(self, request: GraphApiRequest) -> httpx.Response:
+        """Send `request` with retries, circuit breaking and pacing, return the final answer"""
+        endpoint = self.endpoint_name(request)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.resilience.before_attempt(endpoint)
+                time.sleep(self.reserve_call(request))
+                with graph_api_call(endpoint) as labels:
+                    outcome = self.http_client.request(
+                        request.method, request.url, params=request.params or None, data=request.data,
+                        timeout=self.resilience.timeout(self.http_client.timeout),
+                    )
+                    labels['status'] = str(outcome.status_code)
+            except httpx.TransportError as e:
+                outcome = e
+            except GraphApiUnavailableError as e:
+                raise self.unavailable(e)
+            try:
+                delay = self.resilience.after_attempt(endpoint, outcome, attempt, request.idempotent)
+            except GraphApiUnavailableError as e:
+                raise self.unavailable(e)
+            if delay is None:
+                return outcome
+            time.sleep(delay)
+
+    async def send_async(self, request: GraphApiRequest) -> httpx.Response:
+        endpoint = self.endpoint_name(request)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.resilience.before_attempt(endpoint)
+                await asyncio.sleep(self.reserve_call(request))
+                with graph_api_call(endpoint) as labels:
+                    outcome = await self.async_http_client.request(
+                        request.method, request.url, params=request.params or None, data=request.data,
+                        timeout=self.resilience.timeout(self.async_http_client.timeout),
+                    )
+                    labels['status'] = str(outcome.status_code)
+            except httpx.TransportError as e:
+                outcome = e
+            except GraphApiUnavailableError as e:
+                raise self.unavailable(e)
+            try:
+                delay = self.resilience.after_attempt(endpoint, outcome, attempt, request.idempotent)
+            except GraphApiUnavailableError as e:
+                raise self.unavailable(e)
+            if delay is None:
+                return outcome
+            await asyncio.sleep(delay)
+
+    def endpoint_name(self, request: GraphApiRequest) -> str:
+        path = request.url[len(self.endpoint_base):] if request.url.startswith(self.endpoint_base) else 'batch'
+        return self.resilience.endpoint_name(request.method, path.split('?')[0])
+
+    @staticmethod
+    def unavailable(error: GraphApiUnavailableError) -> HTTPException:
+        headers = None
+        if error.retry_after is not None:
+            headers = {'Retry-After': str(int(error.retry_after) + 1)}
+        return HTTPException(
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            detail=str(error),
+            headers=headers,
+        )
+
+    def reserve_call(self, request: GraphApiRequest) -> float:
+        """Seconds to wait before sending `request` so that we stay within the Graph API budget"""
+        if self.rate_limiter is None:
+            return 0.0
+        try:
+            wait = self.rate_limiter.reserve(self.business_id_of(request), request.calls)
+        except GraphApiRateLimitedError as e:
+            raise HTTPException(
+                status_code=HTTPStatus.TOO_MANY_REQUESTS,
+                detail=str(e),
+                headers={'Retry-After': str(int(e.retry_after) + 1)},
+            )
+        remaining = remaining_time()
+        if remaining is not None and wait >= remaining:
+            raise GraphApiUnavailableError("Graph API budget leaves no time to call before the deadline")
+        return wait
+
+    def business_id_of(self, request: GraphApiRequest) -> Optional[str]:
+        """The object id a call is about, the first path segment after the version"""
+        if not request.url.startswith(self.endpoint_base):
+            return None
+        return request.url[len(self.endpoint_base):].split('/')[0].split('?')[0] or None
+
     def request_get_endpoint(self, url, endpoint_params):
-        data = requests.get(url, endpoint_params)  # make get request
+        return self.request_endpoint(GraphApiRequest('GET', url, endpoint_params))
+
+    def build_response(self, request: GraphApiRequest, data: httpx.Response) -> dict[str, str | Any]:
         response = dict()  # hold response info
-        response['url'] = url  # url we are hitting
-        response['json_data'] = json.loads(data.content)  # response data from the api
-        if self.is_debug:  # display out response info
-            self.display_api_call_data(response, endpoint_params)  # display response
+        response['url'] = request.url  # url we are hitting
+        response['json_data'] = loads(data.content)  # response data from the api
+        self.after_response(request, data, response['json_data'])
+        return response
+
+    def build_raw_response(self, request: GraphApiRequest, data: httpx.Response) -> GraphApiRawResponse:
+        """The body is kept as sent by Graph, it is only parsed when it is an error"""
+        payload = loads(data.content) if data.is_error else None
+        self.after_response(request, data, payload)
+        return GraphApiRawResponse(request.url, data.status_code, data.content)
+
+    def after_response(self, request: GraphApiRequest, data: httpx.Response, payload: Any) -> None:
+        if self.rate_limiter is not None:
+            self.rate_limiter.update(data.headers, payload, self.business_id_of(request))
+        if self.is_debug and self.logger.isEnabledFor(logging.DEBUG):  # display out response info
+            self.display_api_call_data(request.url, request.params, payload if payload is not None else data.content)
+        if self.on_oauth_error is not None and self.is_oauth_error(payload):
+            token = self.token_of(request)
+            if token:
+                self.on_oauth_error(token)
+
+    @staticmethod
+    def token_of(request: GraphApiRequest) -> Optional[str]:
+        """The token a call was sent with, the `paging.next` URLs carry it in their query"""
+        token = request.params.get('access_token') or (request.data or {}).get('access_token')
+        return token or dict(parse_qsl(urlsplit(request.url).query)).get('access_token')
 
-        return response  # get and return content
+    @staticmethod
+    def is_oauth_error(payload: Any) -> bool:
+        return isinstance(payload, dict) and payload.get('error', {}).get('type') == 'OAuthException'
 
-    def display_api_call_data(self, response, endpoint_params):
+    def display_api_call_data(self, url: str, endpoint_params: dict[str, Any], payload: Any) -> None:
         """ Print out to cli response from api call """
         self.logger.debug("\nURL: ")
-        self.logger.debug(response['url'])
+        self.logger.debug(url)
         self.logger.debug("\nEndpoint Params: ")
         self.logger.debug(json.dumps(endpoint_params, indent=4))
         self.logger.debug("\nResponse: ")
-        self.logger.debug(json.dumps(response['json_data'], indent=4))
+        if isinstance(payload, bytes):  # passthrough, not parsed
+            self.logger.debug(payload.decode(errors='replace'))
+        else:
+            self.logger.debug(json.dumps(payload, indent=4))
 
     # Use this method to verify token
     def me(
@@ -45,16 +285,36 @@ class InstagramGraphApiClient:
             token: str,
     ) -> Me:
         try:
-            endpoint_params = dict()
-            endpoint_params['access_token'] = token
-            endpoint_params['fields'] = 'permissions,name'
-            url = self.endpoint_base + 'me'  # endpoint url
-            payload = self.request_get_endpoint(url, endpoint_params)['json_data']
-        except Exception as e:
+            payload = self.request_endpoint(self.me_request(token))['json_data']
+        except ValueError as e:  # Graph answered something which is not JSON
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_GATEWAY,
+                detail=str(e),
+            )
+        return self.parse_me(payload, token)
+
+    async def me_async(
+            self,
+            token: str,
+    ) -> Me:
+        try:
+            payload = (await self.request_endpoint_async(self.me_request(token)))['json_data']
+        except ValueError as e:  # Graph answered something which is not JSON
             raise HTTPException(
-                status_code=HTTPStatus.BAD_REQUEST,
+                status_code=HTTPStatus.BAD_GATEWAY,
                 detail=str(e),
             )
+        return self.parse_me(payload, token)
+
+    def me_request(self, token: str) -> GraphApiRequest:
+        endpoint_params = dict()
+        endpoint_params['access_token'] = token
+        endpoint_params['fields'] = 'permissions,name'
+        url = self.endpoint_base + 'me'  # endpoint url
+        return GraphApiRequest('GET', url, endpoint_params)
+
+    @staticmethod
+    def parse_me(payload: dict[str, Any], token: str) -> Me:
         if 'error' in payload:
             if payload['error']['type'] == 'OAuthException':
                 raise HTTPException(
@@ -71,65 +331,363 @@ class InstagramGraphApiClient:
         return user
 
     def get_instagram_account(self, access_token: str, page_id: str) -> dict[str, str | Any]:
+        return self.request_endpoint(self.instagram_account_request(access_token, page_id))
+
+    async def get_instagram_account_async(self, access_token: str, page_id: str) -> dict[str, str | Any]:
+        return await self.request_endpoint_async(self.instagram_account_request(access_token, page_id))
+
+    async def get_instagram_account_raw_async(self, access_token: str, page_id: str) -> GraphApiRawResponse:
+        return await self.request_endpoint_raw_async(self.instagram_account_request(access_token, page_id))
+
+    def instagram_account_request(self, access_token: str, page_id: str) -> GraphApiRequest:
         endpoint_params = dict()  # parameter to send to the endpoint
         endpoint_params['access_token'] = access_token
-        endpoint_params['fields'] = 'about,instagram_business_account,genre,bio,category'
+        endpoint_params['fields'] = ','.join(INSTAGRAM_ACCOUNT_FIELDS)
         url = self.endpoint_base + page_id  # endpoint url
-        return self.request_get_endpoint(url, endpoint_params)  # make the api call
+        return GraphApiRequest('GET', url, endpoint_params)
 
     def get_instagram_accounts(self, access_token: str) -> dict[str, str | Any]:
+        return self.request_endpoint(self.instagram_accounts_request(access_token))
+
+    async def get_instagram_accounts_async(self, access_token: str) -> dict[str, str | Any]:
+        return await self.request_endpoint_async(self.instagram_accounts_request(access_token))
+
+    async def get_instagram_accounts_raw_async(self, access_token: str) -> GraphApiRawResponse:
+        return await self.request_endpoint_raw_async(self.instagram_accounts_request(access_token))
+
+    def instagram_accounts_request(self, access_token: str) -> GraphApiRequest:
         endpoint_params = dict()  # parameter to send to the endpoint
         endpoint_params['access_token'] = access_token
-        endpoint_params['fields'] = 'instagram_business_account,about,bio,name'
+        endpoint_params['fields'] = ','.join(INSTAGRAM_ACCOUNTS_FIELDS)
         url = self.endpoint_base + 'me/accounts'
-        return self.request_get_endpoint(url, endpoint_params)  # make the api call
+        return GraphApiRequest('GET', url, endpoint_params)
 
     def get_user_pages(self, access_token: str) -> dict[str, str | Any]:
+        return self.request_endpoint(self.user_pages_request(access_token))
+
+    async def get_user_pages_async(self, access_token: str) -> dict[str, str | Any]:
+        return await self.request_endpoint_async(self.user_pages_request(access_token))
+
+    async def get_user_pages_raw_async(self, access_token: str) -> GraphApiRawResponse:
+        return await self.request_endpoint_raw_async(self.user_pages_request(access_token))
+
+    def user_pages_request(self, access_token: str) -> GraphApiRequest:
         endpoint_params = dict()  # parameter to send to the endpoint
         endpoint_params['access_token'] = access_token  # access token
         url = self.endpoint_base + 'me/accounts'  # endpoint url
-        return self.request_get_endpoint(url, endpoint_params)  # make the api call
+        return GraphApiRequest('GET', url, endpoint_params)
+
+    async def get_all_user_pages_async(self, access_token: str) -> list[dict[str, Any]]:
+        """
+        Every page the user manages with the fields of every page lookup, following `paging.next`
+        """
+        pages = []
+        request: Optional[GraphApiRequest] = self.page_discovery_request(access_token)
+        while request is not None:
+            payload = (await self.request_endpoint_async(request))['json_data']
+            if 'error' in payload:
+                raise HTTPException(
+                    status_code=HTTPStatus.UNAUTHORIZED if self.is_oauth_error(payload) else HTTPStatus.BAD_REQUEST,
+                    detail=str(payload),
+                )
+            pages.extend(payload.get('data', []))
+            next_url = payload.get('paging', {}).get('next')
+            request = GraphApiRequest('GET', next_url) if next_url else None
+        return pages
+
+    def page_discovery_request(self, access_token: str) -> GraphApiRequest:
+        endpoint_params = dict()  # parameter to send to the endpoint
+        endpoint_params['access_token'] = access_token
+        # every field the page lookups answer with, each is served from these
+        endpoint_params['fields'] = ','.join(dict.fromkeys(
+            USER_PAGE_FIELDS + INSTAGRAM_ACCOUNTS_FIELDS + INSTAGRAM_ACCOUNT_FIELDS
+        ))
+        endpoint_params['limit'] = GRAPH_PAGE_DISCOVERY_PAGE_SIZE
+        url = self.endpoint_base + 'me/accounts'
+        return GraphApiRequest('GET', url, endpoint_params)
 
     def create_image_container(self,
                                access_token: str,
                                instagram_business_account_id: str,
                                image_url: str,
-                               caption: str) -> dict[str, str | Any]:
+                               caption: Optional[str]) -> dict[str, str | Any]:
+        return self.request_endpoint(
+            self.image_container_request(access_token, instagram_business_account_id, image_url, caption)
+        )
+
+    async def create_image_container_async(self,
+                                           access_token: str,
+                                           instagram_business_account_id: str,
+                                           image_url: str,
+                                           caption: Optional[str]) -> dict[str, str | Any]:
+        return await self.request_endpoint_async(
+            self.image_container_request(access_token, instagram_business_account_id, image_url, caption)
+        )
+
+    def image_container_request(self,
+                                access_token: str,
+                                instagram_business_account_id: str,
+                                image_url: str,
+                                caption: Optional[str]) -> GraphApiRequest:
         endpoint_params = dict()
-        endpoint_params['access_token'] = access_token
-        url = self.endpoint_base + f"{instagram_business_account_id}/media?image_url={requests.utils.quote(image_url)}&caption={requests.utils.quote(caption)}"
-        data = requests.post(url, endpoint_params)  # make get request
-        response = dict()  # hold response info
-        response['url'] = url  # url we are hitting
-        response['json_data'] = json.loads(data.content)  # response data from the api
-        return response
+        endpoint_params['image_url'] = image_url
+        if caption is not None:
+            endpoint_params['caption'] = caption
+        url = self.endpoint_base + f"{instagram_business_account_id}/media"
+        return GraphApiRequest('POST', url, endpoint_params, data={'access_token': access_token})
 
     def publish_image(self,
                       access_token: str,
                       instagram_business_account_id: str,
                       instagram_container_id: str,
                       ) -> dict[str, str | Any]:
-        url = self.endpoint_base + f"{instagram_business_account_id}/media_publish?creation_id={instagram_container_id}&access_token={access_token}"
-        data = requests.post(url)  # make get request
-        response = dict()  # hold response info
-        response['url'] = url  # url we are hitting
-        response['json_data'] = json.loads(data.content)  # response data from the api
-        return response  # make the api call
+        return self.request_endpoint(
+            self.publish_image_request(access_token, instagram_business_account_id, instagram_container_id)
+        )
+
+    async def publish_image_async(self,
+                                  access_token: str,
+                                  instagram_business_account_id: str,
+                                  instagram_container_id: str,
+                                  ) -> dict[str, str | Any]:
+        return await self.request_endpoint_async(
+            self.publish_image_request(access_token, instagram_business_account_id, instagram_container_id)
+        )
+
+    def publish_image_request(self,
+                              access_token: str,
+                              instagram_business_account_id: str,
+                              instagram_container_id: str,
+                              ) -> GraphApiRequest:
+        endpoint_params = dict()
+        endpoint_params['creation_id'] = instagram_container_id
+        endpoint_params['access_token'] = access_token
+        url = self.endpoint_base + f"{instagram_business_account_id}/media_publish"
+        return GraphApiRequest('POST', url, endpoint_params)
+
+    def get_container_status(self,
+                             access_token: str,
+                             instagram_container_id: str,
+                             ) -> dict[str, str | Any]:
+        return self.request_endpoint(self.container_status_request(access_token, instagram_container_id))
+
+    async def get_container_status_async(self,
+                                         access_token: str,
+                                         instagram_container_id: str,
+                                         ) -> dict[str, str | Any]:
+        return await self.request_endpoint_async(self.container_status_request(access_token, instagram_container_id))
+
+    def container_status_request(self, access_token: str, instagram_container_id: str) -> GraphApiRequest:
+        endpoint_params = dict()  # parameter to send to the endpoint
+        endpoint_params['access_token'] = access_token
+        endpoint_params['fields'] = 'status_code,status'
+        url = self.endpoint_base + instagram_container_id  # endpoint url
+        return GraphApiRequest('GET', url, endpoint_params)
 
     def get_image_insights(self,
                            access_token: str,
                            media_id: str,
                            ) -> dict[str, str | Any]:
+        return self.request_endpoint(self.image_insights_request(access_token, media_id))
+
+    async def get_image_insights_async(self,
+                                       access_token: str,
+                                       media_id: str,
+                                       ) -> dict[str, str | Any]:
+        return await self.request_endpoint_async(self.image_insights_request(access_token, media_id))
+
+    def image_insights_request(self, access_token: str, media_id: str) -> GraphApiRequest:
         endpoint_params = dict()  # parameter to send to the endpoint
         endpoint_params['access_token'] = access_token
-        url = self.endpoint_base + media_id + '/insights?metric=likes,comments,reach,impressions'  # endpoint url
-        return self.request_get_endpoint(url, endpoint_params)  # make the api call
+        endpoint_params['metric'] = 'likes,comments,reach,impressions'
+        url = self.endpoint_base + media_id + '/insights'  # endpoint url
+        return GraphApiRequest('GET', url, endpoint_params)
+
+    async def get_images_insights_async(self,
+                                        access_token: str,
+                                        media_ids: list[str],
+                                        ) -> list[dict[str, Any]]:
+        """
+        Insights of many medias in as few round trips as possible: the media ids are
+        packed into Graph batch calls of GRAPH_BATCH_MAX_SIZE sub-requests, up to
+        `batch_concurrency` of them in flight. One item per media id is returned, in order,
+        failed ones included
+        """
+        chunks = [
+            media_ids[i:i + GRAPH_BATCH_MAX_SIZE] for i in range(0, len(media_ids), GRAPH_BATCH_MAX_SIZE)
+        ]
+        results = await asyncio.gather(*[
+            self.bounded_batch_async(
+                access_token, [self.image_insights_request(access_token, media_id) for media_id in chunk]
+            )
+            for chunk in chunks
+        ], return_exceptions=True)
+        items = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                self.logger.error("Insights batch of %s medias failed: %s", len(chunk), result)
+                items.extend(
+                    {'media_id': media_id, 'status_code': None, 'json_data': None, 'error': str(result)}
+                    for media_id in chunk
+                )
+                continue
+            for media_id, sub_response in zip(chunk, result, strict=True):
+                items.append({'media_id': media_id, **sub_response})
+        return items
+
+    async def bounded_batch_async(self,
+                                  access_token: str,
+                                  requests: list[GraphApiRequest],
+                                  ) -> list[dict[str, Any]]:
+        async with self.batch_semaphore:
+            return await self.batch_async(access_token, requests)
+
+    async def batch_async(self,
+                          access_token: str,
+                          requests: list[GraphApiRequest],
+                          ) -> list[dict[str, Any]]:
+        """
+        Send up to GRAPH_BATCH_MAX_SIZE requests in one Graph batch call, every sub-response
+        is returned as `status_code`, `json_data` and `error` (set when the sub-request failed),
+        one per request in order, those missing from the answer included
+        """
+        if len(requests) > GRAPH_BATCH_MAX_SIZE:
+            raise ValueError(f"A Graph batch accepts at most {GRAPH_BATCH_MAX_SIZE} requests")
+        batch = [
+            {'method': request.method, 'relative_url': self.relative_url(request)} for request in requests
+        ]
+        response = await self.request_endpoint_async(GraphApiRequest(
+            'POST',
+            self.graph_domain,
+            data={'access_token': access_token, 'batch': json.dumps(batch), 'include_headers': 'false'},
+            calls=len(requests),
+            idempotent=all(request.idempotent for request in requests),  # a POST, carrying GETs only
+        ))
+        payload = response['json_data']
+        if not isinstance(payload, list):  # the whole batch was rejected, e.g. invalid token
+            error = json.dumps(payload)
+            return [{'status_code': None, 'json_data': None, 'error': error} for _ in requests]
+        if len(payload) != len(requests):
+            self.logger.warning("Graph answered a batch of %s requests with %s items", len(requests), len(payload))
+        items = [self.parse_batch_item(item) for item in payload[:len(requests)]]
+        items.extend(
+            {'status_code': None, 'json_data': None, 'error': 'Missing from the batch response'}
+            for _ in range(len(requests) - len(items))
+        )
+        return items
+
+    def relative_url(self, request: GraphApiRequest) -> str:
+        path = request.url[len(self.graph_domain):]
+        params = {key: value for key, value in request.params.items() if key != 'access_token'}
+        return f"{path}?{urlencode(params)}" if params else path
+
+    @staticmethod
+    def parse_batch_item(item: Optional[dict[str, Any]]) -> dict[str, Any]:
+        if item is None:  # Graph returns null for sub-requests which did not complete in time
+            return {'status_code': None, 'json_data': None, 'error': 'Sub-request timed out'}
+        try:
+            body = json.loads(item.get('body') or 'null')
+        except ValueError:
+            body = item.get('body')
+        failed = item.get('code') != HTTPStatus.OK or (isinstance(body, dict) and 'error' in body)
+        return {
+            'status_code': item.get('code'),
+            'json_data': None if failed else body,
+            'error': json.dumps(body) if failed else None,
+        }
 
     def get_all_medias(self,
                        access_token: str,
                        instagram_container_id: str,
                        ) -> dict[str, str | Any]:
+        return self.request_endpoint(self.all_medias_request(access_token, instagram_container_id))
+
+    async def get_all_medias_async(self,
+                                   access_token: str,
+                                   instagram_container_id: str,
+                                   ) -> dict[str, str | Any]:
+        return await self.request_endpoint_async(self.all_medias_request(access_token, instagram_container_id))
+
+    async def get_all_medias_raw_async(self,
+                                       access_token: str,
+                                       instagram_container_id: str,
+                                       ) -> GraphApiRawResponse:
+        return await self.request_endpoint_raw_async(self.all_medias_request(access_token, instagram_container_id))
+
+    def all_medias_request(self, access_token: str, instagram_container_id: str) -> GraphApiRequest:
+        endpoint_params = dict()  # parameter to send to the endpoint
+        endpoint_params['access_token'] = access_token
+        endpoint_params['fields'] = 'permalink'
+        url = self.endpoint_base + instagram_container_id + '/media'  # endpoint url
+        return GraphApiRequest('GET', url, endpoint_params)
+
+    async def get_recent_medias_async(self,
+                                      access_token: str,
+                                      instagram_business_account_id: str,
+                                      limit: int,
+                                      ) -> dict[str, str | Any]:
+        """The newest medias of the account, to find the one a container was published as"""
         endpoint_params = dict()  # parameter to send to the endpoint
         endpoint_params['access_token'] = access_token
-        url = self.endpoint_base + instagram_container_id + '/media?fields=permalink'  # endpoint url
-        return self.request_get_endpoint(url, endpoint_params)  # make the api call
+        endpoint_params['fields'] = 'id,caption,timestamp'
+        endpoint_params['limit'] = limit
+        url = self.endpoint_base + instagram_business_account_id + '/media'  # endpoint url
+        return await self.request_endpoint_async(GraphApiRequest('GET', url, endpoint_params))
+
+    async def iter_all_medias_async(self,
+                                    access_token: str,
+                                    instagram_container_id: str,
+                                    limit: Optional[int] = None,
+                                    since: Optional[int] = None,
+                                    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Yield every media of the account, newest first, following `paging.next` cursors.
+        The next page is already requested while the items of the current one are consumed,
+        only one page is held in memory at any time. `since` is a unix timestamp.
+        """
+        endpoint_params = dict()  # parameter to send to the endpoint
+        endpoint_params['access_token'] = access_token
+        endpoint_params['fields'] = 'permalink,timestamp'
+        endpoint_params['limit'] = min(limit, GRAPH_MEDIA_PAGE_SIZE) if limit else GRAPH_MEDIA_PAGE_SIZE
+        if since is not None:
+            endpoint_params['since'] = since
+        url = self.endpoint_base + instagram_container_id + '/media'  # endpoint url
+        # the pages are streamed for longer than a request deadline, each one gets the full retry budget
+        loop = asyncio.get_running_loop()
+        context = context_without_deadline()
+        next_page = loop.create_task(
+            self.request_endpoint_async(GraphApiRequest('GET', url, endpoint_params)), context=context
+        )
+        yielded = 0
+        try:
+            while next_page is not None:
+                payload = (await next_page)['json_data']
+                next_page = None
+                if 'error' in payload:
+                    raise HTTPException(
+                        status_code=HTTPStatus.UNAUTHORIZED if self.is_oauth_error(payload) else HTTPStatus.BAD_REQUEST,
+                        detail=str(payload),
+                    )
+                next_url = payload.get('paging', {}).get('next')
+                if next_url and (limit is None or yielded + len(payload.get('data', [])) < limit):
+                    next_page = loop.create_task(
+                        self.request_endpoint_async(GraphApiRequest('GET', next_url)), context=context
+                    )
+                for media in payload.get('data', []):
+                    if since is not None and self.media_timestamp(media) < since:
+                        return
+                    yield media
+                    yielded += 1
+                    if limit is not None and yielded >= limit:
+                        return
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+                next_page.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    @staticmethod
+    def media_timestamp(media: dict[str, Any]) -> float:
+        timestamp = media.get('timestamp')
+        if not timestamp:
+            return float('inf')
+        return datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S%z').timestamp()
@@ -0,0 +1,235 @@
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Mapping, Optional, Tuple
+
+from app.infrastructure.cache.ttl_cache import TTLCache
+
+APP_USAGE_HEADER = "x-app-usage"
+BUSINESS_USAGE_HEADER = "x-business-use-case-usage"
+APP_THROTTLING_ERROR_CODES = (4, 17)  # app and user rate limits, every call of the app is held
+BUSINESS_THROTTLING_ERROR_CODES = (32, 613, 80002)  # page, custom and instagram rate limits, of one business
+THROTTLING_ERROR_CODES = APP_THROTTLING_ERROR_CODES + BUSINESS_THROTTLING_ERROR_CODES
+USAGE_WINDOW = 3600  # seconds, Meta reports the usage of the last hour: a business not heard of since is forgotten
+
+
+class GraphApiRateLimitedError(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Graph API budget is exhausted, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class UsageBudget:
+    """Usage of the rolling one-hour window reported by Meta, every value is a percentage"""
+    call_count: float = 0
+    total_time: float = 0
+    total_cputime: float = 0
+    estimated_time_to_regain_access: float = 0  # minutes
+    blocked_until: float = 0  # monotonic time until which no call should be sent
+    updated_at: Optional[float] = None
+
+    @property
+    def utilisation(self) -> float:
+        return max(self.call_count, self.total_time, self.total_cputime)
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, clock: Callable[[], float]) -> None:
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._updated_at = clock()
+
+    def reserve(self, rate: float, cost: float = 1) -> float:
+        """Take `cost` tokens, possibly on credit, and return how long the caller has to wait for them"""
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * rate)
+        self._updated_at = now
+        self.tokens -= cost
+        return 0.0 if self.tokens >= 0 else -self.tokens / rate
+
+    def refund(self, cost: float = 1) -> None:
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+
+class GraphApiRateLimiter:
+    """
+    Token-bucket scheduler fed by the `X-App-Usage` and `X-Business-Use-Case-Usage` headers.
+    Calls go at `max_rate` while the budget is below `soft_limit` %, then the rate decreases
+    linearly down to `min_rate` at `hard_limit` %, so we slow down before Meta throttles us.
+    Once throttled, calls are held until access is regained, or rejected when that is further
+    away than `max_wait` seconds: the calls of the whole app for an app or user rate limit error,
+    only the calls about the business concerned for a business use case one. The budgets of the
+    `max_businesses` businesses last reported on are kept, for an hour or while they are held.
+    """
+
+    def __init__(
+            self,
+            max_rate: float,
+            burst: float,
+            min_rate: float,
+            soft_limit: float,
+            hard_limit: float,
+            throttle_cooldown: float,
+            max_wait: float,
+            max_businesses: int = 10000,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self.max_rate = max_rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.soft_limit = soft_limit
+        self.hard_limit = hard_limit
+        self.throttle_cooldown = throttle_cooldown
+        self.max_wait = max_wait
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.app_budget = UsageBudget()
+        self._app_bucket = TokenBucket(burst, clock)
+        self._businesses: TTLCache[Tuple[UsageBudget, TokenBucket]] = TTLCache(max_businesses, USAGE_WINDOW, clock)
+
+    def rate_for(self, budget: UsageBudget) -> float:
+        utilisation = budget.utilisation
+        if utilisation <= self.soft_limit:
+            return self.max_rate
+        if utilisation >= self.hard_limit:
+            return self.min_rate
+        headroom = (self.hard_limit - utilisation) / (self.hard_limit - self.soft_limit)
+        return max(self.min_rate, self.max_rate * headroom)
+
+    def reserve(self, business_id: Optional[str] = None, cost: int = 1) -> float:
+        """
+        Book a slot for the next call and return the delay before it may be sent.
+        `business_id` is the object the call is about, it only matters once Meta has
+        reported a business use case budget for it. `cost` is the number of calls Meta
+        counts, e.g. the sub-requests of a batch.
+        """
+        with self._lock:
+            now = self._clock()
+            scopes = [(self.app_budget, self._app_bucket)]
+            business = self._businesses.get(business_id) if business_id else None
+            if business is not None:
+                scopes.append(business)
+            wait = max(budget.blocked_until - now for budget, _ in scopes)
+            if wait > self.max_wait:
+                raise GraphApiRateLimitedError(wait)
+            waits = [bucket.reserve(self.rate_for(budget), cost) for budget, bucket in scopes]
+            wait = max(wait, *waits)
+            if wait > self.max_wait:
+                for _, bucket in scopes:
+                    bucket.refund(cost)
+                raise GraphApiRateLimitedError(wait)
+            return wait
+
+    def update(self, headers: Mapping[str, str], payload: Any = None, business_id: Optional[str] = None) -> None:
+        """
+        Record the budgets sent back with a response, and the throttling error if it is one.
+        `business_id` is the object the call was about, as given to `reserve`.
+        """
+        with self._lock:
+            now = self._clock()
+            app_usage = self.parse_header(headers.get(APP_USAGE_HEADER))
+            if isinstance(app_usage, dict):
+                self.update_budget(self.app_budget, app_usage, now)
+            business_usage = self.parse_header(headers.get(BUSINESS_USAGE_HEADER))
+            if not isinstance(business_usage, dict):
+                business_usage = {}
+            for usage_business_id, usages in business_usage.items():
+                # one entry per use case type, the most used one is the bottleneck
+                usage = max(usages or [], key=self.utilisation_of, default=None)
+                if usage is not None:
+                    self.update_budget(self.business_budget(usage_business_id), usage, now)
+                    self.keep_business(usage_business_id, now)
+            code = self.throttling_error_code(payload)
+            if code in APP_THROTTLING_ERROR_CODES:
+                self.app_budget.blocked_until = max(self.app_budget.blocked_until, now + self.throttle_cooldown)
+                self.logger.warning(
+                    "Graph API throttled the app (code %s), holding calls for %.0fs",
+                    code, self.app_budget.blocked_until - now,
+                )
+            elif code is not None:
+                # the businesses the call was counted against, as reported, or the one it was about
+                throttled = list(business_usage) or ([business_id] if business_id else [])
+                for throttled_id in throttled:
+                    budget = self.business_budget(throttled_id)
+                    if budget.blocked_until <= now:  # no estimated_time_to_regain_access was sent
+                        budget.blocked_until = now + self.throttle_cooldown
+                    self.keep_business(throttled_id, now)
+                    self.logger.warning(
+                        "Graph API throttled business %s (code %s), holding its calls for %.0fs",
+                        throttled_id, code, budget.blocked_until - now,
+                    )
+
+    def business_budget(self, business_id: str) -> UsageBudget:
+        business = self._businesses.get(business_id)
+        if business is None:
+            business = (UsageBudget(), TokenBucket(self.burst, self._clock))
+            self._businesses.set(business_id, business)
+        return business[0]
+
+    def keep_business(self, business_id: str, now: float) -> None:
+        """Reported on again: kept for another usage window, or longer while its calls are held"""
+        business = self._businesses.get(business_id)
+        if business is not None:
+            self._businesses.set(business_id, business, ttl=max(USAGE_WINDOW, business[0].blocked_until - now))
+
+    @property
+    def business_budgets(self) -> dict[str, UsageBudget]:
+        return {business_id: budget for business_id, (budget, _) in self._businesses.items()}
+
+    @staticmethod
+    def utilisation_of(usage: dict[str, Any]) -> float:
+        return max(float(usage.get(key, 0)) for key in ('call_count', 'total_time', 'total_cputime'))
+
+    @staticmethod
+    def update_budget(budget: UsageBudget, usage: dict[str, Any], now: float) -> None:
+        budget.call_count = float(usage.get('call_count', 0))
+        budget.total_time = float(usage.get('total_time', 0))
+        budget.total_cputime = float(usage.get('total_cputime', 0))
+        budget.estimated_time_to_regain_access = float(usage.get('estimated_time_to_regain_access', 0))
+        if budget.estimated_time_to_regain_access:
+            budget.blocked_until = now + budget.estimated_time_to_regain_access * 60
+        budget.updated_at = now
+
+    @staticmethod
+    def parse_header(value: Optional[str]) -> Any:
+        if not value:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def throttling_error_code(payload: Any) -> Optional[int]:
+        if not isinstance(payload, dict) or not isinstance(payload.get('error'), dict):
+            return None
+        code = payload['error'].get('code')
+        return code if code in THROTTLING_ERROR_CODES else None
+
+    def snapshot(self) -> dict[str, Any]:
+        """Current budgets, for monitoring"""
+        with self._lock:
+            now = self._clock()
+
+            def describe(budget: UsageBudget) -> dict[str, Any]:
+                return {
+                    **{key: value for key, value in asdict(budget).items() if key not in ('blocked_until', 'updated_at')},
+                    'utilisation': budget.utilisation,
+                    'rate': self.rate_for(budget),
+                    'blocked_for': max(0.0, budget.blocked_until - now),
+                    'age': None if budget.updated_at is None else now - budget.updated_at,
+                }
+
+            return {
+                'app': describe(self.app_budget),
+                'business': {
+                    business_id: describe(budget) for business_id, budget in self.business_budgets.items()
+                },
+            }
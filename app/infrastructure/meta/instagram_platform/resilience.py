@@ -0,0 +1,249 @@
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Optional, Union
+
+import httpx
+
+TRANSIENT_ERROR_CODES = (1, 2)  # unknown error & service temporarily unavailable
+
+_deadline: ContextVar[Optional[float]] = ContextVar("graph_api_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Graph calls made inside the block, retries included, never outlive `seconds` from now.
+    Nested deadlines can only shrink the remaining budget, never extend it.
+    """
+    if seconds is None:
+        yield
+        return
+    expires_at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires_at if current is None else min(current, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def context_without_deadline() -> Context:
+    """Copy of the current context for work which outlives the request deadline, e.g. a streamed body"""
+    context = copy_context()
+    context.run(_deadline.set, None)
+    return context
+
+
+def remaining_time() -> Optional[float]:
+    expires_at = _deadline.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+
+class GraphApiUnavailableError(Exception):
+    """Graph did not answer usefully in time: retries exhausted, deadline reached or circuit open"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(
+            self,
+            failure_threshold: int,
+            recovery_timeout: float,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started_at: Optional[float] = None
+
+    def allow(self) -> Optional[float]:
+        """None when a call may go through, otherwise the seconds until the circuit is tried again"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return None
+            now = self._clock()
+            if self.state == self.OPEN:
+                retry_in = self.opened_at + self.recovery_timeout - now
+                if retry_in > 0:
+                    return retry_in
+                self.state = self.HALF_OPEN
+            # a single probe call at a time, the others keep failing fast; a probe which never
+            # reported back (cancelled, rejected by the rate limiter...) is replaced after a while
+            if self._probe_started_at is None or now - self._probe_started_at > self.recovery_timeout:
+                self._probe_started_at = now
+                return None
+            return self.recovery_timeout
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_started_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self._clock()
+            self._probe_started_at = None
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 0.2
+    max_delay: float = 2.0
+
+    def delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff, `attempt` starts at 1 for the first retry"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    @classmethod
+    def is_failure(cls, outcome: Union[httpx.Response, Exception]) -> bool:
+        """A failure of Graph rather than of the call: no answer, a 5xx or a transient error"""
+        if isinstance(outcome, Exception):
+            return isinstance(outcome, httpx.TransportError)
+        if outcome.status_code >= 500:
+            return True
+        if outcome.status_code < 400:
+            return False
+        error = cls.error_of(outcome)
+        return bool(error.get('is_transient')) or error.get('code') in TRANSIENT_ERROR_CODES
+
+    @classmethod
+    def is_retryable(cls, outcome: Union[httpx.Response, Exception], idempotent: bool = True) -> bool:
+        """
+        A call which is not idempotent (e.g. creating a container, publishing) may have been carried
+        out by Meta when it failed: it is only sent again when it surely was not sent, or Graph says
+        the error is transient
+        """
+        if not cls.is_failure(outcome):
+            return False
+        if idempotent:
+            return True
+        if isinstance(outcome, Exception):
+            return isinstance(outcome, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+        return cls.error_of(outcome).get('is_transient') is True
+
+    @staticmethod
+    def error_of(outcome: httpx.Response) -> dict[str, Any]:
+        try:
+            error = outcome.json().get('error', {})
+        except (ValueError, AttributeError):
+            return {}
+        return error if isinstance(error, dict) else {}
+
+
+class GraphApiResilience:
+    """
+    Retry with jittered backoff, a circuit breaker per endpoint and deadline propagation,
+    shared by every Graph call. It only takes the decisions: the sync and async senders of
+    the client run the attempts and the sleeps.
+    """
+
+    def __init__(
+            self,
+            retry_policy: RetryPolicy,
+            failure_threshold: int,
+            recovery_timeout: float,
+    ) -> None:
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self.retry_policy = retry_policy
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.circuit_breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def endpoint_name(method: str, path: str) -> str:
+        """`GET 17841400000/insights` -> `GET {id}/insights`, so one breaker guards one Graph endpoint"""
+        return f"{method} {re.sub(r'(?<![^/])[0-9_]+(?![^/])', '{id}', path.strip('/'))}"
+
+    def circuit_breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self.circuit_breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.recovery_timeout)
+                self.circuit_breakers[endpoint] = breaker
+            return breaker
+
+    def before_attempt(self, endpoint: str) -> None:
+        retry_in = self.circuit_breaker(endpoint).allow()
+        if retry_in is not None:
+            raise GraphApiUnavailableError(
+                f"Circuit for {endpoint} is open, Graph API is degraded", retry_after=retry_in
+            )
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise GraphApiUnavailableError(f"Deadline exceeded before calling {endpoint}")
+
+    def after_attempt(
+            self,
+            endpoint: str,
+            outcome: Union[httpx.Response, Exception],
+            attempt: int,
+            idempotent: bool = True,
+    ) -> Optional[float]:
+        """
+        Record the outcome of attempt number `attempt` (from 1). Returns None when the outcome
+        is final, or the delay to wait before retrying; raises once there is nothing left to try.
+        A failed call which is not `idempotent` is final unless it surely was not carried out.
+        """
+        breaker = self.circuit_breaker(endpoint)
+        if not self.retry_policy.is_failure(outcome):
+            breaker.record_success()
+            if isinstance(outcome, Exception):
+                raise outcome
+            return None
+        breaker.record_failure()
+        reason = outcome if isinstance(outcome, Exception) else f"HTTP {outcome.status_code}"
+        if not self.retry_policy.is_retryable(outcome, idempotent):
+            if isinstance(outcome, Exception):
+                raise GraphApiUnavailableError(f"{endpoint} failed, not retried as Graph may have carried it out: {reason}")
+            return None  # the error body goes back to the caller
+        if attempt >= self.retry_policy.max_attempts:
+            raise GraphApiUnavailableError(f"{endpoint} failed after {attempt} attempts: {reason}")
+        delay = self.retry_policy.delay(attempt)
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            raise GraphApiUnavailableError(f"{endpoint} failed and the deadline leaves no time to retry: {reason}")
+        self.logger.warning("%s failed (%s), retry %s in %.2fs", endpoint, reason, attempt, delay)
+        return delay
+
+    @staticmethod
+    def timeout(default: httpx.Timeout) -> Any:
+        """The client timeouts, capped by what is left of the deadline"""
+        remaining = remaining_time()
+        if remaining is None:
+            return default
+        remaining = max(remaining, 0.001)
+
+        def cap(value: Optional[float]) -> float:
+            return remaining if value is None else min(value, remaining)
+
+        return httpx.Timeout(
+            connect=cap(default.connect),
+            read=cap(default.read),
+            write=cap(default.write),
+            pool=cap(default.pool),
+        )
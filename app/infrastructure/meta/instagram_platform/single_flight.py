@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypeVar
+
+from app.infrastructure.monitoring.timing import GRAPH_API_COALESCED_CALLS, GRAPH_API_COALESCED_WAITERS
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight call and its outcome.
+    The call runs in a task of its own, a caller going away does not cancel it for the others.
+    It runs in the context of the first caller, the Graph deadline and request timings included.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self.enabled = enabled
+        self._calls: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}  # callers of each in-flight call, the first one included
+
+    async def do(self, key: str, call: Callable[[], Awaitable[T]], endpoint: str = "") -> T:
+        if not self.enabled:
+            return await call()
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self.forget(key, done))
+        else:
+            GRAPH_API_COALESCED_CALLS.inc(endpoint=endpoint)
+            self.logger.debug(f"{endpoint} joins the call in flight {key}")
+        self.join(key, endpoint)
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self.leave(key, endpoint)
+
+    def join(self, key: str, endpoint: str) -> None:
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        GRAPH_API_COALESCED_WAITERS.inc(endpoint=endpoint, key=key)
+
+    def leave(self, key: str, endpoint: str) -> None:
+        remaining = self._waiters.get(key, 1) - 1
+        if remaining:
+            self._waiters[key] = remaining
+            GRAPH_API_COALESCED_WAITERS.dec(endpoint=endpoint, key=key)
+        else:
+            # the series only lives while the call has callers, the keys do not pile up
+            self._waiters.pop(key, None)
+            GRAPH_API_COALESCED_WAITERS.remove(endpoint=endpoint, key=key)
+
+    def forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here as well, in case every caller went away
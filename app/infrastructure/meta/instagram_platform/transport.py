@@ -0,0 +1,63 @@
+import importlib.util
+from dataclasses import dataclass
+
+import httpx
+
+
+def is_http2_available() -> bool:
+    """HTTP/2 support in httpx depends on the optional `h2` package"""
+    return importlib.util.find_spec("h2") is not None
+
+
+@dataclass
+class GraphApiTransportSettings:
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 5.0
+    http2: bool = True
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+    @property
+    def use_http2(self) -> bool:
+        return bool(self.http2) and is_http2_available()
+
+
+def create_async_http_client(settings: GraphApiTransportSettings) -> httpx.AsyncClient:
+    """
+    Shared keep-alive pool for every async Graph API call of this worker,
+    the connections are reused between requests instead of a new TLS handshake per call
+    """
+    return httpx.AsyncClient(
+        limits=settings.limits,
+        timeout=settings.timeout,
+        http2=settings.use_http2,
+    )
+
+
+def create_http_client(settings: GraphApiTransportSettings) -> httpx.Client:
+    """Blocking counterpart of `create_async_http_client` backing the sync wrappers"""
+    return httpx.Client(
+        limits=settings.limits,
+        timeout=settings.timeout,
+        http2=settings.use_http2,
+    )
@@ -0,0 +1,308 @@
+import fcntl
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, suppress
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+Series = Dict[LabelValues, List[float]]  # the values of a metric by label values
+M = TypeVar("M", bound="Metric")
+
+WORKER_FILE = re.compile(r"worker-(\d+)\.json")
+MERGING_FILE = re.compile(r"merging-\d+-\d+\.json")
+EXITED_FILE = "exited.json"  # the sum of the workers which exited
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Sequence[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{escape_label_value(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = ""
+    live = False  # values which only hold while their process runs, e.g. in-flight gauges
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def label_values(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def collect(self) -> Series:
+        raise NotImplementedError
+
+    def samples(self, series: Series) -> List[str]:
+        raise NotImplementedError
+
+    def render(self, series: Optional[Series] = None) -> str:
+        return "\n".join([
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(self.collect() if series is None else series),
+        ])
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            label_names: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}  # bucket counts, [sum]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    counts[index] += 1
+                    break
+            total[0] += value
+
+    def collect(self) -> Series:
+        """Bucket counts then the sum, by label values"""
+        with self._lock:
+            return {key: [*counts, total[0]] for key, (counts, total) in self._series.items()}
+
+    def samples(self, series: Series) -> List[str]:
+        lines = []
+        for key, values in sorted(series.items()):
+            counts, total = values[:-1], values[-1]
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = format_labels(self.label_names + ("le",), key + (format_value(upper_bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge(Metric):
+    kind = "gauge"
+    live = True
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def remove(self, **labels: str) -> None:
+        """Drop a series, for labels which only live for a while"""
+        key = self.label_values(labels)
+        with self._lock:
+            self._values.pop(key, None)
+
+    def collect(self) -> Series:
+        with self._lock:
+            return {key: [value] for key, value in self._values.items()}
+
+    def samples(self, series: Series) -> List[str]:
+        return [
+            f"{self.name}{format_labels(self.label_names, key)} {format_value(values[0])}"
+            for key, values in sorted(series.items())
+        ]
+
+
+class Counter(Gauge):
+    kind = "counter"
+    live = False
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        raise ValueError("A counter only goes up")
+
+
+class MetricsRegistry:
+    """
+    The metrics in the Prometheus text exposition format. Every gunicorn worker counts its own, once
+    `share` is called it also writes them to a file of a directory shared by the workers, and a
+    scrape answers with their sum. The files of workers which exited are folded into a single one,
+    still counted so that the counters and histograms never go down, their live metrics left out.
+    """
+
+    def __init__(self) -> None:
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self.metrics: Dict[str, Metric] = {}
+        self.directory: Optional[str] = None
+        self._path = ""
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, metric: M) -> M:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def collect(self) -> Dict[str, Series]:
+        return {name: metric.collect() for name, metric in self.metrics.items()}
+
+    def share(self, directory: str, interval: float) -> None:
+        """Write the metrics of this process to `directory` every `interval` seconds, from a thread"""
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._path = os.path.join(directory, f"worker-{os.getpid()}.json")
+        if os.path.exists(self._path):  # left by an exited worker with the same pid, its counts still add up
+            self.merge_exited([self._path])
+        self.flush()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.flush_every, args=(interval,), name="metrics-flush", daemon=True)
+        self._thread.start()
+
+    def flush_every(self, interval: float) -> None:
+        while not self._stopping.wait(interval):
+            try:
+                self.flush()
+            except OSError as e:
+                self.logger.warning(f"Writing the metrics to {self._path} failed: {e!r}")
+
+    def flush(self) -> None:
+        self.write(self._path, self.snapshot(self.collect()))
+
+    @staticmethod
+    def snapshot(collected: Dict[str, Series]) -> Dict[str, Any]:
+        return {name: [[list(key), values] for key, values in series.items()] for name, series in collected.items()}
+
+    @staticmethod
+    def write(path: str, content: Any) -> None:
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(content, file)
+        os.replace(temporary_path, path)  # a scrape never reads a file half written
+
+    def read(self, path: str) -> Optional[Any]:
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Reading the metrics of {path} failed: {e!r}")
+            return None
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def add(self, totals: Dict[str, Series], snapshot: Dict[str, Any], running: bool) -> None:
+        """Add the series of a worker file to `totals`, its live ones only while the worker is `running`"""
+        for name, series in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric is None or (metric.live and not running):
+                continue
+            for key, values in series:
+                total = totals.setdefault(name, {}).setdefault(tuple(key), [0] * len(values))
+                for index, value in enumerate(values):
+                    total[index] += value
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Exclusive lock among the workers sharing the directory"""
+        with open(os.path.join(self.directory or "", "exited.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def exited_worker_files(self) -> List[str]:
+        paths = []
+        for file_name in os.listdir(self.directory or ""):
+            worker = WORKER_FILE.fullmatch(file_name)
+            if worker is not None and int(worker.group(1)) != os.getpid() and not process_running(int(worker.group(1))):
+                paths.append(os.path.join(self.directory or "", file_name))
+        return paths
+
+    def merge_exited(self, paths: Optional[List[str]] = None) -> None:
+        """
+        Fold the files of the workers which exited into `exited.json`. Each one is first renamed to a
+        unique name, which `exited.json` records once it is counted: a merge which dies halfway neither
+        loses a file nor counts it twice
+        """
+        directory = self.directory or ""
+        with self.locked():
+            for path in self.exited_worker_files() if paths is None else paths:
+                with suppress(FileNotFoundError):  # merged meanwhile by another worker
+                    os.replace(path, os.path.join(directory, f"merging-{os.getpid()}-{time.time_ns()}.json"))
+            merging = sorted(file_name for file_name in os.listdir(directory) if MERGING_FILE.fullmatch(file_name))
+            if not merging:
+                return
+            exited = self.read(os.path.join(directory, EXITED_FILE)) or {"merged": [], "metrics": {}}
+            totals: Dict[str, Series] = {}
+            self.add(totals, exited["metrics"], running=False)
+            for file_name in merging:
+                if file_name not in exited["merged"]:
+                    self.add(totals, self.read(os.path.join(directory, file_name)) or {}, running=False)
+            self.write(os.path.join(directory, EXITED_FILE), {"merged": merging, "metrics": self.snapshot(totals)})
+            for file_name in merging:
+                os.unlink(os.path.join(directory, file_name))
+
+    def shared(self) -> Dict[str, Series]:
+        """The metrics of this process plus the last ones every other worker wrote"""
+        totals = self.collect()
+        self.merge_exited()
+        directory = self.directory or ""
+        exited = self.read(os.path.join(directory, EXITED_FILE))
+        if exited is not None:
+            self.add(totals, exited["metrics"], running=False)
+        for file_name in os.listdir(directory):
+            path = os.path.join(directory, file_name)
+            if WORKER_FILE.fullmatch(file_name) is None or path == self._path:
+                continue
+            snapshot = self.read(path)  # None when the worker just exited and its file was merged
+            if snapshot is not None:
+                self.add(totals, snapshot, running=True)
+        return totals
+
+    def render(self) -> str:
+        collected = self.shared() if self.directory else self.collect()
+        return "\n".join(metric.render(collected.get(name, {})) for name, metric in self.metrics.items()) + "\n"
+
+
+def process_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,16 @@
+import sys
+from typing import Any, Optional
+
+
+def init_sentry(dsn: Optional[str], **options: Any) -> None:
+    """Without a DSN there is nowhere to report to, the SDK is not even imported"""
+    if not dsn:
+        return
+    import sentry_sdk
+    sentry_sdk.init(dsn=dsn, **options)
+
+
+def capture_exception(error: BaseException) -> None:
+    sentry_sdk = sys.modules.get("sentry_sdk")
+    if sentry_sdk is not None:
+        sentry_sdk.capture_exception(error)
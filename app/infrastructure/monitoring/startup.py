@@ -0,0 +1,85 @@
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+DEFERRED_MODULES = ("boto3", "PIL.Image", "sentry_sdk")  # heavy imports left out of the boot, loaded on first use
+
+
+class StartupReport:
+    """
+    Where the boot of a worker went: the imports of `app.main`, then every startup step, the
+    background warm-up of the lazy mode included. Logged once the boot and the warm-up are over,
+    served by /monitoring/startup.
+    """
+
+    def __init__(self, imports_started_at: float, imports_done_at: float) -> None:
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self.lazy = False  # resources created in the background once the worker is ready
+        self.imports = imports_done_at - imports_started_at
+        self.started_at = imports_started_at
+        self.ready_at: float = 0.0  # the worker accepts connections from then on
+        self.warmed_at: float = 0.0
+        self.warm_up_error: Optional[str] = None  # the worker stops when its warm-up fails
+        self.steps: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()  # the warm-up reports from a thread of its own
+
+    @contextmanager
+    def step(self, name: str, phase: str = "boot") -> Iterator[None]:
+        started_at = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            with self._lock:
+                self.steps.append({
+                    "name": name,
+                    "phase": phase,
+                    "seconds": round(time.perf_counter() - started_at, 4),
+                    **({"error": error} if error else {}),
+                })
+
+    def imported(self, modules: Sequence[str]) -> None:
+        """Import `modules` now, each timed as a step, e.g. the `DEFERRED_MODULES` used during the warm-up"""
+        for module in modules:
+            if module not in sys.modules:
+                with self.step(f"import {module}", phase="warm-up"):
+                    __import__(module)
+
+    def booted(self) -> None:
+        self.ready_at = time.perf_counter()
+        self.logger.info(f"Worker ready in {self.ready_at - self.started_at:.3f}s: {self.summary('boot')}")
+
+    def warmed(self) -> None:
+        self.warmed_at = time.perf_counter()
+        self.logger.info(f"Warm-up done in {self.warmed_at - self.ready_at:.3f}s: {self.summary('warm-up')}")
+
+    def failed(self, error: Exception) -> None:
+        self.warm_up_error = repr(error)
+
+    def summary(self, phase: str) -> str:
+        with self._lock:
+            steps = [step for step in self.steps if step["phase"] == phase]
+        described = [f"imports {self.imports:.3f}s"] if phase == "boot" else []
+        described += [f"{step['name']} {step['seconds']:.3f}s" for step in steps]
+        return ", ".join(described)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = list(self.steps)
+        return {
+            "lazy": self.lazy,
+            "imports_seconds": round(self.imports, 4),
+            "ready_seconds": round(self.ready_at - self.started_at, 4) if self.ready_at else None,
+            "warm_up_seconds": round(self.warmed_at - self.ready_at, 4) if self.warmed_at else None,
+            "warm_up_error": self.warm_up_error,
+            "steps": steps,
+            "deferred_modules": {module: module in sys.modules for module in DEFERRED_MODULES},
+        }
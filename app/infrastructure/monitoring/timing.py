@@ -0,0 +1,129 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import ContextManager, Dict, Iterator, List, Optional
+
+from app.infrastructure.monitoring.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+GRAPH_API = "graph"
+S3 = "s3"
+DB = "db"
+
+REGISTRY = MetricsRegistry()
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to answer an API request", ("method", "route", "status"),
+))
+HTTP_REQUEST_STAGE_DURATION = REGISTRY.register(Histogram(
+    "http_request_stage_duration_seconds", "Time an API request spent waiting on a dependency", ("route", "stage"),
+))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "API requests being answered", ("method",),
+))
+GRAPH_API_CALL_DURATION = REGISTRY.register(Histogram(
+    "graph_api_call_duration_seconds", "Duration of a Graph API HTTP call", ("endpoint", "status"),
+))
+GRAPH_API_CALLS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "graph_api_calls_in_flight", "Graph API HTTP calls waiting for an answer", ("endpoint",),
+))
+GRAPH_API_COALESCED_WAITERS = REGISTRY.register(Gauge(
+    "graph_api_coalesced_waiters", "Callers sharing an in-flight Graph API GET, per call key", ("endpoint", "key"),
+))
+GRAPH_API_COALESCED_CALLS = REGISTRY.register(Counter(
+    "graph_api_coalesced_calls_total", "Graph API GETs answered by an identical call already in flight", ("endpoint",),
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "cache_requests_total", "Shared cache reads by namespace and result: hit, miss or backend error",
+    ("namespace", "result"),
+))
+S3_OPERATION_DURATION = REGISTRY.register(Histogram(
+    "s3_operation_duration_seconds", "Duration of an S3 operation", ("operation", "status"),
+))
+S3_OPERATIONS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "s3_operations_in_flight", "S3 operations waiting for an answer", ("operation",),
+))
+DB_SESSION_DURATION = REGISTRY.register(Histogram(
+    "db_session_duration_seconds", "Time a DB session was held", ("engine", "status"),
+))
+DB_SESSIONS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "db_sessions_in_flight", "DB sessions currently held", ("engine",),
+))
+
+
+class RequestTimings:
+    """Time spent per dependency by one API request, the worker threads it hands work to included"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.stages: Dict[str, List[float]] = {}  # stage -> [seconds, calls]
+
+    def add(self, stage: str, duration: float) -> None:
+        with self._lock:
+            totals = self.stages.setdefault(stage, [0.0, 0])
+            totals[0] += duration
+            totals[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        """`Server-Timing` header value, durations in milliseconds"""
+        with self._lock:
+            stages = sorted(self.stages.items())
+        entries = [f'{stage};dur={duration * 1000:.1f};desc="{calls:.0f} calls"' for stage, (duration, calls) in stages]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def track_request(method: str) -> Iterator[RequestTimings]:
+    """Collect the timings of the dependencies called within the block"""
+    timings = RequestTimings()
+    token = _request_timings.set(timings)
+    HTTP_REQUESTS_IN_FLIGHT.inc(method=method)
+    try:
+        yield timings
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec(method=method)
+        _request_timings.reset(token)
+
+
+def record_request(method: str, route: str, status: int, duration: float, timings: RequestTimings) -> None:
+    HTTP_REQUEST_DURATION.observe(duration, method=method, route=route, status=str(status))
+    for stage, (stage_duration, _) in timings.stages.items():
+        HTTP_REQUEST_STAGE_DURATION.observe(stage_duration, route=route, stage=stage)
+
+
+@contextmanager
+def observe(stage: str, histogram: Histogram, in_flight: Gauge, **labels: str) -> Iterator[Dict[str, str]]:
+    """
+    Time the block into `histogram` and the current request timings. The labels are yielded so that
+    the block can set the `status` it got, an exception sets it to its class name.
+    """
+    labels = {"status": "ok", **labels}
+    in_flight.inc(**labels)
+    started_at = time.perf_counter()
+    try:
+        yield labels
+    except BaseException as e:
+        labels["status"] = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - started_at
+        in_flight.dec(**labels)
+        histogram.observe(duration, **labels)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(stage, duration)
+
+
+def graph_api_call(endpoint: str) -> ContextManager[Dict[str, str]]:
+    return observe(GRAPH_API, GRAPH_API_CALL_DURATION, GRAPH_API_CALLS_IN_FLIGHT, endpoint=endpoint)
+
+
+def s3_operation(operation: str) -> ContextManager[Dict[str, str]]:
+    return observe(S3, S3_OPERATION_DURATION, S3_OPERATIONS_IN_FLIGHT, operation=operation)
+
+
+def db_session(engine: str) -> ContextManager[Dict[str, str]]:
+    return observe(DB, DB_SESSION_DURATION, DB_SESSIONS_IN_FLIGHT, engine=engine)
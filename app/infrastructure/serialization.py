@@ -0,0 +1,31 @@
+import importlib.util
+import json
+from typing import Any, Type
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+
+def is_orjson_available() -> bool:
+    """The fast JSON codec depends on the optional `orjson` package"""
+    return importlib.util.find_spec("orjson") is not None
+
+
+if is_orjson_available():
+    import orjson
+
+    def loads(data: bytes | str) -> Any:
+        return orjson.loads(data)
+
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value)
+else:
+    def loads(data: bytes | str) -> Any:
+        return json.loads(data)
+
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+
+
+def json_response_class() -> Type[JSONResponse]:
+    """orjson backed responses when it is installed, the standard encoder otherwise"""
+    return ORJSONResponse if is_orjson_available() else JSONResponse
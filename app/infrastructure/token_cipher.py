@@ -0,0 +1,53 @@
+from typing import Optional
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+ENCRYPTED_PREFIX = "fernet:"
+
+
+class TokenCipherError(Exception):
+    pass
+
+
+class TokenCipher:
+    """
+    Encrypts the access tokens stored in the DB or the cache (Fernet: AES-CBC with an HMAC). `keys` is a
+    comma separated list of Fernet keys, the first one encrypts and every one decrypts, so a key is rotated
+    by putting the new one first. `setting` names where the keys come from in the errors.
+    Values written before encryption was enabled carry no prefix and are read as they are.
+    """
+
+    def __init__(self, keys: Optional[str], setting: str = "PUBLISH_JOBS_TOKEN_KEY") -> None:
+        secrets = [key.strip() for key in (keys or "").split(",") if key.strip()]
+        if not secrets:
+            raise TokenCipherError(f"No key to encrypt the stored access tokens with, set {setting}")
+        self._fernet = MultiFernet([self.fernet(secret, setting) for secret in secrets])
+
+    @classmethod
+    def optional(cls, keys: Optional[str], setting: str) -> Optional["TokenCipher"]:
+        """None when no key is set, for tokens which are not stored at all then"""
+        return cls(keys, setting) if keys and keys.strip(" ,") else None
+
+    @staticmethod
+    def fernet(secret: str, setting: str) -> Fernet:
+        """Only generated keys are accepted, a passphrase or a placeholder would be a guessable key"""
+        try:
+            return Fernet(secret)
+        except ValueError:
+            raise TokenCipherError(
+                f"{setting} holds a value which is not a Fernet key, generate one with "
+                "`python -c 'from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())'`"
+            )
+
+    def encrypt(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        return ENCRYPTED_PREFIX + self._fernet.encrypt(value.encode()).decode()
+
+    def decrypt(self, value: Optional[str]) -> Optional[str]:
+        if value is None or not value.startswith(ENCRYPTED_PREFIX):
+            return value
+        try:
+            return self._fernet.decrypt(value[len(ENCRYPTED_PREFIX):].encode()).decode()
+        except InvalidToken:
+            raise TokenCipherError("Stored access token cannot be decrypted with the configured keys")
@@ -1,13 +1,25 @@
+import asyncio
 import logging
+import signal
 import time
+from contextlib import asynccontextmanager, suppress
+from typing import Any, AsyncIterator, List
 
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
-from sentry_sdk import capture_exception
 from starlette.middleware.cors import CORSMiddleware
 
+from app import IMPORTS_STARTED_AT
 from app.container.containers import Container
+from app.infrastructure.meta.instagram_platform.resilience import deadline
+from app.infrastructure.monitoring.sentry import capture_exception
+from app.infrastructure.monitoring.startup import DEFERRED_MODULES, StartupReport
+from app.infrastructure.monitoring.timing import REGISTRY, record_request, track_request
+from app.infrastructure.serialization import json_response_class
+from app.routes import metrics
 from app.routes.api_v1 import api as api_v1
+from app.routes.workers.publish_job_worker import PublishJobWorker
+from app.routes.workers.upload_index_reconcile_worker import UploadIndexReconcileWorker
 
 logger = logging.getLogger()
 API_V1_STR = "/api/v1"
@@ -15,26 +27,150 @@ API_V1_STR = "/api/v1"
 
 async def catch_exceptions_middleware(request: Request, call_next):  # type: ignore
     start_time = time.time()
-    response = await call_next(request)
+    with track_request(request.method) as timings, deadline(request.app.state.graph_api_request_deadline):
+        response = await call_next(request)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
+    # time spent in Graph, S3 and the DB, a streamed body is only accounted for up to its first bytes
+    response.headers["Server-Timing"] = timings.server_timing(process_time)
+    route = request.scope.get("route")
+    record_request(request.method, getattr(route, "path", "unmatched"), response.status_code, process_time, timings)
     return response
 
 
+def initialise(container: Container, startup_report: StartupReport, phase: str) -> None:
+    """
+    Resources the lazy mode leaves to the warm-up: Sentry, the DB schema, the AWS clients, the upload index
+    and the image pool
+    """
+    with startup_report.step("sentry", phase):
+        container.sentry_sdk()
+    with startup_report.step("db schema", phase):
+        container.db().create_database()
+    with startup_report.step("aws clients", phase):  # STS get_session_token call
+        container.s3_client()
+    with startup_report.step("upload index", phase):  # Bloom filter of the uploaded keys
+        container.content_hash_index().load()
+    with startup_report.step("image pool", phase):
+        container.image_process_pool().start()
+    with startup_report.step("resources", phase):
+        container.init_resources()
+
+
+def check_token_keys(container: Container) -> None:
+    """A missing or invalid key fails the boot, not the first job or lookup using it"""
+    if container.config.core.publish_jobs.token_key() or container.config.core.publish_jobs.worker_enabled():
+        container.token_cipher()
+    container.page_token_cipher()
+
+
+def deferred_modules(container: Container) -> List[str]:
+    """The heavy imports the warm-up makes, sentry_sdk only when there is a DSN to report to"""
+    sentry_dsn = container.config.infrastructures.sentry.dsn().get(container.env_name())
+    return [module for module in DEFERRED_MODULES if module != "sentry_sdk" or sentry_dsn]
+
+
+def warm_up(container: Container, startup_report: StartupReport) -> None:
+    """Run in a thread once the worker accepts connections, until then a resource is created on first use"""
+    startup_report.imported(deferred_modules(container))
+    initialise(container, startup_report, "warm-up")
+    startup_report.warmed()
+
+
+def start_background_workers(container: Container) -> List[Any]:
+    """
+    Started in this order, stopped in the reverse one: the metadata write-behind outlives
+    the publish jobs, which still queue rows while stopping
+    """
+    workers: List[Any] = []
+    if container.config.core.publish_jobs.metadata_write_behind.enabled():
+        metadata_write_behind = container.publishing_metadata_write_behind()
+        metadata_write_behind.start()
+        workers.append(metadata_write_behind)
+    if container.config.core.publish_jobs.worker_enabled():
+        publish_job_worker = PublishJobWorker(
+            container.media_publish_job_service(),
+            concurrency=container.config.core.publish_jobs.concurrency(),
+            poll_interval=container.config.core.publish_jobs.poll_interval(),
+        )
+        publish_job_worker.start()
+        workers.append(publish_job_worker)
+    if container.config.core.image_upload.content_index.reconcile_enabled():
+        upload_index_reconcile_worker = UploadIndexReconcileWorker(
+            container.content_hash_index(),
+            container.background_lease_repository(),
+            bucket_name=container.s3_image_bucket(),
+            interval=container.config.core.image_upload.content_index.reconcile_interval(),
+        )
+        upload_index_reconcile_worker.start()
+        workers.append(upload_index_reconcile_worker)
+    return workers
+
+
+@asynccontextmanager
+async def lifespan(fast_api_app: FastAPI) -> AsyncIterator[None]:
+    container = fast_api_app.container
+    startup_report = fast_api_app.state.startup_report
+    workers: List[Any] = []
+    if container.config.core.monitoring.metrics_dir():
+        REGISTRY.share(
+            container.config.core.monitoring.metrics_dir(),
+            container.config.core.monitoring.metrics_flush_interval(),
+        )
+
+    async def warm_up_then_start_workers() -> None:
+        try:
+            await asyncio.to_thread(warm_up, container, startup_report)
+        except Exception as e:  # as fatal as a failed eager boot, gunicorn replaces the worker
+            startup_report.failed(e)
+            logger.critical(f"Warm-up failed, stopping the worker: {e!r}")
+            signal.raise_signal(signal.SIGTERM)
+            return
+        workers.extend(start_background_workers(container))
+
+    warm_up_task = None
+    if startup_report.lazy:  # the workers need the DB schema and the AWS clients, they wait for the warm-up
+        warm_up_task = asyncio.create_task(warm_up_then_start_workers())
+    else:
+        workers.extend(start_background_workers(container))
+    startup_report.booted()
+    yield
+    if warm_up_task is not None:  # a warm-up thread still running finishes alone, no worker is started after it
+        warm_up_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await warm_up_task
+    for worker in reversed(workers):
+        await worker.stop()
+    await container.instagram_graph_api_client().aclose()
+    container.cache().close()
+    container.thumbnail_queue().shutdown()
+    container.image_process_pool().shutdown()  # under its lock, a warm-up still running cannot create it after
+    await container.db().dispose()
+    REGISTRY.stop()
+
+
 def create_app() -> FastAPI:
-    container = Container()
-    container.config()
-    container.logging()
+    startup_report = StartupReport(IMPORTS_STARTED_AT, time.perf_counter())
+    with startup_report.step("config"):
+        container = Container()
+        container.config()
+        container.logging()
     logger.debug("START create_app FastAPI")
-    container.db()
-    container.sentry_sdk()
-
-    container.db().create_database()
-    container.init_resources()
+    with startup_report.step("db engine"):
+        container.db()
+    with startup_report.step("token keys"):
+        check_token_keys(container)
+    startup_report.lazy = container.config.core.app.lazy_init()
+    if not startup_report.lazy:
+        initialise(container, startup_report, "boot")
 
-    fast_api_app = FastAPI()
+    fast_api_app = FastAPI(lifespan=lifespan, default_response_class=json_response_class())
     fast_api_app.container = container
+    fast_api_app.state.startup_report = startup_report
+    fast_api_app.state.monitoring_token = container.config.core.monitoring.token()
+    fast_api_app.state.graph_api_request_deadline = container.config.infrastructures.meta.graph_api.resilience.request_deadline()
     fast_api_app.include_router(api_v1.router, prefix=API_V1_STR)
+    fast_api_app.include_router(metrics.router)
     # Set all CORS enabled origins
     fast_api_app.add_middleware(
         CORSMiddleware,
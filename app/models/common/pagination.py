@@ -1,8 +1,11 @@
+import base64
+import json
 import math
-from typing import Any, Generic, TypeVar
+from typing import Any, Generic, List, Optional, TypeVar
 
 from pydantic import BaseModel
 from pydantic.generics import GenericModel
+from sqlalchemy import func, select
 
 
 class PageParams(BaseModel):
@@ -22,12 +25,56 @@ class PagedResponseSchema(GenericModel, Generic[T]):
 
 
 def paginate(page: int, size: int, query: Any) -> PagedResponseSchema:
-    paginated_query = query.offset((page - 1) * size).limit(size).all()
-    total_records = query.count()
+    # the total comes with the rows as a `count(*) over ()` window, one query per page;
+    # only a page past the end has no row to carry it and needs a count of its own
+    rows = query.add_columns(func.count().over()).offset((page - 1) * size).limit(size).all()
+    total_records = rows[0][-1] if rows else (query.count() if page > 1 else 0)
     return PagedResponseSchema(
         total=total_records,
         total_page=max(math.ceil(total_records / size), 1),
         page=page,
         size=size,
-        items=paginated_query,
+        items=[row[0] for row in rows],
     )
+
+
+async def paginate_async(page: int, size: int, session: Any, statement: Any) -> PagedResponseSchema:
+    """`paginate` for an `AsyncSession` and a `select()` statement"""
+    rows = (
+        await session.execute(statement.add_columns(func.count().over()).offset((page - 1) * size).limit(size))
+    ).all()
+    if rows:
+        total_records = rows[0][-1]
+    elif page > 1:
+        total_records = await session.scalar(select(func.count()).select_from(statement.order_by(None).subquery()))
+    else:
+        total_records = 0
+    return PagedResponseSchema(
+        total=total_records,
+        total_page=max(math.ceil(total_records / size), 1),
+        page=page,
+        size=size,
+        items=[row[0] for row in rows],
+    )
+
+
+class CursorPagedResponseSchema(GenericModel, Generic[T]):
+    items: list[Any]
+    next_cursor: Optional[str] = None  # None on the last page
+    total: Optional[int] = None  # only when asked for, exact or estimated
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque cursor holding the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Raise ValueError when the cursor was not produced by `encode_cursor`"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
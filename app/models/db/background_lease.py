@@ -0,0 +1,15 @@
+from sqlalchemy import (
+    Column,
+    DateTime,
+    String,
+)
+
+from app.infrastructure.db.database import Base
+
+
+class BackgroundLease(Base):
+    """Which process runs a periodic task of the deployment, until `expires_at`"""
+    __tablename__ = "background_lease"
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)  # host and pid of the process
+    expires_at = Column(DateTime(timezone=True), nullable=False)
@@ -1,6 +1,7 @@
 from sqlalchemy import (
     Column,
     DateTime,
+    Index,
     Integer,
     String,
     func,
@@ -12,12 +13,33 @@ from app.infrastructure.db.database import Base
 class InstagramImagePublishingMetadata(Base):
     __tablename__ = "instagram_image_publishing_metadata"
     id = Column(Integer, primary_key=True)
-    instagram_business_account_id = Column(String, nullable=False, unique=True)
-    auth_id = Column(String, nullable=False, unique=True)
+    instagram_business_account_id = Column(String, nullable=False)
+    auth_id = Column(String, nullable=False)
     image_url = Column(String)
     caption = Column(String, nullable=True)
     instagram_media_container_id = Column(String, nullable=False, unique=True)
     instagram_media_published_id = Column(String, nullable=False, unique=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # the history is read through these two, sorted by (created_at, id) of the key, the included
+    # columns make them covering
+    __table_args__ = (
+        Index(
+            "ix_image_publishing_metadata_business_account_id_created_at",
+            "instagram_business_account_id",
+            "created_at",
+            "id",
+            postgresql_include=["auth_id", "instagram_media_container_id", "instagram_media_published_id"],
+        ),
+        Index(
+            "ix_image_publishing_metadata_auth_id_created_at",
+            "auth_id",
+            "created_at",
+            "id",
+            postgresql_include=[
+                "instagram_business_account_id", "instagram_media_container_id", "instagram_media_published_id"
+            ],
+        ),
+    )
@@ -0,0 +1,30 @@
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    func,
+)
+
+from app.infrastructure.db.database import Base
+
+
+class ImageUpload(Base):
+    """Index of the images uploaded to S3, so listing them does not scan the bucket"""
+    __tablename__ = "image_upload"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False)
+    s3_key = Column(String, nullable=False, unique=True)
+    content_hash = Column(String(64), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    thumbnail_sizes = Column(JSON, nullable=True)  # sizes of the thumbnails already stored in S3
+    uploaded_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_image_upload_user_id_uploaded_at_id", "user_id", "uploaded_at", "id"),
+    )
@@ -0,0 +1,38 @@
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    func,
+)
+
+from app.infrastructure.db.database import Base
+
+INSIGHT_METRICS = ("likes", "comments", "reach", "impressions")
+
+
+class InstagramMediaInsightSnapshot(Base):
+    __tablename__ = "instagram_media_insight_snapshot"
+    id = Column(Integer, primary_key=True)
+    media_id = Column(String, nullable=False)
+    auth_id = Column(String, nullable=False)
+    likes = Column(Integer, nullable=True)
+    comments = Column(Integer, nullable=True)
+    reach = Column(Integer, nullable=True)
+    impressions = Column(Integer, nullable=True)
+    payload = Column(JSON, nullable=False)  # the insights as returned by Graph
+    fetched_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index(
+            "ix_instagram_media_insight_snapshot_auth_id_media_id_fetched_at",
+            "auth_id",
+            "media_id",
+            "fetched_at",
+        ),
+    )
+
+    def metrics(self) -> tuple:
+        return tuple(getattr(self, metric) for metric in INSIGHT_METRICS)
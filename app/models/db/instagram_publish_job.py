@@ -0,0 +1,44 @@
+from enum import Enum
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    func,
+)
+
+from app.infrastructure.db.database import Base
+
+
+class PublishJobStatus(str, Enum):
+    PENDING = "PENDING"  # waiting for the media container to be created
+    IN_PROGRESS = "IN_PROGRESS"  # container created, Meta is still processing the media
+    PUBLISHED = "PUBLISHED"
+    FAILED = "FAILED"
+
+
+class InstagramPublishJob(Base):
+    __tablename__ = "instagram_publish_job"
+    id = Column(String(32), primary_key=True)
+    auth_id = Column(String, nullable=False)
+    instagram_business_account_id = Column(String, nullable=False)
+    image_url = Column(String, nullable=False)
+    caption = Column(String, nullable=True)
+    # needed by the worker to talk to Graph on behalf of the user, encrypted, cleared once the job is done
+    access_token = Column(String, nullable=True)
+    status = Column(String, nullable=False, default=PublishJobStatus.PENDING.value)
+    instagram_media_container_id = Column(String, nullable=True)
+    instagram_media_published_id = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_run_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_instagram_publish_job_status_next_run_at", "status", "next_run_at"),
+        Index("ix_instagram_publish_job_auth_id", "auth_id"),
+    )
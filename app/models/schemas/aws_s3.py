@@ -1,10 +1,13 @@
 from dataclasses import dataclass
+from typing import Dict, Optional
 
 
 @dataclass
 class UploadS3FileResponse:
     s3_bucket_path_key: str
     full_url: str
+    instagram_ready_path: Optional[str] = None  # normalised JPEG to publish, None if it could not be made
+    instagram_ready_url: Optional[str] = None
 
 
 @dataclass
@@ -12,3 +15,8 @@ class S3FilesInFolderResponse:
     s3_bucket_path_key: str
     full_url: str
     last_modified: str
+    content_hash: Optional[str] = None
+    size: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    thumbnail_urls: Optional[Dict[int, str]] = None  # by size of the bounding square, in pixels
@@ -1,6 +1,7 @@
+from datetime import datetime
 from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
 from pydantic.fields import Field
 
 
@@ -14,12 +15,78 @@ class PostImageToInstagramBusinessAccountInput(BaseModel):
     caption: Optional[str]
 
 
+class PublishJobResponse(BaseModel):
+    job_id: str = Field(alias="id")
+    status: str
+    instagram_business_account_id: str
+    image_url: str
+    caption: Optional[str]
+    instagram_media_container_id: Optional[str]
+    instagram_media_published_id: Optional[str]
+    error: Optional[str]
+    attempts: int
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
+        allow_population_by_field_name = True
+
+
+class GetPublishingHistoryInput(BaseModel):
+    instagram_business_account_id: Optional[str] = None
+    since: Optional[datetime] = None  # inclusive
+    until: Optional[datetime] = None  # exclusive
+    limit: int = Field(50, gt=0, le=500)
+    cursor: Optional[str] = None  # `next_cursor` of the previous page
+
+
+class PublishingHistoryItem(BaseModel):
+    id: int
+    instagram_business_account_id: str
+    instagram_media_container_id: str
+    instagram_media_published_id: str
+    created_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
+
+
 class GetImagePostInsightsFromInstagramBusinessAccountInput(BaseModel):
     media_id: str
+    refresh: bool = False  # skip the stored snapshot and ask Graph
+
+
+class GetImagesPostInsightsBatchFromInstagramBusinessAccountInput(BaseModel):
+    media_ids: conlist(str, min_items=1, max_items=1000)  # type: ignore [valid-type]
+    refresh: bool = False
+
+
+class ImagePostInsightsBatchItem(BaseModel):
+    media_id: str
+    status_code: Optional[int]
+    json_data: Optional[dict]
+    error: Optional[str]
+    fetched_at: Optional[datetime]
+    stale: bool = False  # Graph could not be reached or was not asked this time, these are the last stored numbers
+
+
+class ImagePostInsightsSnapshot(BaseModel):
+    fetched_at: datetime
+    likes: Optional[int]
+    comments: Optional[int]
+    reach: Optional[int]
+    impressions: Optional[int]
+
+    class Config:
+        orm_mode = True
 
 
 class GetAllMediasInfoFromInstagramBusinessAccountInput(BaseModel):
     instagram_business_account_id: str
+    stream: bool = False  # follow every page and send the medias as NDJSON
+    limit: Optional[int] = Field(None, gt=0)  # only used when streaming
+    since: Optional[int] = Field(None, ge=0)  # unix timestamp, only used when streaming
 
 
 class Permission(BaseModel):
@@ -0,0 +1,51 @@
+import logging
+from contextlib import AbstractContextManager
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.db.background_lease import BackgroundLease
+
+
+class BackgroundLeaseRepository:
+    def __init__(
+            self,
+            session_factory: Callable[..., AbstractContextManager[Session]]
+    ) -> None:
+        self.session_factory = session_factory
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+
+    def acquire(self, name: str, holder: str, duration: timedelta) -> bool:
+        """
+        Take the lease `name` for `duration` when it is free or expired, or extend it when `holder`
+        has it already. One conditional UPDATE, or an INSERT the first time, so that of every process
+        trying at once only one gets it.
+        """
+        now = datetime.now(timezone.utc)
+        with self.session_factory() as session:
+            updated = (
+                session.query(BackgroundLease)
+                .filter(
+                    BackgroundLease.name == name,
+                    or_(BackgroundLease.expires_at <= now, BackgroundLease.holder == holder),
+                )
+                .update(
+                    {BackgroundLease.holder: holder, BackgroundLease.expires_at: now + duration},
+                    synchronize_session=False,
+                )
+            )
+            session.commit()
+            if updated:
+                return True
+            try:
+                session.add(BackgroundLease(name=name, holder=holder, expires_at=now + duration))
+                session.commit()
+            except IntegrityError:  # held by another process
+                session.rollback()
+                return False
+            return True
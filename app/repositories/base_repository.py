@@ -1,18 +1,30 @@
+import asyncio
 import logging
-from contextlib import AbstractContextManager
-from typing import Any, Callable, Dict, Generic, Optional, Type, TypeVar, Union
+from contextlib import AbstractAsyncContextManager, AbstractContextManager
+from datetime import datetime
+from typing import Any, Callable, Dict, Generic, Literal, Optional, Sequence, Type, TypeVar, Union
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, or_, orm, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute, Session
 from sqlalchemy.sql.elements import UnaryExpression
 
 from app.infrastructure.db.database import Base
-from app.models.common.pagination import PagedResponseSchema, paginate
+from app.models.common.pagination import (
+    CursorPagedResponseSchema,
+    PagedResponseSchema,
+    decode_cursor,
+    encode_cursor,
+    paginate,
+    paginate_async,
+)
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
+CountMode = Literal["none", "exact", "estimate"]
 
 
 class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
@@ -20,18 +32,21 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         self,
         model: Type[ModelType],
         session_factory: Callable[..., AbstractContextManager[Session]],
+        async_session_factory: Optional[Callable[..., AbstractAsyncContextManager[AsyncSession]]] = None,
     ):
         self.model = model
         self.session_factory = session_factory
+        # without an async engine the `*_async` methods run their sync twin in a worker thread
+        self.async_session_factory = async_session_factory
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
     def get(self, id: Any) -> PagedResponseSchema[ModelType]:
         with self.session_factory() as session:
-            query = session.query(self.model).filter(self.model.id == id)
+            item = session.query(self.model).filter(self.model.id == id).first()
             return PagedResponseSchema(
-                total=query.count(),
+                total=0 if item is None else 1,
                 total_page=1,
-                items=[query.first()],
+                items=[item],
             )
 
     def query(
@@ -58,6 +73,100 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                 query = session.query(self.model)
             return paginate(page, size, query)
 
+    def seek_page(
+        self,
+        size: int,
+        after: Optional[str] = None,
+        sort_by: Optional[InstrumentedAttribute] = None,
+        descending: bool = True,
+        query: Any = None,
+        count: CountMode = "none",
+        load_only: Optional[Sequence[InstrumentedAttribute]] = None,
+    ) -> CursorPagedResponseSchema[ModelType]:
+        """
+        Keyset pagination on (`sort_by`, id): `after` is the `next_cursor` of the previous page, which
+        is fetched with a range scan on the matching index instead of skipping an offset.
+        `count` adds the total to the page: "exact" counts the rows matching `query` in the same
+        query, "estimate" reads the planner estimate of the whole table, "none" skips it.
+        Raise ValueError for a cursor which does not come from a previous page.
+        """
+        sort_column = self.model.id if sort_by is None else sort_by
+        statement = self.seek_statement(size, after, sort_column, descending, query, count == "exact", load_only)
+        with self.session_factory() as session:
+            rows = session.execute(statement).all()
+            total = rows[0][-1] if count == "exact" and rows else None
+            if count == "estimate":
+                total = session.execute(self.estimate_statement(session.bind.dialect.name)).scalar()
+        return self.seek_result(rows, size, sort_column, total)
+
+    def seek_statement(
+        self,
+        size: int,
+        after: Optional[str],
+        sort_column: InstrumentedAttribute,
+        descending: bool,
+        query: Any,
+        exact_count: bool,
+        load_only: Optional[Sequence[InstrumentedAttribute]] = None,
+    ) -> Any:
+        columns: list[Any] = [self.model]
+        if exact_count:
+            total = select(func.count()).select_from(self.model)
+            if query is not None:
+                total = total.where(query)
+            columns.append(total.scalar_subquery())
+        statement = select(*columns)
+        if load_only:
+            statement = statement.options(orm.load_only(*load_only))
+        if query is not None:
+            statement = statement.where(query)
+        if after:
+            try:
+                sort_value, last_id = decode_cursor(after)
+                if isinstance(sort_value, str) and sort_column.type.python_type is datetime:
+                    sort_value = datetime.fromisoformat(sort_value)
+            except (NotImplementedError, TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+            if sort_column is self.model.id:
+                statement = statement.where(self.model.id < last_id if descending else self.model.id > last_id)
+            elif descending:
+                statement = statement.where(
+                    or_(sort_column < sort_value, and_(sort_column == sort_value, self.model.id < last_id))
+                )
+            else:
+                statement = statement.where(
+                    or_(sort_column > sort_value, and_(sort_column == sort_value, self.model.id > last_id))
+                )
+        order = [sort_column, self.model.id] if sort_column is not self.model.id else [self.model.id]
+        statement = statement.order_by(*(column.desc() if descending else column.asc() for column in order))
+        return statement.limit(size + 1)  # one more row tells whether there is a next page
+
+    def seek_result(
+        self,
+        rows: list[Any],
+        size: int,
+        sort_column: InstrumentedAttribute,
+        total: Optional[int],
+    ) -> CursorPagedResponseSchema[ModelType]:
+        items = [row[0] for row in rows[:size]]
+        next_cursor = None
+        if len(rows) > size:
+            last = items[-1]
+            sort_value = getattr(last, sort_column.key)
+            next_cursor = encode_cursor(
+                [sort_value.isoformat() if isinstance(sort_value, datetime) else sort_value, last.id]
+            )
+        return CursorPagedResponseSchema[ModelType](items=items, next_cursor=next_cursor, total=total)
+
+    def estimate_statement(self, dialect_name: str) -> Any:
+        if dialect_name == "postgresql":
+            # -1 until the table has been analyzed
+            return text(
+                "SELECT CASE WHEN reltuples < 0 THEN NULL ELSE reltuples::bigint END "
+                "FROM pg_class WHERE oid = to_regclass(:table_name)"
+            ).bindparams(table_name=self.model.__tablename__)
+        return select(func.count()).select_from(self.model)
+
     def create(
         self, *, obj_in: CreateSchemaType, commit: bool = True
     ) -> Optional[ModelType]:
@@ -99,3 +208,110 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             if commit:
                 session.commit()
             return obj
+
+    async def get_async(self, id: Any) -> PagedResponseSchema[ModelType]:
+        if self.async_session_factory is None:
+            return await asyncio.to_thread(self.get, id)
+        async with self.async_session_factory() as session:
+            item = (await session.execute(select(self.model).where(self.model.id == id))).scalars().first()
+            return PagedResponseSchema(
+                total=0 if item is None else 1,
+                total_page=1,
+                items=[item],
+            )
+
+    async def query_async(
+        self,
+        query: Any,
+        page: int,
+        size: int,
+        sort_by: Optional[UnaryExpression[Any]] = None,
+    ) -> PagedResponseSchema[ModelType]:
+        if self.async_session_factory is None:
+            return await asyncio.to_thread(self.query, query, page, size, sort_by)
+        async with self.async_session_factory() as session:
+            statement = select(self.model).where(query)
+            if sort_by is not None:
+                statement = statement.order_by(sort_by)
+            return await paginate_async(page, size, session, statement)
+
+    async def get_multi_async(
+        self, page: int, size: int, sort_by: Optional[UnaryExpression[Any]] = None
+    ) -> PagedResponseSchema[ModelType]:
+        if self.async_session_factory is None:
+            return await asyncio.to_thread(self.get_multi, page, size, sort_by)
+        async with self.async_session_factory() as session:
+            statement = select(self.model)
+            if sort_by is not None:
+                statement = statement.order_by(sort_by)
+            return await paginate_async(page, size, session, statement)
+
+    async def seek_page_async(
+        self,
+        size: int,
+        after: Optional[str] = None,
+        sort_by: Optional[InstrumentedAttribute] = None,
+        descending: bool = True,
+        query: Any = None,
+        count: CountMode = "none",
+        load_only: Optional[Sequence[InstrumentedAttribute]] = None,
+    ) -> CursorPagedResponseSchema[ModelType]:
+        if self.async_session_factory is None:
+            return await asyncio.to_thread(
+                lambda: self.seek_page(size, after, sort_by, descending, query, count, load_only)
+            )
+        sort_column = self.model.id if sort_by is None else sort_by
+        statement = self.seek_statement(size, after, sort_column, descending, query, count == "exact", load_only)
+        async with self.async_session_factory() as session:
+            rows = (await session.execute(statement)).all()
+            total = rows[0][-1] if count == "exact" and rows else None
+            if count == "estimate":
+                total = (await session.execute(self.estimate_statement(session.bind.dialect.name))).scalar()
+        return self.seek_result(rows, size, sort_column, total)
+
+    async def create_async(
+        self, *, obj_in: CreateSchemaType, commit: bool = True
+    ) -> Optional[ModelType]:
+        if self.async_session_factory is None:
+            return await asyncio.to_thread(lambda: self.create(obj_in=obj_in, commit=commit))
+        async with self.async_session_factory() as session:
+            db_obj = self.model(**jsonable_encoder(obj_in))
+            session.add(db_obj)
+            if commit:
+                await session.commit()
+                await session.refresh(db_obj)
+            return db_obj
+
+    async def update_async(
+        self,
+        *,
+        db_obj: ModelType,
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]],
+        commit: bool = True,
+    ) -> Optional[ModelType]:
+        if self.async_session_factory is None:
+            return await asyncio.to_thread(lambda: self.update(db_obj=db_obj, obj_in=obj_in, commit=commit))
+        obj_data = jsonable_encoder(db_obj)
+        if isinstance(obj_in, dict):
+            update_data = obj_in
+        else:
+            update_data = obj_in.dict(exclude_unset=True)
+        for field in obj_data:
+            if field in update_data:
+                setattr(db_obj, field, update_data[field])
+        async with self.async_session_factory() as session:
+            session.add(db_obj)
+            if commit:
+                await session.commit()
+                await session.refresh(db_obj)
+            return db_obj
+
+    async def remove_async(self, *, id: int, commit: bool = True) -> Optional[ModelType]:
+        if self.async_session_factory is None:
+            return await asyncio.to_thread(lambda: self.remove(id=id, commit=commit))
+        async with self.async_session_factory() as session:
+            obj = await session.get(self.model, id)
+            await session.delete(obj)
+            if commit:
+                await session.commit()
+            return obj
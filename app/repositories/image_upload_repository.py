@@ -0,0 +1,110 @@
+import logging
+from contextlib import AbstractContextManager
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.db.image_upload import ImageUpload
+
+
+class ImageUploadRepository:
+    def __init__(
+            self,
+            session_factory: Callable[..., AbstractContextManager[Session]]
+    ) -> None:
+        self.session_factory = session_factory
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+
+    def add(self, image_upload: ImageUpload) -> None:
+        """Index an upload, the same content uploaded again keeps its first entry"""
+        with self.session_factory() as session:
+            try:
+                session.add(image_upload)
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+                self.logger.debug("%s is already indexed", image_upload.s3_key)
+
+    def add_many_missing(self, image_uploads: List[ImageUpload]) -> int:
+        """Index the uploads whose key is not indexed yet, return how many were added"""
+        if not image_uploads:
+            return 0
+        with self.session_factory() as session:
+            keys = [image_upload.s3_key for image_upload in image_uploads]
+            known = {
+                key for key, in session.query(ImageUpload.s3_key).filter(ImageUpload.s3_key.in_(keys))
+            }
+            missing = [image_upload for image_upload in image_uploads if image_upload.s3_key not in known]
+            session.add_all(missing)
+            session.commit()
+            return len(missing)
+
+    def exists(self, s3_key: str) -> bool:
+        with self.session_factory() as session:
+            return session.query(
+                session.query(ImageUpload.id).filter(ImageUpload.s3_key == s3_key).exists()
+            ).scalar()
+
+    def iter_keys(self, uploaded_before: Optional[datetime] = None, batch_size: int = 10000) -> Iterator[str]:
+        """Every indexed key, fetched `batch_size` rows at a time"""
+        with self.session_factory() as session:
+            query = session.query(ImageUpload.s3_key)
+            if uploaded_before is not None:
+                query = query.filter(ImageUpload.uploaded_at < uploaded_before)
+            for key, in query.yield_per(batch_size):
+                yield key
+
+    def iter_ids_and_keys(self, after_id: int = 0, batch_size: int = 10000) -> Iterator[Tuple[int, str]]:
+        """Id and key of every upload indexed with an id above `after_id`, through the primary key"""
+        with self.session_factory() as session:
+            query = session.query(ImageUpload.id, ImageUpload.s3_key).filter(ImageUpload.id > after_id)
+            for upload_id, key in query.yield_per(batch_size):
+                yield upload_id, key
+
+    def delete_keys(self, s3_keys: List[str]) -> int:
+        if not s3_keys:
+            return 0
+        with self.session_factory() as session:
+            deleted = (
+                session.query(ImageUpload)
+                .filter(ImageUpload.s3_key.in_(s3_keys))
+                .delete(synchronize_session=False)
+            )
+            session.commit()
+            return deleted
+
+    def set_thumbnail_sizes(self, upload_id: int, thumbnail_sizes: List[int]) -> None:
+        with self.session_factory() as session:
+            session.query(ImageUpload).filter(ImageUpload.id == upload_id).update(
+                {ImageUpload.thumbnail_sizes: thumbnail_sizes}, synchronize_session=False
+            )
+            session.commit()
+
+    def page(
+            self,
+            user_id: str,
+            limit: int,
+            after: Optional[Tuple[datetime, int]] = None,
+    ) -> List[ImageUpload]:
+        """
+        Newest uploads first, `after` is the (uploaded_at, id) of the last row of the previous page:
+        a keyset page is a range scan on the index, however deep it is.
+        """
+        with self.session_factory() as session:
+            query = session.query(ImageUpload).filter(ImageUpload.user_id == user_id)
+            if after is not None:
+                uploaded_at, upload_id = after
+                query = query.filter(
+                    or_(
+                        ImageUpload.uploaded_at < uploaded_at,
+                        and_(ImageUpload.uploaded_at == uploaded_at, ImageUpload.id < upload_id),
+                    )
+                )
+            rows = query.order_by(ImageUpload.uploaded_at.desc(), ImageUpload.id.desc()).limit(limit).all()
+            session.expunge_all()
+            return rows
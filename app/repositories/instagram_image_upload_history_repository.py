@@ -1,29 +1,44 @@
-import logging
-from contextlib import AbstractContextManager
-from typing import Callable
+import asyncio
+from contextlib import AbstractAsyncContextManager, AbstractContextManager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
 from psycopg2 import errors
 
+from sqlalchemy import and_, insert
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.models.common.pagination import CursorPagedResponseSchema
 from app.models.db.image_publishing_metadata import InstagramImagePublishingMetadata
+from app.repositories.base_repository import BaseRepository
 
-UniqueViolation = errors.lookup("23505")  # Correct way to Import the psycopg2 errors
+UNIQUE_VIOLATION = "23505"
+UniqueViolation = errors.lookup(UNIQUE_VIOLATION)  # Correct way to Import the psycopg2 errors
 
 
 class CreateWithCategoryResponse:
     pass
 
 
-class InstagramImageUploadMetadataRepository:
+class InstagramImageUploadMetadataRepository(BaseRepository):
+    # the columns held by the (…, created_at, id) covering indexes, the history reads nothing else
+    HISTORY_COLUMNS = (
+        InstagramImagePublishingMetadata.id,
+        InstagramImagePublishingMetadata.auth_id,
+        InstagramImagePublishingMetadata.instagram_business_account_id,
+        InstagramImagePublishingMetadata.instagram_media_container_id,
+        InstagramImagePublishingMetadata.instagram_media_published_id,
+        InstagramImagePublishingMetadata.created_at,
+    )
+
     def __init__(
             self,
-            session_factory: Callable[..., AbstractContextManager[Session]]
+            session_factory: Callable[..., AbstractContextManager[Session]],
+            async_session_factory: Optional[Callable[..., AbstractAsyncContextManager[AsyncSession]]] = None,
     ) -> None:
-        self.session_factory = session_factory
-        self.logger = logging.getLogger(
-            f"{__name__}.{self.__class__.__name__}",
-        )
+        super().__init__(InstagramImagePublishingMetadata, session_factory, async_session_factory)
 
     def add(self, image_publish_metadata: InstagramImagePublishingMetadata) -> InstagramImagePublishingMetadata | None:
         with self.session_factory() as session:
@@ -33,13 +48,84 @@ class InstagramImageUploadMetadataRepository:
                 session.refresh(image_publish_metadata)
                 return image_publish_metadata
             except IntegrityError as err:
+                self.handle_integrity_error(err)
+            except SQLAlchemyError as err:
                 self.logger.error(err)
-                if isinstance(err.orig, UniqueViolation):
-                    raise NotUniqueError(err.orig.pgcode, err.orig.pgerror)
+            return None
+
+    async def add_async(
+            self, image_publish_metadata: InstagramImagePublishingMetadata
+    ) -> InstagramImagePublishingMetadata | None:
+        if self.async_session_factory is None:
+            return await asyncio.to_thread(self.add, image_publish_metadata)
+        async with self.async_session_factory() as session:
+            try:
+                session.add(image_publish_metadata)
+                await session.commit()
+                await session.refresh(image_publish_metadata)
+                return image_publish_metadata
+            except IntegrityError as err:
+                self.handle_integrity_error(err)
             except SQLAlchemyError as err:
                 self.logger.error(err)
             return None
 
+    def add_many(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Insert the rows with a single multi-row INSERT, rows conflicting with a stored one are skipped.
+        Return how many were inserted.
+        """
+        if not rows:
+            return 0
+        with self.session_factory() as session:
+            statement = self.insert_ignoring_conflicts(session.get_bind().dialect.name).values(rows)
+            result = session.execute(statement)
+            session.commit()
+            return result.rowcount
+
+    @staticmethod
+    def insert_ignoring_conflicts(dialect_name: str) -> Any:
+        if dialect_name == "postgresql":
+            return postgresql.insert(InstagramImagePublishingMetadata).on_conflict_do_nothing()
+        if dialect_name == "sqlite":
+            return sqlite.insert(InstagramImagePublishingMetadata).on_conflict_do_nothing()
+        return insert(InstagramImagePublishingMetadata)
+
+    async def history_async(
+            self,
+            auth_id: str,
+            limit: int,
+            after: Optional[str] = None,
+            instagram_business_account_id: Optional[str] = None,
+            since: Optional[datetime] = None,
+            until: Optional[datetime] = None,
+    ) -> CursorPagedResponseSchema[InstagramImagePublishingMetadata]:
+        """
+        Newest first publications of a user, optionally of one business account and within
+        [`since`, `until`). Raise ValueError for a cursor which does not come from a previous page.
+        """
+        model = InstagramImagePublishingMetadata
+        conditions = [model.auth_id == auth_id]
+        if instagram_business_account_id is not None:
+            conditions.append(model.instagram_business_account_id == instagram_business_account_id)
+        if since is not None:
+            conditions.append(model.created_at >= since)
+        if until is not None:
+            conditions.append(model.created_at < until)
+        return await self.seek_page_async(
+            limit,
+            after,
+            sort_by=model.created_at,
+            query=and_(*conditions),
+            load_only=self.HISTORY_COLUMNS,
+        )
+
+    def handle_integrity_error(self, err: IntegrityError) -> None:
+        self.logger.error(err)
+        # psycopg2 raises UniqueViolation, the asyncpg adapter only carries the SQLSTATE
+        if isinstance(err.orig, UniqueViolation) or getattr(err.orig, "pgcode", None) == UNIQUE_VIOLATION:
+            raise NotUniqueError(UNIQUE_VIOLATION, getattr(err.orig, "pgerror", None) or str(err.orig))
+
 
 class NotUniqueError(Exception):
     def __init__(self, pg_code: str, pg_error: str):
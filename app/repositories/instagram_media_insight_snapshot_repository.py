@@ -0,0 +1,80 @@
+import logging
+from contextlib import AbstractContextManager
+from typing import Callable, Dict, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, aliased
+
+from app.models.db.instagram_media_insight_snapshot import InstagramMediaInsightSnapshot
+
+
+class InstagramMediaInsightSnapshotRepository:
+    def __init__(
+            self,
+            session_factory: Callable[..., AbstractContextManager[Session]]
+    ) -> None:
+        self.session_factory = session_factory
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+
+    def add_many(self, snapshots: List[InstagramMediaInsightSnapshot]) -> None:
+        if not snapshots:
+            return
+        with self.session_factory() as session:
+            session.add_all(snapshots)
+            session.flush()
+            session.expunge_all()  # the callers keep reading the snapshots they stored
+            session.commit()
+
+    def latest(
+            self,
+            auth_id: str,
+            media_ids: List[str],
+            per_media: int = 2,
+    ) -> Dict[str, List[InstagramMediaInsightSnapshot]]:
+        """The `per_media` newest snapshots of every media, newest first, in a single query"""
+        if not media_ids:
+            return {}
+        with self.session_factory() as session:
+            ranked = (
+                session.query(
+                    InstagramMediaInsightSnapshot,
+                    func.row_number().over(
+                        partition_by=InstagramMediaInsightSnapshot.media_id,
+                        order_by=InstagramMediaInsightSnapshot.fetched_at.desc(),
+                    ).label("rank"),
+                )
+                .filter(
+                    InstagramMediaInsightSnapshot.auth_id == auth_id,
+                    InstagramMediaInsightSnapshot.media_id.in_(media_ids),
+                )
+                .subquery()
+            )
+            snapshot = aliased(InstagramMediaInsightSnapshot, ranked)
+            rows = (
+                session.query(snapshot)
+                .filter(ranked.c.rank <= per_media)
+                .order_by(snapshot.media_id, snapshot.fetched_at.desc())
+                .all()
+            )
+            session.expunge_all()
+        latest: Dict[str, List[InstagramMediaInsightSnapshot]] = {}
+        for row in rows:
+            latest.setdefault(row.media_id, []).append(row)
+        return latest
+
+    def history(self, auth_id: str, media_id: str, limit: int) -> List[InstagramMediaInsightSnapshot]:
+        with self.session_factory() as session:
+            rows = (
+                session.query(InstagramMediaInsightSnapshot)
+                .filter(
+                    InstagramMediaInsightSnapshot.auth_id == auth_id,
+                    InstagramMediaInsightSnapshot.media_id == media_id,
+                )
+                .order_by(InstagramMediaInsightSnapshot.fetched_at.desc())
+                .limit(limit)
+                .all()
+            )
+            session.expunge_all()
+            return rows
@@ -0,0 +1,70 @@
+import logging
+from contextlib import AbstractContextManager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.db.instagram_publish_job import InstagramPublishJob, PublishJobStatus
+
+ACTIVE_STATUSES = (PublishJobStatus.PENDING.value, PublishJobStatus.IN_PROGRESS.value)
+
+
+class InstagramPublishJobRepository:
+    def __init__(
+            self,
+            session_factory: Callable[..., AbstractContextManager[Session]]
+    ) -> None:
+        self.session_factory = session_factory
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+
+    def add(self, job: InstagramPublishJob) -> InstagramPublishJob:
+        with self.session_factory() as session:
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            return job
+
+    def get(self, job_id: str, auth_id: str) -> Optional[InstagramPublishJob]:
+        with self.session_factory() as session:
+            job = (
+                session.query(InstagramPublishJob)
+                .filter(InstagramPublishJob.id == job_id, InstagramPublishJob.auth_id == auth_id)
+                .first()
+            )
+            if job is not None:
+                session.expunge(job)
+            return job
+
+    def claim_due(self, limit: int, lease: timedelta) -> List[InstagramPublishJob]:
+        """
+        Lock the active jobs which are due and push their `next_run_at` by `lease`, so another
+        worker process does not pick them up meanwhile. A job whose worker died becomes due again
+        once the lease is over, that is how jobs survive a restart.
+        """
+        now = datetime.now(timezone.utc)
+        with self.session_factory() as session:
+            jobs = (
+                session.query(InstagramPublishJob)
+                .filter(
+                    InstagramPublishJob.status.in_(ACTIVE_STATUSES),
+                    InstagramPublishJob.next_run_at <= now,
+                )
+                .order_by(InstagramPublishJob.next_run_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            for job in jobs:
+                job.next_run_at = now + lease
+            session.flush()
+            session.expunge_all()
+            session.commit()
+            return jobs
+
+    def save(self, job: InstagramPublishJob) -> None:
+        with self.session_factory() as session:
+            session.merge(job)
+            session.commit()
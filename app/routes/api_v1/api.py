@@ -4,9 +4,11 @@ from app.routes.api_v1.endpoints import (
     auth,
     image,
     instagram,
+    monitoring,
 )
 
 router = APIRouter()
 router.include_router(auth.router, prefix="/auth", tags=["auth"])
 router.include_router(image.router, prefix="/image", tags=["image"])
 router.include_router(instagram.router, prefix="/instagram", tags=["instagram"])
+router.include_router(monitoring.router, prefix="/monitoring", tags=["monitoring"])
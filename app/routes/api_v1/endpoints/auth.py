@@ -14,8 +14,8 @@ router = APIRouter()
 
 @router.post("/facebook")
 @inject
-def check_user_facebook(
+async def check_user_facebook(
         token: HTTPAuthorizationCredentials = Depends(HTTPBearer()),
         account_management_service: InstagramAccountManageService = Depends(Provide[Container.account_management_service]),
 ) -> Me:
-    return account_management_service.verify_token(token.credentials)
+    return await account_management_service.verify_token(token.credentials)
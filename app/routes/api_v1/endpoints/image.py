@@ -1,16 +1,17 @@
-import io
+import asyncio
 import pathlib
 from http import HTTPStatus
-from typing import Dict, List
+from typing import Optional
 
-from PIL import Image, UnidentifiedImageError
 from dependency_injector.wiring import Provide, inject
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, status
 
 from app.container.containers import Container
+from app.models.common.pagination import CursorPagedResponseSchema
 from app.models.schemas.instagram import Me
 from app.routes.api_v1.endpoints.auth import check_user_facebook
-from app.services.instagram_media_upload_service import MediaUploadService, UploadS3FileResponse, S3FilesInFolderResponse
+from app.services.instagram_media_upload_service import MediaUploadService, UploadS3FileResponse, S3FilesInFolderResponse, \
+    InvalidImageError
 
 #
 router = APIRouter()
@@ -31,24 +32,20 @@ async def upload_image_to_s3(
             detail="the file you uploaded was not a valid image",
         )
     image_file.file.seek(0)
-    contents = image_file.file.read()
-    temp_file = io.BytesIO()
-    temp_file.write(contents)
-    temp_file.seek(0)
-
     try:
-        Image.open(temp_file)
-    except UnidentifiedImageError:
+        # the body is already spooled to a temporary file, it is read from there once, part by part
+        result = await asyncio.to_thread(
+            media_upload_service.upload_file_to_s3,
+            file=image_file.file,
+            bucket_name=s3_image_bucket,
+            user_id=auth.id,
+            extension=file_extension,
+        )
+    except InvalidImageError as error:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail="Your image is corrupted or damaged",
+            detail=str(error),
         )
-    result = media_upload_service.upload_file_to_s3(
-        file=temp_file,
-        bucket_name=s3_image_bucket,
-        user_id=auth.id,
-        extension=file_extension,
-    )
     if result:
         return result
     raise HTTPException(
@@ -60,13 +57,19 @@ async def upload_image_to_s3(
 @router.get("")
 @inject
 async def get_user_uploaded_images(
+    limit: int = Query(50, gt=0, le=1000),
+    cursor: Optional[str] = None,
     auth: Me = Depends(check_user_facebook),
     media_upload_service: MediaUploadService = Depends(Provide[Container.media_upload_service]),
     s3_image_bucket: str = Depends(Provide[Container.s3_image_bucket]),
-) -> Dict[str, List[S3FilesInFolderResponse]]:
-    return {
-        "items": media_upload_service.list_s3_files_in_folder(
+) -> CursorPagedResponseSchema[S3FilesInFolderResponse]:
+    try:
+        return await asyncio.to_thread(
+            media_upload_service.list_uploaded_images,
             bucket_name=s3_image_bucket,
             user_id=auth.id,
+            limit=limit,
+            cursor=cursor,
         )
-    }
+    except ValueError as error:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(error))
@@ -1,16 +1,23 @@
 from http import HTTPStatus
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from dependency_injector.wiring import Provide, inject
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
 
 from app.container.containers import Container
+from app.infrastructure.meta.instagram_platform.graph_api import GraphApiRawResponse
+from app.infrastructure.serialization import dumps
+from app.models.common.pagination import CursorPagedResponseSchema
 from app.models.schemas.instagram import GetInstagramBusinessAccountInfoInput, Me, \
     PostImageToInstagramBusinessAccountInput, GetImagePostInsightsFromInstagramBusinessAccountInput, \
-    GetAllMediasInfoFromInstagramBusinessAccountInput
+    GetAllMediasInfoFromInstagramBusinessAccountInput, GetImagesPostInsightsBatchFromInstagramBusinessAccountInput, \
+    ImagePostInsightsBatchItem, ImagePostInsightsSnapshot, PublishJobResponse, GetPublishingHistoryInput, \
+    PublishingHistoryItem
 from app.routes.api_v1.endpoints.auth import check_user_facebook
 from app.services.instagram_account_management import InstagramAccountManageService
 from app.services.instagram_media_insights import MediaInsightService
-from app.services.instagram_media_upload_service import MediaUploadService
+from app.services.instagram_media_publish_job_service import MediaPublishJobService
 
 ERROR_UPLOADING_FILES = "We have an error uploading files"
 
@@ -24,9 +31,9 @@ async def get_instagram_business_account_info(
         input_params: GetInstagramBusinessAccountInfoInput = Depends(),
         account_management_service: InstagramAccountManageService = Depends(Provide[Container.account_management_service]),
 ):
-    result = account_management_service.get_instagram_account_info(input_params.page_id, auth.token)
+    result = await account_management_service.get_instagram_account_info(input_params.page_id, auth.token, auth.id)
     if result:
-        return result
+        return relay(result)
     raise HTTPException(
         status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
         detail=ERROR_UPLOADING_FILES,
@@ -39,30 +46,60 @@ async def get_user_pages(
         auth: Me = Depends(check_user_facebook),
         account_management_service: InstagramAccountManageService = Depends(Provide[Container.account_management_service]),
 ):
-    result = account_management_service.get_user_pages(
-        auth.token
+    result = await account_management_service.get_user_pages(
+        auth.token,
+        auth.id,
     )
     if result:
-        return result
+        return relay(result)
     raise HTTPException(
         status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
         detail=ERROR_UPLOADING_FILES,
     )
 
 
-@router.post("/images")
+@router.post("/images", status_code=HTTPStatus.ACCEPTED, response_model_by_alias=False)
 @inject
 async def publish_image(
         input_params: PostImageToInstagramBusinessAccountInput,
         auth: Me = Depends(check_user_facebook),
-        media_upload_service: MediaUploadService = Depends(Provide[Container.media_upload_service]),
-):
-    result = media_upload_service.post_image_to_instagram(input_params, auth.token, auth.id)
-    if result:
-        return result
+        media_publish_job_service: MediaPublishJobService = Depends(Provide[Container.media_publish_job_service]),
+) -> PublishJobResponse:
+    job = await media_publish_job_service.submit(input_params, auth.token, auth.id)
+    return PublishJobResponse.from_orm(job)
+
+
+@router.get("/images/history")
+@inject
+async def get_publishing_history(
+        input_params: GetPublishingHistoryInput = Depends(),
+        auth: Me = Depends(check_user_facebook),
+        media_publish_job_service: MediaPublishJobService = Depends(Provide[Container.media_publish_job_service]),
+) -> CursorPagedResponseSchema[PublishingHistoryItem]:
+    try:
+        page = await media_publish_job_service.get_publishing_history(input_params, auth.id)
+    except ValueError as error:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(error))
+    return CursorPagedResponseSchema[PublishingHistoryItem](
+        items=[PublishingHistoryItem.from_orm(item) for item in page.items],
+        next_cursor=page.next_cursor,
+        total=page.total,
+    )
+
+
+@router.get("/images/jobs/{job_id}", response_model_by_alias=False)
+@inject
+async def get_publish_job(
+        job_id: str,
+        auth: Me = Depends(check_user_facebook),
+        media_publish_job_service: MediaPublishJobService = Depends(Provide[Container.media_publish_job_service]),
+) -> PublishJobResponse:
+    job = await media_publish_job_service.get(job_id, auth.id)
+    if job:
+        return PublishJobResponse.from_orm(job)
     raise HTTPException(
-        status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
-        detail=ERROR_UPLOADING_FILES,
+        status_code=HTTPStatus.NOT_FOUND,
+        detail=f"Publish job {job_id} not found",
     )
 
 
@@ -73,7 +110,7 @@ async def get_image_insights(
         auth: Me = Depends(check_user_facebook),
         media_insight_service: MediaInsightService = Depends(Provide[Container.media_insight_service]),
 ):
-    result = media_insight_service.get_image_insights(input_params, auth.token)
+    result = await media_insight_service.get_image_insights(input_params, auth.token, auth.id)
     if result:
         return result
     raise HTTPException(
@@ -82,6 +119,31 @@ async def get_image_insights(
     )
 
 
+@router.post("/images/insights:batch")
+@inject
+async def get_images_insights_batch(
+        input_params: GetImagesPostInsightsBatchFromInstagramBusinessAccountInput,
+        auth: Me = Depends(check_user_facebook),
+        media_insight_service: MediaInsightService = Depends(Provide[Container.media_insight_service]),
+) -> Dict[str, List[ImagePostInsightsBatchItem]]:
+    return {
+        "items": await media_insight_service.get_images_insights_batch(input_params, auth.token, auth.id)
+    }
+
+
+@router.get("/images/{media_id}/insights/history")
+@inject
+async def get_image_insights_history(
+        media_id: str,
+        limit: int = Query(100, gt=0, le=1000),
+        auth: Me = Depends(check_user_facebook),
+        media_insight_service: MediaInsightService = Depends(Provide[Container.media_insight_service]),
+) -> Dict[str, List[ImagePostInsightsSnapshot]]:
+    return {
+        "items": await media_insight_service.get_image_insights_history(media_id, auth.id, limit)
+    }
+
+
 @router.get("/medias")
 @inject
 async def list_all_medias(
@@ -89,10 +151,40 @@ async def list_all_medias(
         auth: Me = Depends(check_user_facebook),
         media_insight_service: MediaInsightService = Depends(Provide[Container.media_insight_service]),
 ):
-    result = media_insight_service.get_list_all_instagram_medias(input_params, auth.token)
+    if input_params.stream:
+        medias = media_insight_service.iter_all_instagram_medias(input_params, auth.token)
+        # the first page is awaited before answering, an invalid token or account gets its status code
+        first = await anext(medias, None)
+        return StreamingResponse(
+            to_ndjson(first, medias),
+            media_type="application/x-ndjson",
+        )
+    result = await media_insight_service.get_list_all_instagram_medias(input_params, auth.token)
     if result:
-        return result
+        return relay(result)
     raise HTTPException(
         status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
         detail=ERROR_UPLOADING_FILES,
     )
+
+
+def relay(result: Any) -> Any:
+    """A Graph body kept unparsed goes out as is, skipping the encoding of the response model"""
+    if isinstance(result, GraphApiRawResponse):
+        return Response(result.envelope(), media_type="application/json")
+    return result
+
+
+async def to_ndjson(first: Optional[dict[str, Any]], items: AsyncIterator[dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    One JSON document per line, `first` is the item already taken from `items` (None when there was none).
+    An error met halfway is sent as the last line
+    """
+    if first is None:
+        return
+    yield dumps(first) + b"\n"
+    try:
+        async for item in items:
+            yield dumps(item) + b"\n"
+    except HTTPException as e:
+        yield dumps({"error": e.detail}) + b"\n"
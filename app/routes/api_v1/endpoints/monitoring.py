@@ -0,0 +1,46 @@
+import asyncio
+from typing import Any, Dict
+
+from dependency_injector.wiring import Provide, inject
+from fastapi import APIRouter, Depends, Request
+
+from app.container.containers import Container
+from app.infrastructure.aws.presigned_url_cache import PresignedUrlCache
+from app.infrastructure.cache.shared_cache import SharedCache
+from app.infrastructure.meta.instagram_platform.rate_limit import GraphApiRateLimiter
+from app.routes.monitoring_access import require_monitoring_token
+
+router = APIRouter(dependencies=[Depends(require_monitoring_token)])
+
+
+@router.get("/graph_api_usage")
+@inject
+async def get_graph_api_usage(
+        graph_api_rate_limiter: GraphApiRateLimiter = Depends(Provide[Container.graph_api_rate_limiter]),
+) -> Dict[str, Any]:
+    """Graph API budgets of this worker as last reported by Meta, with the pace we currently apply"""
+    return graph_api_rate_limiter.snapshot()
+
+
+@router.get("/presigned_url_cache")
+@inject
+async def get_presigned_url_cache_stats(
+        presigned_url_cache: PresignedUrlCache = Depends(Provide[Container.presigned_url_cache]),
+) -> Dict[str, Any]:
+    """Size and hit/miss counters of the presigned URL cache of this worker"""
+    return presigned_url_cache.stats()
+
+
+@router.get("/cache")
+@inject
+async def get_cache_stats(
+        cache: SharedCache = Depends(Provide[Container.cache]),
+) -> Dict[str, Any]:
+    """Backend, size and namespace TTLs of the shared cache, hits and misses are in /metrics"""
+    return await asyncio.to_thread(cache.stats)
+
+
+@router.get("/startup")
+async def get_startup_report(request: Request) -> Dict[str, Any]:
+    """Time this worker spent importing, booting and warming up, step by step"""
+    return request.app.state.startup_report.snapshot()
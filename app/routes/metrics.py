@@ -0,0 +1,20 @@
+import asyncio
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.infrastructure.monitoring.timing import REGISTRY
+from app.routes.monitoring_access import require_monitoring_token
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+router = APIRouter(dependencies=[Depends(require_monitoring_token)])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Prometheus scrape endpoint: latency histograms per route, Graph endpoint, S3 operation and DB session,
+    summed over the gunicorn workers
+    """
+    return PlainTextResponse(await asyncio.to_thread(REGISTRY.render), media_type=PROMETHEUS_CONTENT_TYPE)
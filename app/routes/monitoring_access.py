@@ -0,0 +1,19 @@
+import hmac
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+
+async def require_monitoring_token(
+        request: Request,
+        credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
+) -> None:
+    """Metrics and monitoring endpoints are for the scraper and the operators holding MONITORING_TOKEN"""
+    token = request.app.state.monitoring_token
+    if not token:
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Monitoring is disabled, set MONITORING_TOKEN")
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode(), token.encode()):
+        raise HTTPException(
+            status.HTTP_401_UNAUTHORIZED, "Invalid monitoring token", headers={"WWW-Authenticate": "Bearer"},
+        )
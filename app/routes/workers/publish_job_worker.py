@@ -0,0 +1,46 @@
+import asyncio
+import contextlib
+import logging
+from typing import Optional
+
+from app.services.instagram_media_publish_job_service import MediaPublishJobService
+
+
+class PublishJobWorker:
+    """Background loop of a web worker process which keeps advancing the due publish jobs"""
+
+    def __init__(
+            self,
+            media_publish_job_service: MediaPublishJobService,
+            concurrency: int,
+            poll_interval: float,
+    ) -> None:
+        self.media_publish_job_service = media_publish_job_service
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                claimed = await self.media_publish_job_service.run_due_jobs(self.concurrency)
+            except Exception:
+                self.logger.exception("Failed to run the due publish jobs")
+                claimed = 0
+            if claimed < self.concurrency:  # nothing left to do right now, sleep until the next tick
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
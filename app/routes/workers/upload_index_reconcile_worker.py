@@ -0,0 +1,62 @@
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+from datetime import timedelta
+from typing import Optional
+
+from app.repositories.background_lease_repository import BackgroundLeaseRepository
+from app.services.content_hash_index import ContentHashIndex
+
+LEASE_NAME = "upload_index_reconcile"
+
+
+class UploadIndexReconcileWorker:
+    """
+    Background loop of a web worker process which periodically rebuilds the upload index from S3.
+    Every web worker runs the loop, the one holding the DB lease of the interval does the rebuild.
+    """
+
+    def __init__(
+            self,
+            content_hash_index: ContentHashIndex,
+            background_lease_repository: BackgroundLeaseRepository,
+            bucket_name: str,
+            interval: float,
+    ) -> None:
+        self.content_hash_index = content_hash_index
+        self.background_lease_repository = background_lease_repository
+        self.bucket_name = bucket_name
+        self.interval = interval
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                if await asyncio.to_thread(
+                        self.background_lease_repository.acquire,
+                        LEASE_NAME, self.holder, timedelta(seconds=self.interval),
+                ):
+                    await asyncio.to_thread(self.content_hash_index.reconcile, self.bucket_name)
+                else:
+                    self.logger.debug("The upload index of %s is reconciled by another process", self.bucket_name)
+            except Exception:
+                self.logger.exception("Failed to reconcile the upload index of %s", self.bucket_name)
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
@@ -1,11 +1,13 @@
 import logging
 from typing import Any, Dict, Optional, Union
 
+from sqlalchemy.orm import InstrumentedAttribute
 from sqlalchemy.sql.elements import UnaryExpression
 
-from app.models.common.pagination import PagedResponseSchema
+from app.models.common.pagination import CursorPagedResponseSchema, PagedResponseSchema
 from app.repositories.base_repository import (
     BaseRepository,
+    CountMode,
     CreateSchemaType,
     ModelType,
     UpdateSchemaType,
@@ -38,6 +40,19 @@ class BaseService:
     ) -> PagedResponseSchema[ModelType]:
         return self._repository.get_multi(page=page, size=size, sort_by=sort_by)
 
+    def seek_page(
+        self,
+        size: int,
+        after: Optional[str] = None,
+        sort_by: Optional[InstrumentedAttribute] = None,
+        descending: bool = True,
+        query: Any = None,
+        count: CountMode = "none",
+    ) -> CursorPagedResponseSchema[ModelType]:
+        return self._repository.seek_page(
+            size=size, after=after, sort_by=sort_by, descending=descending, query=query, count=count
+        )
+
     def create(
         self, obj_in: CreateSchemaType, commit: bool = True
     ) -> Optional[ModelType]:
@@ -53,3 +68,51 @@ class BaseService:
 
     def remove(self, model_id: int, commit: bool = True) -> Optional[ModelType]:
         return self._repository.remove(id=model_id, commit=commit)
+
+    async def get_async(self, model_id: Any) -> PagedResponseSchema[ModelType]:
+        return await self._repository.get_async(model_id)
+
+    async def query_async(
+        self,
+        query: Any,
+        page: int,
+        size: int,
+        sort_by: Optional[UnaryExpression[Any]] = None,
+    ) -> PagedResponseSchema[ModelType]:
+        return await self._repository.query_async(
+            query=query, page=page, size=size, sort_by=sort_by
+        )
+
+    async def get_multi_async(
+        self, page: int, size: int, sort_by: Optional[UnaryExpression[Any]] = None
+    ) -> PagedResponseSchema[ModelType]:
+        return await self._repository.get_multi_async(page=page, size=size, sort_by=sort_by)
+
+    async def seek_page_async(
+        self,
+        size: int,
+        after: Optional[str] = None,
+        sort_by: Optional[InstrumentedAttribute] = None,
+        descending: bool = True,
+        query: Any = None,
+        count: CountMode = "none",
+    ) -> CursorPagedResponseSchema[ModelType]:
+        return await self._repository.seek_page_async(
+            size=size, after=after, sort_by=sort_by, descending=descending, query=query, count=count
+        )
+
+    async def create_async(
+        self, obj_in: CreateSchemaType, commit: bool = True
+    ) -> Optional[ModelType]:
+        return await self._repository.create_async(obj_in=obj_in, commit=commit)
+
+    async def update_async(
+        self,
+        db_obj: ModelType,
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]],
+        commit: bool = True,
+    ) -> Optional[ModelType]:
+        return await self._repository.update_async(db_obj=db_obj, obj_in=obj_in, commit=commit)
+
+    async def remove_async(self, model_id: int, commit: bool = True) -> Optional[ModelType]:
+        return await self._repository.remove_async(id=model_id, commit=commit)
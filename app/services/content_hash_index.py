@@ -0,0 +1,134 @@
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from app.infrastructure.aws.s3 import S3Service
+from app.infrastructure.cache.bloom_filter import BloomFilter
+from app.models.db.image_upload import ImageUpload
+from app.repositories.image_upload_repository import ImageUploadRepository
+
+UPLOAD_KEY_PATTERN = re.compile(r"^user/(?P<user_id>[^/]+)/(?P<content_hash>[0-9a-f]{64})\.\w+$")
+RECONCILE_BATCH_SIZE = 1000
+
+
+class ContentHashIndex:
+    """
+    Which content addressed keys are already stored, answered without asking S3.
+    The `image_upload` table is the index, a Bloom filter of its keys sits in front of it:
+    a key the filter has never seen is uploaded straight away, the others are confirmed
+    by an indexed lookup. The filter is loaded by the boot or the warm-up, the table answers
+    alone until then. Before trusting a miss, the filter catches up with the keys the other
+    processes indexed, at most every `bloom_sync_interval` seconds: an upload of the same
+    content through another worker within that window is stored again, as two concurrent
+    uploads would be.
+    """
+
+    def __init__(
+            self,
+            image_upload_repository: ImageUploadRepository,
+            s3: S3Service,
+            bloom_capacity: int,
+            bloom_error_rate: float,
+            bloom_sync_interval: float,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.image_upload_repository = image_upload_repository
+        self.s3 = s3
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.bloom_sync_interval = bloom_sync_interval
+        self._clock = clock
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self._bloom_filter: Optional[BloomFilter] = None
+        self._lock = threading.Lock()
+        # ids up to `_synced_id` are in the filter; a catch-up reads from the one of the sync before,
+        # rows whose id was taken before it but committed after are caught too
+        self._synced_id = 0
+        self._previous_synced_id = 0
+        self._synced_at = float('-inf')
+
+    def load(self) -> None:
+        """Fill the Bloom filter from the table, by the boot or the warm-up"""
+        bloom_filter = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+        synced_at = self._clock()
+        synced_id = 0
+        for upload_id, key in self.image_upload_repository.iter_ids_and_keys():
+            bloom_filter.add(key)
+            synced_id = max(synced_id, upload_id)
+        with self._lock:
+            self._bloom_filter = bloom_filter
+            self._synced_id = self._previous_synced_id = synced_id
+            self._synced_at = synced_at
+        self.logger.info("Loaded %s uploaded keys in the Bloom filter", len(bloom_filter))
+
+    def sync(self) -> None:
+        """Add the keys indexed since the last sync, by this process or another one"""
+        with self._lock:
+            if self._bloom_filter is None or self._clock() - self._synced_at < self.bloom_sync_interval:
+                return
+            self._synced_at = self._clock()
+            synced_id = self._synced_id
+            for upload_id, key in self.image_upload_repository.iter_ids_and_keys(after_id=self._previous_synced_id):
+                self._bloom_filter.add(key)
+                synced_id = max(synced_id, upload_id)
+            self._previous_synced_id, self._synced_id = self._synced_id, synced_id
+
+    def contains(self, s3_key: str) -> bool:
+        bloom_filter = self._bloom_filter
+        if bloom_filter is None:  # not loaded yet
+            return self.image_upload_repository.exists(s3_key)
+        if s3_key not in bloom_filter:
+            self.sync()
+            if s3_key not in bloom_filter:
+                return False
+        return self.image_upload_repository.exists(s3_key)
+
+    def add(self, image_upload: ImageUpload) -> None:
+        s3_key = image_upload.s3_key
+        self.image_upload_repository.add(image_upload)
+        bloom_filter = self._bloom_filter
+        if bloom_filter is not None:
+            bloom_filter.add(s3_key)
+
+    def reconcile(self, bucket_name: str) -> Dict[str, int]:
+        """
+        Rebuild the index from a listing of the bucket: objects missing from it are indexed,
+        entries whose object is gone are dropped, then the Bloom filter is reloaded
+        """
+        started_at = datetime.now(timezone.utc)
+        listed = set()
+        added = 0
+        batch: List[ImageUpload] = []
+        for s3_object in self.s3.iter_objects(bucket_name, prefix="user/"):
+            match = UPLOAD_KEY_PATTERN.match(s3_object["Key"])
+            if match is None:
+                continue
+            listed.add(s3_object["Key"])
+            batch.append(
+                ImageUpload(
+                    user_id=match["user_id"],
+                    s3_key=s3_object["Key"],
+                    content_hash=match["content_hash"],
+                    size=s3_object["Size"],
+                    uploaded_at=s3_object["LastModified"],
+                )
+            )
+            if len(batch) >= RECONCILE_BATCH_SIZE:
+                added += self.image_upload_repository.add_many_missing(batch)
+                batch = []
+        added += self.image_upload_repository.add_many_missing(batch)
+
+        # uploads indexed while the bucket was being listed may be missing from the listing
+        gone = [key for key in self.image_upload_repository.iter_keys(uploaded_before=started_at) if key not in listed]
+        removed = 0
+        for start in range(0, len(gone), RECONCILE_BATCH_SIZE):
+            removed += self.image_upload_repository.delete_keys(gone[start:start + RECONCILE_BATCH_SIZE])
+
+        self.load()
+        self.logger.info("Reconciled the upload index of %s: %s added, %s removed", bucket_name, added, removed)
+        return {'listed': len(listed), 'added': added, 'removed': removed}
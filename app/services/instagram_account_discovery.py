@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from app.infrastructure.cache.shared_cache import CacheNamespace
+from app.infrastructure.meta.instagram_platform.graph_api import InstagramGraphApiClient
+from app.infrastructure.meta.instagram_platform.resilience import context_without_deadline
+from app.infrastructure.token_cipher import TokenCipher
+
+PAGES_VERSION = 2  # part of the cache key, bumped whenever the cached fields change
+
+
+class InstagramAccountDiscoveryService:
+    """
+    Pages a user manages, each with its `instagram_business_account`, discovered through every
+    `me/accounts` page and cached per user id for the TTL of the cache namespace. A lookup within
+    `refresh_ahead` seconds of the expiry refreshes the map in the background, once across the
+    workers sharing the cache, so users seen regularly never wait on Graph for it.
+    Pages hold the fields of every page lookup, their access token is cached encrypted, or left out
+    of the cache without a `token_cipher`.
+    """
+
+    def __init__(
+            self,
+            instagram_graph_api_client: InstagramGraphApiClient,
+            cache: CacheNamespace,
+            refresh_ahead: float,
+            token_cipher: Optional[TokenCipher] = None,
+            enabled: bool = True,
+    ) -> None:
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self.instagram_graph_api_client = instagram_graph_api_client
+        self.cache = cache
+        self.refresh_ahead = min(refresh_ahead, cache.min_ttl / 2)
+        self.token_cipher = token_cipher
+        self.enabled = enabled
+        self._refreshing: Dict[str, asyncio.Task] = {}  # background refreshes of this worker by user id
+
+    async def get_pages(self, user_id: str, token: str) -> Dict[str, Dict[str, Any]]:
+        """Pages of the user by page id, in the order Graph lists them"""
+        entry = await self.cache.get_or_load_async(self.key(user_id), lambda: self.discover(token))
+        if time.time() - entry['discovered_at'] >= self.cache.min_ttl - self.refresh_ahead:
+            await self.refresh_in_background(user_id, token)
+        if self.token_cipher is None:
+            return entry['pages']
+        return {page_id: self.with_token(page, self.token_cipher.decrypt) for page_id, page in entry['pages'].items()}
+
+    def key(self, user_id: str) -> str:
+        """Pages cached with and without their tokens are kept apart, setting a key does not serve the latter"""
+        return f"{user_id}:v{PAGES_VERSION}{'' if self.caches_page_tokens else ':no-tokens'}"
+
+    async def find_page(self, user_id: str, token: str, page_id: str) -> Optional[Dict[str, Any]]:
+        return (await self.get_pages(user_id, token)).get(page_id)
+
+    @property
+    def caches_page_tokens(self) -> bool:
+        return self.token_cipher is not None
+
+    async def discover(self, token: str) -> Dict[str, Any]:
+        pages = await self.instagram_graph_api_client.get_all_user_pages_async(token)
+        if self.token_cipher is None:
+            cached = [{field: value for field, value in page.items() if field != 'access_token'} for page in pages]
+        else:
+            cached = [self.with_token(page, self.token_cipher.encrypt) for page in pages]
+        return {'discovered_at': time.time(), 'pages': {page['id']: page for page in cached}}
+
+    @staticmethod
+    def with_token(page: Dict[str, Any], convert: Callable[[Optional[str]], Optional[str]]) -> Dict[str, Any]:
+        if 'access_token' not in page:
+            return page
+        return {**page, 'access_token': convert(page['access_token'])}
+
+    @staticmethod
+    def fields_of(page: Dict[str, Any], fields: Sequence[str]) -> Dict[str, Any]:
+        """The page as a Graph lookup asking for `fields` answers it, the ones Graph left out stay out"""
+        return {field: page[field] for field in dict.fromkeys((*fields, 'id')) if field in page}
+
+    async def refresh_in_background(self, user_id: str, token: str) -> None:
+        if user_id in self._refreshing or not await self.cache.claim_async(self.key(user_id), self.refresh_ahead):
+            return
+        # the refresh outlives the request which noticed the map is about to expire
+        task = asyncio.get_running_loop().create_task(self.refresh(user_id, token), context=context_without_deadline())
+        self._refreshing[user_id] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(user_id, None))
+
+    async def refresh(self, user_id: str, token: str) -> None:
+        try:
+            await self.cache.set_async(self.key(user_id), await self.discover(token))
+        except Exception as e:  # the cached map is served until it expires, the next lookup loads it again
+            self.logger.warning(f"Refreshing the pages of user {user_id} failed: {e!r}")
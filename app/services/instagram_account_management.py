@@ -1,39 +1,94 @@
+from http import HTTPStatus
 from typing import Optional
 
-from app.infrastructure.meta.instagram_platform.graph_api import InstagramGraphApiClient
+from fastapi import HTTPException
+
+from app.infrastructure.meta.instagram_platform.graph_api import (
+    INSTAGRAM_ACCOUNT_FIELDS,
+    INSTAGRAM_ACCOUNTS_FIELDS,
+    USER_PAGE_FIELDS,
+    InstagramGraphApiClient,
+)
+from app.services.instagram_account_discovery import InstagramAccountDiscoveryService
+from app.services.token_verification_cache import TokenVerificationCache
 
 
 class InstagramAccountManageService:
     def __init__(
             self,
             instagram_graph_api_client: InstagramGraphApiClient,
+            token_verification_cache: TokenVerificationCache,
+            passthrough: bool = False,
+            account_discovery: Optional[InstagramAccountDiscoveryService] = None,
     ):
         self.instagram_graph_api_client = instagram_graph_api_client
+        self.token_verification_cache = token_verification_cache
+        self.passthrough = passthrough  # relay the Graph bodies unparsed
+        self.account_discovery = account_discovery  # cached pages of every user, with their business account
+
+    def discovers(self, auth_id: Optional[str]) -> bool:
+        return auth_id is not None and self.account_discovery is not None and self.account_discovery.enabled
 
-    def get_instagram_account_info(
+    async def get_instagram_account_info(
             self,
             page_id: Optional[str],
             token: str,
+            auth_id: Optional[str] = None,
     ):
+        client = self.instagram_graph_api_client
+        if self.discovers(auth_id):
+            pages = await self.account_discovery.get_pages(auth_id, token)
+            fields_of = self.account_discovery.fields_of
+            if not page_id:  # every page of the user, not only the first `me/accounts` page
+                url = client.instagram_accounts_request(token).url
+                data = [fields_of(page, INSTAGRAM_ACCOUNTS_FIELDS) for page in pages.values()]
+                return {'url': url, 'json_data': {'data': data}}
+            if page_id in pages:
+                url = client.instagram_account_request(token, page_id).url
+                return {'url': url, 'json_data': fields_of(pages[page_id], INSTAGRAM_ACCOUNT_FIELDS)}
+            # not a page of the user as of the last discovery, Graph answers it or tells why not
         if page_id:
-            result = self.instagram_graph_api_client.get_instagram_account(
+            if self.passthrough:
+                return await client.get_instagram_account_raw_async(token, page_id=page_id)
+            result = await client.get_instagram_account_async(
                 token,
                 page_id=page_id
             )
         else:
-            result = self.instagram_graph_api_client.get_instagram_accounts(
+            if self.passthrough:
+                return await client.get_instagram_accounts_raw_async(token)
+            result = await client.get_instagram_accounts_async(
                 token,
             )
         return result
 
-    def get_user_pages(
+    async def get_user_pages(
             self,
             token: str,
+            auth_id: Optional[str] = None,
     ):
-        return self.instagram_graph_api_client.get_user_pages(token)
+        # the page tokens are part of the answer, only cached when there is a key to encrypt them with
+        if self.discovers(auth_id) and self.account_discovery.caches_page_tokens:
+            pages = await self.account_discovery.get_pages(auth_id, token)
+            url = self.instagram_graph_api_client.user_pages_request(token).url
+            data = [self.account_discovery.fields_of(page, USER_PAGE_FIELDS) for page in pages.values()]
+            return {'url': url, 'json_data': {'data': data}}
+        if self.passthrough:
+            return await self.instagram_graph_api_client.get_user_pages_raw_async(token)
+        return await self.instagram_graph_api_client.get_user_pages_async(token)
 
-    def verify_token(
+    async def verify_token(
             self,
             token: str,
     ):
-        return self.instagram_graph_api_client.me(token)
+        user = await self.token_verification_cache.get(token)
+        if user is not None:
+            return user
+        try:
+            user = await self.instagram_graph_api_client.me_async(token)
+        except HTTPException as e:
+            if e.status_code == HTTPStatus.UNAUTHORIZED:
+                await self.token_verification_cache.remember_invalid(token, e)
+            raise
+        await self.token_verification_cache.remember(token, user)
+        return user
@@ -0,0 +1,120 @@
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from multiprocessing import get_context
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
+
+if TYPE_CHECKING:  # Pillow is imported by the functions run in the image pool, not by the web worker
+    from PIL import Image
+
+
+@dataclass(frozen=True)
+class InstagramImageSpec:
+    """What the Content Publishing API accepts for a feed image"""
+    max_side: int = 1440
+    min_aspect_ratio: float = 4 / 5
+    max_aspect_ratio: float = 1.91
+    quality: int = 85
+
+
+class ImageProcessPool(Executor):
+    """
+    The process pool of a web worker, created by the warm-up or the first image to process, whichever
+    comes first. Creation and shutdown are serialised: no pool is created once it has been shut down.
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._shut_down = False
+        self._lock = threading.Lock()
+
+    def start(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._shut_down:
+                raise RuntimeError("The image process pool is shut down")
+            if self._pool is None:
+                # spawned rather than forked, the web worker has threads (and their locks) which must not be copied
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=get_context("spawn"))
+            return self._pool
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        return self.start().submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = True) -> None:
+        with self._lock:
+            self._shut_down = True
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def normalise_for_instagram(source: Union[bytes, str], spec: InstagramImageSpec) -> bytes:
+    """
+    Instagram ready derivative of an image: upright, centre cropped into the accepted aspect
+    ratio range, at most `spec.max_side` pixels per side, as a progressive JPEG.
+    Runs in the image process pool, everything it gets and returns is picklable: `source` is
+    the image, or the path of a file holding it for the images too big to be sent over.
+    """
+    from PIL import Image, ImageOps
+
+    image = Image.open(BytesIO(source) if isinstance(source, bytes) else source)
+    # JPEG can be decoded at 1/2, 1/4 or 1/8 of its size directly, never below the requested size
+    image.draft("RGB", (spec.max_side, spec.max_side))
+    image = ImageOps.exif_transpose(image)
+    image = flatten(image)
+
+    width, height = image.size
+    aspect_ratio = width / height
+    if aspect_ratio > spec.max_aspect_ratio:
+        cropped_width = round(height * spec.max_aspect_ratio)
+        left = (width - cropped_width) // 2
+        image = image.crop((left, 0, left + cropped_width, height))
+    elif aspect_ratio < spec.min_aspect_ratio:
+        cropped_height = round(width / spec.min_aspect_ratio)
+        top = (height - cropped_height) // 2
+        image = image.crop((0, top, width, top + cropped_height))
+
+    scale = max(image.size) / spec.max_side
+    if scale > 1:
+        if scale >= 2:
+            # cheap box reduction by an integer factor first, the resampling below only does the rest
+            image = image.reduce(int(scale))
+        size = (
+            max(1, round(image.width * spec.max_side / max(image.size))),
+            max(1, round(image.height * spec.max_side / max(image.size))),
+        )
+        image = image.resize(size, Image.LANCZOS)
+
+    output = BytesIO()
+    image.save(output, "JPEG", quality=spec.quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def create_thumbnails(source: Union[bytes, str], sizes: List[int], quality: int = 80) -> Dict[int, bytes]:
+    """JPEG thumbnails fitting in a `size` pixels square for every size, from a single decode of the bytes or the path"""
+    from PIL import Image, ImageOps
+
+    image = Image.open(BytesIO(source) if isinstance(source, bytes) else source)
+    image.draft("RGB", (max(sizes), max(sizes)))
+    image = flatten(ImageOps.exif_transpose(image))
+    thumbnails = {}
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size), Image.LANCZOS)  # in place, every size is made from the previous one
+        output = BytesIO()
+        image.save(output, "JPEG", quality=quality, optimize=True)
+        thumbnails[size] = output.getvalue()
+    return thumbnails
+
+
+def flatten(image: "Image.Image") -> "Image.Image":
+    """JPEG has no alpha channel, transparent pixels become white"""
+    from PIL import Image
+
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
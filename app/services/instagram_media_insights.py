@@ -1,25 +1,174 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List
+
 from app.infrastructure.meta.instagram_platform.graph_api import InstagramGraphApiClient
+from app.models.db.instagram_media_insight_snapshot import INSIGHT_METRICS, InstagramMediaInsightSnapshot
 from app.models.schemas.instagram import GetImagePostInsightsFromInstagramBusinessAccountInput, \
-    GetAllMediasInfoFromInstagramBusinessAccountInput
+    GetAllMediasInfoFromInstagramBusinessAccountInput, GetImagesPostInsightsBatchFromInstagramBusinessAccountInput, \
+    ImagePostInsightsBatchItem, ImagePostInsightsSnapshot
+from app.repositories.instagram_media_insight_snapshot_repository import InstagramMediaInsightSnapshotRepository
 
 
 class MediaInsightService:
+    """
+    Insights are read through a store of snapshots: a media is only fetched from Graph again once its
+    latest snapshot is older than the freshness window. Medias whose metrics still moved between the
+    last two snapshots use `freshness_window`, settled ones the longer `stable_freshness_window`, so
+    the Graph budget goes to the recent posts. A batch refreshes at most `max_refresh` stale medias,
+    the most needed first (see `refresh_priority`), the others are served from their last snapshot.
+    """
+
     def __init__(
             self,
             instagram_graph_api_client: InstagramGraphApiClient,
+            insight_snapshot_repository: InstagramMediaInsightSnapshotRepository,
+            freshness_window: float,
+            stable_freshness_window: float,
+            max_refresh: int,
+            passthrough: bool = False,
     ):
         self.instagram_graph_api_client = instagram_graph_api_client
+        self.passthrough = passthrough  # relay the Graph bodies unparsed
+        self.insight_snapshot_repository = insight_snapshot_repository
+        self.freshness_window = timedelta(seconds=freshness_window)
+        self.stable_freshness_window = timedelta(seconds=stable_freshness_window)
+        self.max_refresh = max_refresh
 
-    def get_image_insights(
+    async def get_image_insights(
             self,
             input_params: GetImagePostInsightsFromInstagramBusinessAccountInput,
             token: str,
+            auth_id: str,
     ):
-        return self.instagram_graph_api_client.get_image_insights(token, input_params.media_id)
+        media_id = input_params.media_id
+        url = self.instagram_graph_api_client.image_insights_request(token, media_id).url
+        if not input_params.refresh:
+            latest = await asyncio.to_thread(self.insight_snapshot_repository.latest, auth_id, [media_id])
+            if self.is_fresh(latest.get(media_id, [])):
+                snapshot = latest[media_id][0]
+                return {'url': url, 'json_data': snapshot.payload, 'fetched_at': self.as_utc(snapshot.fetched_at)}
+        result = await self.instagram_graph_api_client.get_image_insights_async(token, media_id)
+        if 'error' not in result['json_data']:
+            snapshot = self.to_snapshot(media_id, auth_id, result['json_data'])
+            await asyncio.to_thread(self.insight_snapshot_repository.add_many, [snapshot])
+            result['fetched_at'] = snapshot.fetched_at
+        return result
 
-    def get_list_all_instagram_medias(
+    async def get_images_insights_batch(
+            self,
+            input_params: GetImagesPostInsightsBatchFromInstagramBusinessAccountInput,
+            token: str,
+            auth_id: str,
+    ) -> List[ImagePostInsightsBatchItem]:
+        media_ids = list(dict.fromkeys(input_params.media_ids))
+        latest = await asyncio.to_thread(self.insight_snapshot_repository.latest, auth_id, media_ids)
+        stale = [
+            media_id for media_id in media_ids
+            if input_params.refresh or not self.is_fresh(latest.get(media_id, []))
+        ]
+        stale.sort(key=lambda media_id: self.refresh_priority(latest.get(media_id, [])))
+        stale, deferred = stale[:self.max_refresh], stale[self.max_refresh:]
+        fetched = await self.instagram_graph_api_client.get_images_insights_async(token, stale) if stale else []
+
+        items: Dict[str, ImagePostInsightsBatchItem] = {}
+        for media_id in deferred:  # left to a next request, they come first in it if still stale
+            if latest.get(media_id):
+                items[media_id] = self.to_batch_item(latest[media_id][0], stale=True)
+            else:
+                items[media_id] = ImagePostInsightsBatchItem(
+                    media_id=media_id, status_code=None, json_data=None, fetched_at=None,
+                    error=f"Not refreshed, a request refreshes {self.max_refresh} medias at most",
+                )
+        snapshots = []
+        for item in fetched:
+            if item['error'] is None:
+                snapshot = self.to_snapshot(item['media_id'], auth_id, item['json_data'])
+                snapshots.append(snapshot)
+                items[item['media_id']] = ImagePostInsightsBatchItem(**item, fetched_at=snapshot.fetched_at)
+            elif latest.get(item['media_id']):  # Graph failed, the last known numbers are better than nothing
+                items[item['media_id']] = self.to_batch_item(latest[item['media_id']][0], stale=True)
+            else:
+                items[item['media_id']] = ImagePostInsightsBatchItem(**item)
+        await asyncio.to_thread(self.insight_snapshot_repository.add_many, snapshots)
+        return [
+            items[media_id] if media_id in items else self.to_batch_item(latest[media_id][0])
+            for media_id in input_params.media_ids
+        ]
+
+    async def get_image_insights_history(
+            self,
+            media_id: str,
+            auth_id: str,
+            limit: int,
+    ) -> List[ImagePostInsightsSnapshot]:
+        snapshots = await asyncio.to_thread(self.insight_snapshot_repository.history, auth_id, media_id, limit)
+        return [ImagePostInsightsSnapshot.from_orm(snapshot) for snapshot in snapshots]
+
+    def is_fresh(self, snapshots: List[InstagramMediaInsightSnapshot]) -> bool:
+        if not snapshots:
+            return False
+        settled = len(snapshots) > 1 and snapshots[0].metrics() == snapshots[1].metrics()
+        window = self.stable_freshness_window if settled else self.freshness_window
+        return datetime.now(timezone.utc) - self.as_utc(snapshots[0].fetched_at) < window
+
+    def refresh_priority(self, snapshots: List[InstagramMediaInsightSnapshot]) -> tuple:
+        """Never fetched first, then medias whose metrics are still moving, then the oldest snapshots"""
+        if not snapshots:
+            return 0, 0.0
+        settled = len(snapshots) > 1 and snapshots[0].metrics() == snapshots[1].metrics()
+        return 2 if settled else 1, self.as_utc(snapshots[0].fetched_at).timestamp()
+
+    @staticmethod
+    def as_utc(moment: datetime) -> datetime:
+        return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+    @staticmethod
+    def to_snapshot(media_id: str, auth_id: str, payload: Dict[str, Any]) -> InstagramMediaInsightSnapshot:
+        values = {}
+        for metric in payload.get('data', []):
+            if metric.get('name') in INSIGHT_METRICS and metric.get('values'):
+                values[metric['name']] = metric['values'][0].get('value')
+        return InstagramMediaInsightSnapshot(
+            media_id=media_id,
+            auth_id=auth_id,
+            payload=payload,
+            fetched_at=datetime.now(timezone.utc),
+            **values,
+        )
+
+    @classmethod
+    def to_batch_item(cls, snapshot: InstagramMediaInsightSnapshot, stale: bool = False) -> ImagePostInsightsBatchItem:
+        return ImagePostInsightsBatchItem(
+            media_id=snapshot.media_id,
+            status_code=200,
+            json_data=snapshot.payload,
+            error=None,
+            fetched_at=cls.as_utc(snapshot.fetched_at),
+            stale=stale,
+        )
+
+    async def get_list_all_instagram_medias(
             self,
             input_params: GetAllMediasInfoFromInstagramBusinessAccountInput,
             token: str,
     ):
-        return self.instagram_graph_api_client.get_all_medias(token, input_params.instagram_business_account_id)
+        if self.passthrough:
+            return await self.instagram_graph_api_client.get_all_medias_raw_async(
+                token, input_params.instagram_business_account_id
+            )
+        return await self.instagram_graph_api_client.get_all_medias_async(
+            token, input_params.instagram_business_account_id
+        )
+
+    def iter_all_instagram_medias(
+            self,
+            input_params: GetAllMediasInfoFromInstagramBusinessAccountInput,
+            token: str,
+    ) -> AsyncIterator[dict[str, Any]]:
+        return self.instagram_graph_api_client.iter_all_medias_async(
+            token,
+            input_params.instagram_business_account_id,
+            limit=input_params.limit,
+            since=input_params.since,
+        )
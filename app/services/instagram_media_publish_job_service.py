@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+from uuid import uuid4
+
+from app.infrastructure.meta.instagram_platform.graph_api import InstagramGraphApiClient
+from app.infrastructure.meta.instagram_platform.rate_limit import THROTTLING_ERROR_CODES
+from app.infrastructure.meta.instagram_platform.resilience import TRANSIENT_ERROR_CODES, deadline
+from app.infrastructure.token_cipher import TokenCipher
+from app.models.db.image_publishing_metadata import InstagramImagePublishingMetadata
+from app.models.db.instagram_publish_job import InstagramPublishJob, PublishJobStatus
+from app.models.common.pagination import CursorPagedResponseSchema
+from app.models.schemas.instagram import GetPublishingHistoryInput, PostImageToInstagramBusinessAccountInput
+from app.repositories.instagram_image_upload_history_repository import (
+    InstagramImageUploadMetadataRepository,
+    NotUniqueError,
+)
+from app.repositories.instagram_publish_job_repository import InstagramPublishJobRepository
+from app.services.publishing_metadata_write_behind import PublishingMetadataWriteBehind
+
+CONTAINER_FINISHED = "FINISHED"
+CONTAINER_PUBLISHED = "PUBLISHED"
+CONTAINER_FAILED = ("ERROR", "EXPIRED")
+RECENT_MEDIAS_LIMIT = 25  # newest medias of the account searched for the one a container was published as
+MEDIA_CLOCK_SKEW = 300  # seconds a media timestamp may be older than the job, between our clock and Meta's
+
+
+class MediaPublishJobService:
+    """
+    Publishing an image is a job persisted in the DB: the API only records it, then a worker
+    creates the media container, polls its `status_code` with an adaptive backoff until Meta
+    has processed the media, and publishes it. The user token is stored encrypted, every run
+    of a job has `call_deadline` seconds to talk to Graph, kept below the lease of the job.
+    """
+
+    def __init__(
+            self,
+            instagram_graph_api_client: InstagramGraphApiClient,
+            publish_job_repository: InstagramPublishJobRepository,
+            image_upload_metadata_repository: InstagramImageUploadMetadataRepository,
+            initial_poll_delay: float,
+            max_poll_delay: float,
+            poll_backoff_factor: float,
+            max_polls: int,
+            lease: float,
+            token_cipher: TokenCipher,
+            call_deadline: float,
+            metadata_write_behind: Optional[PublishingMetadataWriteBehind] = None,
+    ):
+        self.instagram_graph_api_client = instagram_graph_api_client
+        self.publish_job_repository = publish_job_repository
+        self.image_upload_metadata_repository = image_upload_metadata_repository
+        self.initial_poll_delay = initial_poll_delay
+        self.max_poll_delay = max_poll_delay
+        self.poll_backoff_factor = poll_backoff_factor
+        self.max_polls = max_polls
+        self.lease = timedelta(seconds=lease)
+        self.token_cipher = token_cipher
+        # the run is over before another worker may claim the job again, saving it included
+        self.call_deadline = min(call_deadline, lease / 2)
+        self.metadata_write_behind = metadata_write_behind
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+
+    async def submit(
+            self,
+            input_params: PostImageToInstagramBusinessAccountInput,
+            token: str,
+            auth_id: str,
+    ) -> InstagramPublishJob:
+        job = InstagramPublishJob(
+            id=uuid4().hex,
+            auth_id=auth_id,
+            instagram_business_account_id=input_params.instagram_business_account_id,
+            image_url=input_params.image_url,
+            caption=input_params.caption,
+            access_token=self.token_cipher.encrypt(token),
+            status=PublishJobStatus.PENDING.value,
+            attempts=0,
+            next_run_at=datetime.now(timezone.utc),
+        )
+        return await asyncio.to_thread(self.publish_job_repository.add, job)
+
+    async def get(self, job_id: str, auth_id: str) -> Optional[InstagramPublishJob]:
+        return await asyncio.to_thread(self.publish_job_repository.get, job_id, auth_id)
+
+    async def get_publishing_history(
+            self,
+            input_params: GetPublishingHistoryInput,
+            auth_id: str,
+    ) -> CursorPagedResponseSchema[InstagramImagePublishingMetadata]:
+        return await self.image_upload_metadata_repository.history_async(
+            auth_id,
+            input_params.limit,
+            input_params.cursor,
+            input_params.instagram_business_account_id,
+            input_params.since,
+            input_params.until,
+        )
+
+    async def run_due_jobs(self, limit: int) -> int:
+        """Advance every due job by one step, return how many jobs were claimed"""
+        jobs = await asyncio.to_thread(self.publish_job_repository.claim_due, limit, self.lease)
+        await asyncio.gather(*[self.run(job) for job in jobs])
+        return len(jobs)
+
+    async def run(self, job: InstagramPublishJob) -> None:
+        try:
+            with deadline(self.call_deadline):
+                if job.instagram_media_container_id is None:
+                    await self.create_container(job)
+                else:
+                    await self.poll_container(job)
+        except Exception as e:
+            self.logger.exception("Publish job %s failed to run", job.id)
+            self.retry_later(job, str(e))
+        await asyncio.to_thread(self.publish_job_repository.save, job)
+
+    async def create_container(self, job: InstagramPublishJob) -> None:
+        result = await self.instagram_graph_api_client.create_image_container_async(
+            self.token_cipher.decrypt(job.access_token),
+            job.instagram_business_account_id,
+            job.image_url,
+            job.caption,
+        )
+        payload = result['json_data']
+        if 'id' not in payload:
+            self.fail_or_retry(job, payload)
+            return
+        job.instagram_media_container_id = payload['id']
+        job.status = PublishJobStatus.IN_PROGRESS.value
+        job.attempts = 0
+        self.schedule(job)
+
+    async def poll_container(self, job: InstagramPublishJob) -> None:
+        result = await self.instagram_graph_api_client.get_container_status_async(
+            self.token_cipher.decrypt(job.access_token),
+            job.instagram_media_container_id,
+        )
+        payload = result['json_data']
+        status_code = payload.get('status_code')
+        if status_code == CONTAINER_FINISHED:
+            await self.publish(job)
+        elif status_code == CONTAINER_PUBLISHED:  # published by a previous run which died before saving
+            await self.find_published_media(job)
+        elif 'error' in payload:
+            self.fail_or_retry(job, payload)
+        elif status_code in CONTAINER_FAILED:
+            self.fail(job, str(payload))
+        else:
+            self.retry_later(job, f"Media container is {status_code}", failed=False)
+
+    async def find_published_media(self, job: InstagramPublishJob) -> None:
+        """
+        The media id of a container published by a run which died before saving it. A container does not
+        tell which media it became: it is the oldest of the account's newest medias posted since the job was
+        submitted with the caption of the job
+        """
+        result = await self.instagram_graph_api_client.get_recent_medias_async(
+            self.token_cipher.decrypt(job.access_token),
+            job.instagram_business_account_id,
+            RECENT_MEDIAS_LIMIT,
+        )
+        payload = result['json_data']
+        if 'error' in payload:
+            self.fail_or_retry(job, payload)
+            return
+        since = job.created_at.timestamp() - MEDIA_CLOCK_SKEW if job.created_at is not None else float('-inf')
+        candidates = [
+            media for media in payload.get('data', [])
+            if (media.get('caption') or None) == (job.caption or None)
+            and self.instagram_graph_api_client.media_timestamp(media) >= since
+        ]
+        if not candidates:  # the listing may lag behind the container status
+            self.retry_later(job, "Media container is PUBLISHED, its media is not listed yet", failed=False)
+            return
+        await self.published(job, candidates[-1]['id'])
+
+    async def publish(self, job: InstagramPublishJob) -> None:
+        result = await self.instagram_graph_api_client.publish_image_async(
+            self.token_cipher.decrypt(job.access_token),
+            job.instagram_business_account_id,
+            job.instagram_media_container_id,
+        )
+        payload = result['json_data']
+        if 'id' not in payload:
+            self.fail_or_retry(job, payload)
+            return
+        await self.published(job, payload['id'])
+
+    async def published(self, job: InstagramPublishJob, instagram_media_published_id: str) -> None:
+        self.succeed(job, instagram_media_published_id)
+        # the media is live: saved before anything else may fail, a retry would have to look its id up again
+        await asyncio.to_thread(self.publish_job_repository.save, job)
+        await self.save_metadata(job)
+
+    async def save_metadata(self, job: InstagramPublishJob) -> None:
+        published_at = datetime.now(timezone.utc)
+        row = dict(
+            instagram_business_account_id=job.instagram_business_account_id,
+            auth_id=job.auth_id,
+            image_url=job.image_url,
+            caption=job.caption,
+            instagram_media_container_id=job.instagram_media_container_id,
+            instagram_media_published_id=job.instagram_media_published_id,
+            # when it was published, not when a batch of the write-behind reaches the DB; JSON ready to be spilled
+            created_at=published_at.isoformat(),
+        )
+        if self.metadata_write_behind is not None and await self.metadata_write_behind.put(row):
+            return
+        try:
+            await self.image_upload_metadata_repository.add_async(
+                InstagramImagePublishingMetadata(**{**row, 'created_at': published_at})
+            )
+        except NotUniqueError as e:
+            self.logger.error(e)
+
+    def poll_delay(self, attempts: int) -> float:
+        """Exponential backoff with a ±20% jitter so jobs submitted together don't poll together"""
+        delay = min(self.max_poll_delay, self.initial_poll_delay * self.poll_backoff_factor ** attempts)
+        return delay * random.uniform(0.8, 1.2)
+
+    def schedule(self, job: InstagramPublishJob) -> None:
+        job.next_run_at = datetime.now(timezone.utc) + timedelta(seconds=self.poll_delay(job.attempts))
+
+    def retry_later(self, job: InstagramPublishJob, reason: str, failed: bool = True) -> None:
+        """`reason` is kept as the error of the job when the step failed, not when it waits for Meta"""
+        job.attempts += 1
+        if job.attempts >= self.max_polls:
+            self.fail(job, f"Gave up after {job.attempts} attempts: {reason}")
+            return
+        job.error = reason if failed else None
+        self.schedule(job)
+
+    def fail_or_retry(self, job: InstagramPublishJob, payload: Any) -> None:
+        """A Graph error fails the job, unless it is transient or a throttling one"""
+        if self.is_retryable_error(payload):
+            self.retry_later(job, str(payload))
+        else:
+            self.fail(job, str(payload))
+
+    @staticmethod
+    def is_retryable_error(payload: Any) -> bool:
+        error = payload.get('error') if isinstance(payload, dict) else None
+        if not isinstance(error, dict):
+            return False
+        return (
+            bool(error.get('is_transient'))
+            or error.get('code') in TRANSIENT_ERROR_CODES
+            or error.get('code') in THROTTLING_ERROR_CODES
+        )
+
+    def succeed(self, job: InstagramPublishJob, instagram_media_published_id: str) -> None:
+        job.status = PublishJobStatus.PUBLISHED.value
+        job.instagram_media_published_id = instagram_media_published_id
+        job.error = None
+        job.access_token = None
+
+    def fail(self, job: InstagramPublishJob, error: str) -> None:
+        self.logger.error("Publish job %s failed: %s", job.id, error)
+        job.status = PublishJobStatus.FAILED.value
+        job.error = error
+        job.access_token = None
@@ -1,111 +1,269 @@
-from typing import List
+import hashlib
+import logging
+import os
+import tempfile
+import uuid
+from concurrent.futures import Executor
+from io import BytesIO
+from datetime import datetime, timezone
+from typing import BinaryIO, List, Optional, Tuple, Union
 
 from app.infrastructure.aws.s3 import S3Service
-from app.infrastructure.meta.instagram_platform.graph_api import InstagramGraphApiClient
-from app.models.db.image_publishing_metadata import InstagramImagePublishingMetadata
+from app.models.common.pagination import CursorPagedResponseSchema, decode_cursor, encode_cursor
+from app.models.db.image_upload import ImageUpload
 from app.models.schemas.aws_s3 import UploadS3FileResponse, S3FilesInFolderResponse
-from app.models.schemas.instagram import PostImageToInstagramBusinessAccountInput
-from io import BytesIO
-import hashlib
+from app.repositories.image_upload_repository import ImageUploadRepository
+from app.services.content_hash_index import ContentHashIndex
+from app.services.instagram_image_normalisation import InstagramImageSpec, create_thumbnails, \
+    normalise_for_instagram
+from app.services.thumbnail_queue import ThumbnailQueue
 
-from app.repositories.instagram_image_upload_history_repository import InstagramImageUploadMetadataRepository
+S3_MIN_PART_SIZE = 5 * 1024 * 1024  # every part of a multipart upload but the last one
+
+
+class InvalidImageError(Exception):
+    def __init__(self) -> None:
+        super().__init__("Your image is corrupted or damaged")
 
 
 class MediaUploadService:
+    """
+    Uploads are streamed: the file is read once, part by part, and every part is hashed and sent
+    to S3 before the next one is read, so a worker holds a single part in memory whatever the size.
+    The parts of a bigger file are also written to a temporary file, the image pool reads it from there.
+    The key is content addressed, the object is moved under it once the whole file has been hashed,
+    unless the content hash index knows it is already stored. An Instagram ready JPEG derivative
+    is stored next to it, so publishing does not fail on the format, size or aspect ratio.
+    """
+
     def __init__(
             self,
-            instagram_graph_api_client: InstagramGraphApiClient,
-            image_upload_metadata_repository: InstagramImageUploadMetadataRepository,
             s3: S3Service,
+            image_upload_repository: ImageUploadRepository,
+            content_hash_index: ContentHashIndex,
+            part_size: int,
+            image_process_pool: Optional[Executor] = None,
+            instagram_image_spec: InstagramImageSpec = InstagramImageSpec(),
+            thumbnail_sizes: Optional[List[int]] = None,
+            thumbnail_queue: Optional[ThumbnailQueue] = None,
     ):
-        self.instagram_graph_api_client = instagram_graph_api_client
-        self.image_upload_metadata_repository = image_upload_metadata_repository
         self.s3 = s3
-
-    def post_image_to_instagram(
-            self,
-            input_params: PostImageToInstagramBusinessAccountInput,
-            token: str,
-            auth_id: str,
-    ):
-        image_container = self.instagram_graph_api_client.create_image_container(
-            token,
-            input_params.instagram_business_account_id,
-            input_params.image_url,
-            input_params.caption
-        )
-        instagram_media_container_id = image_container['json_data']['id']
-        result = self.instagram_graph_api_client.publish_image(
-            token,
-            input_params.instagram_business_account_id,
-            instagram_media_container_id
-        )
-        instagram_media_published_id = result['json_data']['id']
-        self.image_upload_metadata_repository.add(
-            InstagramImagePublishingMetadata(
-                instagram_business_account_id=input_params.instagram_business_account_id,
-                auth_id=auth_id,
-                image_url=input_params.image_url,
-                caption=input_params.caption,
-                instagram_media_container_id=instagram_media_container_id,
-                instagram_media_published_id=instagram_media_published_id,
-            )
+        self.image_upload_repository = image_upload_repository
+        self.content_hash_index = content_hash_index
+        self.part_size = max(part_size, S3_MIN_PART_SIZE)
+        self.image_process_pool = image_process_pool
+        self.instagram_image_spec = instagram_image_spec
+        self.thumbnail_sizes = sorted(thumbnail_sizes or [])
+        self.thumbnail_queue = thumbnail_queue
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
         )
-        return result
 
     def upload_file_to_s3(
             self,
-            file: BytesIO,
+            file: BinaryIO,
             user_id: str,
             bucket_name: str,
             extension: str
     ) -> UploadS3FileResponse | None:
-        hashed_name = hashlib.sha256(file.read()).hexdigest()
-        upload_path = f"user/{user_id}/{hashed_name}{extension}"
-        path = self.s3.get_file_path(bucket_name, upload_path)
-        if path:
+        first_part = file.read(self.part_size)
+        width, height = self.validate_image_header(first_part)
+        sha256 = hashlib.sha256(first_part)
+        size = len(first_part)
+        next_part = file.read(self.part_size)
+        copy = None  # a file of several parts is copied to disk as it is read, the image pool opens it by path
+        try:
+            if not next_part:
+                # the whole file fits in a part, put it straight under its final key
+                source = first_part
+                upload_path = self.upload_path(user_id, sha256.hexdigest(), extension)
+                already_stored = self.content_hash_index.contains(upload_path)
+                if not already_stored:
+                    self.s3.put_file(first_part, bucket_name=bucket_name, key=upload_path)
+            else:
+                copy = tempfile.NamedTemporaryFile(prefix="upload-", suffix=extension, delete=False)
+                temp_path = f"tmp/user/{user_id}/{uuid.uuid4().hex}{extension}"
+                upload_id = self.s3.create_multipart_upload(bucket_name, temp_path)
+                try:
+                    copy.write(first_part)
+                    parts = [self.s3.upload_part(first_part, bucket_name, temp_path, upload_id, 1)]
+                    del first_part
+                    while next_part:
+                        sha256.update(next_part)
+                        size += len(next_part)
+                        copy.write(next_part)
+                        parts.append(self.s3.upload_part(next_part, bucket_name, temp_path, upload_id, len(parts) + 1))
+                        next_part = file.read(self.part_size)
+                    self.s3.complete_multipart_upload(bucket_name, temp_path, upload_id, parts)
+                except Exception:
+                    self.s3.abort_multipart_upload(bucket_name, temp_path, upload_id)
+                    raise
+                upload_path = self.upload_path(user_id, sha256.hexdigest(), extension)
+                try:
+                    already_stored = self.content_hash_index.contains(upload_path)
+                    if not already_stored:
+                        self.s3.copy_file(bucket_name, source_key=temp_path, key=upload_path)
+                finally:
+                    self.s3.delete_file(bucket_name, temp_path)
+                copy.close()
+                source = copy.name
+            self.content_hash_index.add(
+                ImageUpload(
+                    user_id=user_id,
+                    s3_key=upload_path,
+                    content_hash=sha256.hexdigest(),
+                    size=size,
+                    width=width,
+                    height=height,
+                    uploaded_at=datetime.now(timezone.utc),
+                )
+            )
+            self.logger.debug(
+                "File %s has been successfully uploaded by user %s",
+                upload_path,
+                user_id,
+            )
+
+            derivative_path = self.derivative_path(user_id, sha256.hexdigest())
+            if already_stored and self.s3.get_file_path(bucket_name, derivative_path):
+                derivative_url = self.s3.create_pre_signed_url(bucket_name, derivative_path)
+            else:
+                derivative_url = self.store_instagram_derivative(source, bucket_name, derivative_path)
             return UploadS3FileResponse(
                 upload_path,
-                self.s3.create_pre_signed_url(bucket_name, upload_path)
+                self.s3.create_pre_signed_url(bucket_name, upload_path),
+                instagram_ready_path=derivative_path if derivative_url else None,
+                instagram_ready_url=derivative_url,
             )
-        file.seek(0)
-        self.s3.upload_file(
-            file,
-            bucket_name=bucket_name,
-            key=upload_path,
-        )
-        self.logger.debug(
-            "File %s has been successfully uploaded by user %s",
-            upload_path,
-            user_id,
-        )
+        finally:
+            if copy is not None:
+                copy.close()
+                os.unlink(copy.name)
 
-        return UploadS3FileResponse(
-            upload_path, self.s3.create_pre_signed_url(bucket_name, upload_path)
-        )
+    def store_instagram_derivative(self, source: Union[bytes, str], bucket_name: str, derivative_path: str) -> Optional[str]:
+        """
+        Normalise the image, its bytes or the path of a copy, in the process pool (the calling thread
+        only waits for it) and store the result next to the original. The original stays usable when
+        the image cannot be decoded.
+        """
+        if self.image_process_pool is None:
+            return None
+        try:
+            derivative = self.image_process_pool.submit(
+                normalise_for_instagram, source, self.instagram_image_spec
+            ).result()
+        except Exception:
+            self.logger.exception("Could not normalise %s for Instagram", derivative_path)
+            return None
+        self.s3.put_file(derivative, bucket_name=bucket_name, key=derivative_path)
+        return self.s3.create_pre_signed_url(bucket_name, derivative_path)
+
+    @staticmethod
+    def derivative_path(user_id: str, hashed_name: str) -> str:
+        return f"user/{user_id}/{hashed_name}.instagram.jpg"
+
+    @staticmethod
+    def thumbnail_path(user_id: str, hashed_name: str, size: int) -> str:
+        return f"user/{user_id}/{hashed_name}.thumbnail_{size}.jpg"
+
+    @staticmethod
+    def upload_path(user_id: str, hashed_name: str, extension: str) -> str:
+        return f"user/{user_id}/{hashed_name}{extension}"
+
+    @staticmethod
+    def validate_image_header(header: bytes) -> Tuple[int, int]:
+        """
+        `Image.open` is lazy, it only parses the header found at the start of the file,
+        which is enough to tell an image and its dimensions
+        """
+        from PIL import Image, UnidentifiedImageError
+
+        try:
+            return Image.open(BytesIO(header)).size
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            raise InvalidImageError()
 
-    def list_s3_files_in_folder(
+    def list_uploaded_images(
             self,
             bucket_name: str,
-            user_id: str
-    ) -> List[S3FilesInFolderResponse]:
-        get_s3_objects_payload = self.s3.list_s3_objects_in_bucket(
-            user_id,
-            bucket_name
-        )
-        files = get_s3_objects_payload.get("Contents")
-        return (
-            [
+            user_id: str,
+            limit: int,
+            cursor: Optional[str] = None,
+    ) -> CursorPagedResponseSchema[S3FilesInFolderResponse]:
+        """
+        A page of the upload index, newest first; URLs are only signed for the returned page.
+        Raise ValueError for a cursor which does not come from a previous page.
+        """
+        after = None
+        if cursor:
+            try:
+                uploaded_at, upload_id = decode_cursor(cursor)
+                after = (datetime.fromisoformat(uploaded_at), int(upload_id))
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+        uploads = self.image_upload_repository.page(user_id, limit + 1, after)
+        next_cursor = None
+        if len(uploads) > limit:
+            uploads = uploads[:limit]
+            next_cursor = encode_cursor([uploads[-1].uploaded_at.isoformat(), uploads[-1].id])
+        self.queue_missing_thumbnails(bucket_name, uploads)
+
+        keys = []
+        for upload in uploads:
+            keys.append(upload.s3_key)
+            keys.extend(self.thumbnail_path(upload.user_id, upload.content_hash, size) for size in upload.thumbnail_sizes or [])
+        urls = iter(self.s3.create_pre_signed_urls(bucket_name, keys))
+        items = []
+        for upload in uploads:
+            url = next(urls)
+            thumbnail_urls = {size: next(urls) for size in upload.thumbnail_sizes or []}
+            # until its thumbnails are made, an upload is listed with its original in their place
+            thumbnail_urls.update({size: url for size in self.thumbnail_sizes if size not in thumbnail_urls})
+            items.append(
                 S3FilesInFolderResponse(
-                    file["Key"],
-                    self.s3.create_pre_signed_url(bucket_name, file["Key"]),
-                    str(file["LastModified"]),
+                    upload.s3_key,
+                    url,
+                    str(upload.uploaded_at),
+                    content_hash=upload.content_hash,
+                    size=upload.size,
+                    width=upload.width,
+                    height=upload.height,
+                    thumbnail_urls=thumbnail_urls,
                 )
-                for file in files
-            ]
-            if files
-            else []
-        )
+            )
+        return CursorPagedResponseSchema[S3FilesInFolderResponse](items=items, next_cursor=next_cursor)
+
+    def queue_missing_thumbnails(self, bucket_name: str, uploads: List[ImageUpload]) -> None:
+        """
+        Thumbnails are only made once an upload has been listed: the upload is queued, then in the
+        background its original is downloaded, every size is made in the image process pool and
+        stored under keys derived from the content hash, and the sizes are recorded on the upload
+        so the next listings only sign URLs
+        """
+        if self.image_process_pool is None or self.thumbnail_queue is None or not self.thumbnail_sizes:
+            return
+        for upload in uploads:
+            if not set(self.thumbnail_sizes).issubset(upload.thumbnail_sizes or []):
+                self.thumbnail_queue.submit(upload.id, lambda upload=upload: self.store_thumbnails(bucket_name, upload))
+
+    def store_thumbnails(self, bucket_name: str, upload: ImageUpload) -> Optional[List[int]]:
+        """The original is streamed to a temporary file, the image pool opens it by path"""
+        copy = tempfile.NamedTemporaryFile(prefix="thumbnail-", suffix=os.path.splitext(upload.s3_key)[1], delete=False)
+        try:
+            with copy:
+                self.s3.download_file(bucket_name, upload.s3_key, copy)
+            thumbnails = self.image_process_pool.submit(create_thumbnails, copy.name, self.thumbnail_sizes).result()
+            for size, thumbnail in thumbnails.items():
+                self.s3.put_file(
+                    thumbnail, bucket_name=bucket_name, key=self.thumbnail_path(upload.user_id, upload.content_hash, size)
+                )
+        except Exception:
+            self.logger.exception("Could not make the thumbnails of %s", upload.s3_key)
+            return upload.thumbnail_sizes
+        finally:
+            os.unlink(copy.name)
+        self.image_upload_repository.set_thumbnail_sizes(upload.id, self.thumbnail_sizes)
+        return self.thumbnail_sizes
 
 
 class PromptParserException(Exception):
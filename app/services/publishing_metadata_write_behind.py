@@ -0,0 +1,219 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.exc import InterfaceError, OperationalError, SQLAlchemyError
+
+from app.repositories.instagram_image_upload_history_repository import InstagramImageUploadMetadataRepository
+
+Row = Dict[str, Any]
+
+
+class PublishingMetadataWriteBehind:
+    """
+    Write-behind buffer of the publishing metadata: rows are queued in memory and a background
+    task inserts them in batches of `batch_size`, at most `linger` seconds after the first row
+    of a batch was queued. The queue holds `max_size` rows, producers wait once it is full.
+    On stop the queue is drained. A batch which cannot reach the DB is appended to the
+    `spill_path` file, replayed once the DB answers again (or on the next start). The workers
+    of a host share the file: appends are serialised by a lock file, a single process replays
+    it at a time, and rows stay in it until they are inserted, a row inserted twice is skipped
+    as a conflict.
+    """
+
+    def __init__(
+            self,
+            image_upload_metadata_repository: InstagramImageUploadMetadataRepository,
+            max_size: int,
+            batch_size: int,
+            linger: float,
+            spill_path: str,
+    ) -> None:
+        self.image_upload_metadata_repository = image_upload_metadata_repository
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.linger = linger
+        self.spill_path = Path(spill_path)
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self._queue: Optional[asyncio.Queue[Row]] = None
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._stopping.is_set()
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._queue = asyncio.Queue(self.max_size)
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        self._queue = None
+
+    async def put(self, row: Row) -> bool:
+        """Queue a row, False when the buffer is not running and the caller has to write it itself"""
+        if not self.running or self._queue is None:
+            return False
+        await self._queue.put(row)
+        return True
+
+    async def run(self) -> None:
+        assert self._queue is not None
+        try:
+            await self.replay_spill()
+        except Exception:
+            self.logger.exception("Failed to replay the spilled publishing metadata rows")
+        while not self._stopping.is_set() or not self._queue.empty():
+            batch = await self.next_batch()
+            if not batch:
+                continue
+            try:
+                await self.flush(batch)
+            except Exception:
+                self.logger.exception("Failed to write %s publishing metadata rows: %s", len(batch), batch)
+
+    async def next_batch(self) -> List[Row]:
+        assert self._queue is not None
+        try:
+            batch = [await asyncio.wait_for(self._queue.get(), self.linger)]
+        except asyncio.TimeoutError:
+            return []
+        loop = asyncio.get_running_loop()
+        flush_at = loop.time() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = flush_at - loop.time()
+            if remaining <= 0 or self._stopping.is_set():
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def flush(self, batch: List[Row]) -> None:
+        if not await self.insert(batch):
+            await asyncio.to_thread(self.spill, batch)
+        elif self.spill_path.exists():
+            await self.replay_spill()
+
+    async def insert(self, rows: List[Row]) -> bool:
+        """False when the DB could not be reached, the rows have to be kept"""
+        try:
+            await asyncio.to_thread(self.image_upload_metadata_repository.add_many, [self.decode(row) for row in rows])
+            return True
+        except (OperationalError, InterfaceError) as err:
+            self.logger.error("DB unavailable, %s publishing metadata rows kept aside: %s", len(rows), err)
+            return False
+        except SQLAlchemyError:
+            self.logger.exception("Failed to insert %s publishing metadata rows, inserting them one by one", len(rows))
+        return await asyncio.to_thread(self.insert_one_by_one, rows)
+
+    def insert_one_by_one(self, rows: List[Row]) -> bool:
+        """A row the DB rejects alone is logged and dropped, the others are inserted"""
+        for row in rows:
+            try:
+                self.image_upload_metadata_repository.add_many([self.decode(row)])
+            except (OperationalError, InterfaceError) as err:
+                self.logger.error("DB unavailable, %s publishing metadata rows kept aside: %s", len(rows), err)
+                return False
+            except SQLAlchemyError:
+                self.logger.exception("Dropped a publishing metadata row the DB rejects: %s", row)
+        return True
+
+    @staticmethod
+    def decode(row: Row) -> Row:
+        """Rows are queued and spilled as JSON, their `created_at` as an ISO 8601 string"""
+        if isinstance(row.get('created_at'), str):
+            return {**row, 'created_at': datetime.fromisoformat(row['created_at'])}
+        return row
+
+    @property
+    def lock_path(self) -> Path:
+        return self.spill_path.with_name(self.spill_path.name + ".lock")
+
+    @property
+    def replay_lock_path(self) -> Path:
+        return self.spill_path.with_name(self.spill_path.name + ".replay.lock")
+
+    @contextmanager
+    def locked(self, path: Path, blocking: bool = True) -> Iterator[bool]:
+        """Exclusive lock on `path` among the processes of the host, False when not `blocking` and already held"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def spill(self, rows: List[Row]) -> None:
+        with self.locked(self.lock_path):
+            with self.spill_path.open("a") as spill_file:
+                spill_file.writelines(json.dumps(row) + "\n" for row in rows)
+                spill_file.flush()
+                os.fsync(spill_file.fileno())
+
+    def read_spill(self) -> Tuple[List[Row], int]:
+        """The spilled rows and the bytes they were read from, a line which cannot be decoded is skipped"""
+        with self.locked(self.lock_path):
+            content = self.spill_path.read_bytes() if self.spill_path.exists() else b""
+        rows = []
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                self.logger.error("Skipped a spilled publishing metadata line which cannot be decoded: %r", line)
+        return rows, len(content)
+
+    def drop_replayed(self, size: int) -> None:
+        """Remove the first `size` bytes, the rows spilled meanwhile by any process are kept"""
+        with self.locked(self.lock_path):
+            with self.spill_path.open("rb") as spill_file:
+                spill_file.seek(size)
+                rest = spill_file.read()
+            if not rest:
+                self.spill_path.unlink()
+                return
+            rewritten = self.spill_path.with_name(self.spill_path.name + ".tmp")
+            with rewritten.open("wb") as rewritten_file:
+                rewritten_file.write(rest)
+                rewritten_file.flush()
+                os.fsync(rewritten_file.fileno())
+            os.replace(rewritten, self.spill_path)
+
+    async def replay_spill(self) -> None:
+        # a process which is already replaying the file is left to it; a replay which stops
+        # halfway leaves the whole file, its rows inserted already are skipped the next time
+        with self.locked(self.replay_lock_path, blocking=False) as acquired:
+            if not acquired or not self.spill_path.exists():
+                return
+            rows, size = await asyncio.to_thread(self.read_spill)
+            self.logger.info("Replaying %s spilled publishing metadata rows", len(rows))
+            for start in range(0, len(rows), self.batch_size):
+                if not await self.insert(rows[start:start + self.batch_size]):
+                    return
+            await asyncio.to_thread(self.drop_replayed, size)
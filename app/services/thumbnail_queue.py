@@ -0,0 +1,54 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable, Set
+
+
+class ThumbnailQueue:
+    """
+    Thumbnails made in the background, `concurrency` uploads at a time, so that listing the
+    uploads never waits for them. An upload is queued once until its job is over, and nothing
+    is queued beyond `max_queued` jobs: the next listing queues what was left out.
+    """
+
+    def __init__(self, concurrency: int, max_queued: int) -> None:
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="thumbnails")
+        self._queued: Set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, job: Callable[[], object]) -> bool:
+        """Queue `job` unless the one of `key` is queued already or the queue is full"""
+        with self._lock:
+            if key in self._queued or len(self._queued) >= self.max_queued:
+                return False
+            self._queued.add(key)
+        try:
+            self._executor.submit(self.run, key, job)
+        except RuntimeError:  # shut down
+            self.forget(key)
+            return False
+        return True
+
+    def run(self, key: Hashable, job: Callable[[], object]) -> None:
+        try:
+            job()
+        except Exception:
+            self.logger.exception("Thumbnail job %s failed", key)
+        finally:
+            self.forget(key)
+
+    def forget(self, key: Hashable) -> None:
+        with self._lock:
+            self._queued.discard(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"queued": len(self._queued), "max_queued": self.max_queued}
+
+    def shutdown(self) -> None:
+        """The jobs not started yet are dropped, their uploads are queued again when listed"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
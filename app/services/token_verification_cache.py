@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+import logging
+from typing import Optional, Set
+
+from fastapi import HTTPException
+
+from app.infrastructure.cache.shared_cache import CacheNamespace
+from app.models.schemas.instagram import Me
+
+
+class TokenVerificationCache:
+    """
+    Remember the outcome of `/me` for a bearer token, so the auth dependency does not cost a
+    Graph round trip on every request. Valid tokens are kept for the TTL of the namespace, rejected
+    ones only for `negative_ttl` seconds. Tokens are never stored in clear, the key is their SHA-256.
+    """
+
+    def __init__(
+            self,
+            cache: CacheNamespace,
+            negative_ttl: float,
+    ) -> None:
+        self.logger = logging.getLogger(
+            f"{__name__}.{self.__class__.__name__}",
+        )
+        self.negative_ttl = negative_ttl
+        self._cache = cache
+        self._evicting: Set[asyncio.Task] = set()  # evictions running in the background
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    async def get(self, token: str) -> Optional[Me]:
+        """Return the cached user, re-raise the cached rejection or None when unknown"""
+        entry = await self._cache.get_async(self.key(token))
+        if entry is None:
+            return None
+        if 'rejected' in entry:
+            raise HTTPException(status_code=entry['rejected']['status_code'], detail=entry['rejected']['detail'])
+        user = Me.parse_obj(entry['user'])
+        user.token = token
+        return user
+
+    async def remember(self, token: str, user: Me) -> None:
+        await self._cache.set_async(self.key(token), {'user': user.dict(exclude={"token"})})
+
+    async def remember_invalid(self, token: str, error: HTTPException) -> None:
+        rejected = {'status_code': error.status_code, 'detail': error.detail}
+        await self._cache.set_async(self.key(token), {'rejected': rejected}, ttl=self.negative_ttl)
+
+    def evict(self, token: str) -> None:
+        """
+        Forget a token, e.g. because Graph answered a later call with an OAuthException. Called from
+        the event loop, the delete runs in the background so that a blocking backend never holds it.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:  # a sync Graph call, from a thread of its own
+            self.evicted(self._cache.delete(self.key(token)))
+            return
+        task = loop.create_task(self.evict_async(token))
+        self._evicting.add(task)
+        task.add_done_callback(self._evicting.discard)
+
+    async def evict_async(self, token: str) -> None:
+        self.evicted(await self._cache.delete_async(self.key(token)))
+
+    def evicted(self, deleted: bool) -> None:
+        if deleted:
+            self.logger.debug("Evicted a revoked token from the verification cache")
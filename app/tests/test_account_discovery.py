@@ -0,0 +1,60 @@
+from typing import Any, Dict, List
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app.infrastructure.cache.backends import InProcessCacheBackend
+from app.infrastructure.cache.shared_cache import SharedCache
+from app.infrastructure.token_cipher import ENCRYPTED_PREFIX, TokenCipher
+from app.services.instagram_account_discovery import InstagramAccountDiscoveryService
+from app.services.instagram_account_management import InstagramAccountManageService
+
+PAGES = [{"id": "1", "name": "Page", "access_token": "EAAG-page-token"}]
+
+
+class FakeGraphApiClient:
+    def __init__(self) -> None:
+        self.calls: List[str] = []
+
+    async def get_all_user_pages_async(self, token: str) -> List[Dict[str, Any]]:
+        self.calls.append("discovery")
+        return [dict(page) for page in PAGES]
+
+    async def get_user_pages_async(self, token: str) -> Dict[str, Any]:
+        self.calls.append("user_pages")
+        return {"url": "me/accounts", "json_data": {"data": PAGES}}
+
+    def user_pages_request(self, token: str) -> Any:
+        return type("Request", (), {"url": "me/accounts"})
+
+
+def services(token_cipher: Any) -> tuple:
+    backend = InProcessCacheBackend(max_size=100)
+    cache = SharedCache(backend, {"default": 60}, key_prefix="test", lock_timeout=1, ttl_jitter=0)
+    graph = FakeGraphApiClient()
+    discovery = InstagramAccountDiscoveryService(graph, cache.namespace("accounts"), 10, token_cipher)
+    management = InstagramAccountManageService(graph, token_verification_cache=None, account_discovery=discovery)
+    return graph, backend, discovery, management
+
+
+def test_no_key_means_no_cipher() -> None:
+    assert TokenCipher.optional(None, "ACCOUNT_DISCOVERY_TOKEN_KEY") is None
+    assert TokenCipher.optional("", "ACCOUNT_DISCOVERY_TOKEN_KEY") is None
+
+
+@pytest.mark.asyncio
+async def test_page_tokens_are_cached_encrypted() -> None:
+    graph, backend, discovery, management = services(TokenCipher(Fernet.generate_key().decode()))
+    assert (await discovery.get_pages("user", "token"))["1"]["access_token"] == "EAAG-page-token"
+    cached = b"".join(value for _, value in backend._entries.items())
+    assert b"EAAG-page-token" not in cached and ENCRYPTED_PREFIX.encode() in cached
+    assert (await management.get_user_pages("token", auth_id="user"))["json_data"]["data"] == PAGES
+    assert graph.calls == ["discovery"]
+
+
+@pytest.mark.asyncio
+async def test_page_tokens_are_not_cached_without_a_key() -> None:
+    graph, backend, discovery, management = services(None)
+    assert "access_token" not in (await discovery.get_pages("user", "token"))["1"]
+    assert (await management.get_user_pages("token", auth_id="user"))["json_data"]["data"] == PAGES
+    assert graph.calls == ["discovery", "user_pages"]
@@ -0,0 +1,60 @@
+from typing import AsyncIterator
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+
+from app.infrastructure.meta.instagram_platform.graph_api import InstagramGraphApiClient
+from benchmarks.fake_graph_api import INVALID_TOKEN, FakeGraphApiSettings, create_app
+
+
+def graph_client(settings: FakeGraphApiSettings) -> InstagramGraphApiClient:
+    """The client of the app talking to benchmarks/fake_graph_api in process"""
+    return InstagramGraphApiClient(
+        environment="production",
+        http_client=httpx.Client(),
+        async_http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(settings))),
+        graph_domain="http://graph.test/",
+    )
+
+
+@pytest_asyncio.fixture
+async def client() -> AsyncIterator[InstagramGraphApiClient]:
+    graph = graph_client(FakeGraphApiSettings(latency=0, latency_jitter=0, media_count=250))
+    yield graph
+    await graph.aclose()
+
+
+@pytest.mark.asyncio
+async def test_medias_are_followed_page_by_page(client) -> None:
+    medias = [media async for media in client.iter_all_medias_async("token", "17841")]
+    assert len({media["id"] for media in medias}) == 250
+    timestamps = [client.media_timestamp(media) for media in medias]
+    assert timestamps == sorted(timestamps, reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_insights_batches_answer_every_media(client) -> None:
+    media_ids = [f"1784{index:06d}" for index in range(60)]
+    items = await client.get_images_insights_async("token", media_ids)
+    assert [item["media_id"] for item in items] == media_ids
+    assert all(item["status_code"] == 200 and item["json_data"]["data"] for item in items)
+
+
+@pytest.mark.asyncio
+async def test_invalid_token_is_an_oauth_error(client) -> None:
+    with pytest.raises(HTTPException) as raised:
+        [media async for media in client.iter_all_medias_async(INVALID_TOKEN, "17841")]
+    assert raised.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_call_budget_ends_in_the_rate_limit_error() -> None:
+    graph = graph_client(FakeGraphApiSettings(latency=0, latency_jitter=0, call_budget=2))
+    try:
+        statuses = [await graph.get_container_status_async("token", "17841") for _ in range(3)]
+    finally:
+        await graph.aclose()
+    assert statuses[0]["json_data"]["status_code"] == "FINISHED"
+    assert statuses[2]["json_data"]["error"]["code"] == 4
@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+import pytest
+from sqlalchemy import create_engine, orm
+from sqlalchemy.pool import StaticPool
+
+from app.infrastructure.db.database import Base
+from app.models.db.image_upload import ImageUpload
+from app.repositories.image_upload_repository import ImageUploadRepository
+from app.services.content_hash_index import ContentHashIndex
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingRepository(ImageUploadRepository):
+    def __init__(self, session_factory) -> None:
+        super().__init__(session_factory)
+        self.lookups = 0
+
+    def exists(self, s3_key: str) -> bool:
+        self.lookups += 1
+        return super().exists(s3_key)
+
+
+@pytest.fixture
+def repository() -> CountingRepository:
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[ImageUpload.__table__])
+    session_maker = orm.sessionmaker(bind=engine, autoflush=False)
+
+    @contextmanager
+    def session_factory() -> Iterator[orm.Session]:
+        with session_maker() as session:
+            yield session
+
+    return CountingRepository(session_factory)
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+def index(repository: ImageUploadRepository, clock: FakeClock) -> ContentHashIndex:
+    return ContentHashIndex(
+        repository, s3=None, bloom_capacity=1000, bloom_error_rate=0.001, bloom_sync_interval=1, clock=clock
+    )
+
+
+def upload(key: str, upload_id: Optional[int] = None) -> ImageUpload:
+    return ImageUpload(
+        id=upload_id, user_id="user", s3_key=key, content_hash="0" * 64, size=1, uploaded_at=datetime.now(timezone.utc)
+    )
+
+
+def test_lookups_go_to_the_table_until_the_filter_is_loaded(repository, clock) -> None:
+    repository.add(upload("user/user/a.jpg"))
+    content_hash_index = index(repository, clock)
+    assert content_hash_index.contains("user/user/a.jpg") is True
+    assert content_hash_index.contains("user/user/b.jpg") is False
+    assert repository.lookups == 2
+
+
+def test_loaded_filter_answers_misses_alone(repository, clock) -> None:
+    repository.add(upload("user/user/a.jpg"))
+    content_hash_index = index(repository, clock)
+    content_hash_index.load()
+    assert content_hash_index.contains("user/user/b.jpg") is False
+    assert repository.lookups == 0
+    assert content_hash_index.contains("user/user/a.jpg") is True
+    assert repository.lookups == 1
+
+
+def test_keys_indexed_by_another_process_are_caught_up(repository, clock) -> None:
+    this_worker, other_worker = index(repository, clock), index(repository, clock)
+    this_worker.load()
+    other_worker.load()
+    other_worker.add(upload("user/user/a.jpg"))
+    assert this_worker.contains("user/user/a.jpg") is False  # synced less than a second ago
+    clock.now += 1
+    assert this_worker.contains("user/user/a.jpg") is True
+
+
+def test_catch_up_reads_again_since_the_sync_before(repository, clock) -> None:
+    content_hash_index = index(repository, clock)
+    content_hash_index.load()
+    repository.add(upload("user/user/a.jpg", 1))
+    clock.now += 1
+    content_hash_index.sync()
+    repository.add(upload("user/user/c.jpg", 3))
+    clock.now += 1
+    content_hash_index.sync()
+    repository.add(upload("user/user/b.jpg", 2))  # its id was taken before the last sync, committed after it
+    clock.now += 1
+    assert content_hash_index.contains("user/user/b.jpg") is True
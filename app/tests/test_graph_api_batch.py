@@ -0,0 +1,101 @@
+import asyncio
+import json
+from typing import Any, Callable, List
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+
+from app.infrastructure.meta.instagram_platform.graph_api import InstagramGraphApiClient
+
+TOKEN = "EAAG-user-token"
+
+
+def graph_client(handler: Callable[[httpx.Request], Any], **kwargs: Any) -> InstagramGraphApiClient:
+    return InstagramGraphApiClient(
+        environment="test",
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+        async_http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        **kwargs,
+    )
+
+
+def sub_requests(request: httpx.Request) -> List[dict]:
+    return json.loads(parse_qs(request.content.decode())["batch"][0])
+
+
+def insights(likes: int) -> dict:
+    return {"code": 200, "body": json.dumps({"data": [{"name": "likes", "values": [{"value": likes}]}]})}
+
+
+@pytest.mark.asyncio
+async def test_batch_items_are_parsed_in_order() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert len(sub_requests(request)) == 4
+        return httpx.Response(200, json=[
+            insights(1),
+            {"code": 400, "body": json.dumps({"error": {"message": "Unsupported", "code": 100}})},
+            None,  # did not complete in time
+            {"code": 200, "body": "not json"},
+        ])
+
+    items = await graph_client(handler).get_images_insights_async(TOKEN, ["1", "2", "3", "4"])
+    assert [item["media_id"] for item in items] == ["1", "2", "3", "4"]
+    assert items[0]["json_data"]["data"][0]["values"] == [{"value": 1}] and items[0]["error"] is None
+    assert items[1]["status_code"] == 400 and items[1]["json_data"] is None and "Unsupported" in items[1]["error"]
+    assert items[2]["error"] == "Sub-request timed out"
+    assert items[3]["json_data"] == "not json"
+
+
+@pytest.mark.asyncio
+async def test_sub_requests_carry_no_token() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert parse_qs(request.content.decode())["access_token"] == [TOKEN]
+        assert sub_requests(request) == [
+            {"method": "GET", "relative_url": "v18.0/1/insights?metric=likes%2Ccomments%2Creach%2Cimpressions"},
+        ]
+        return httpx.Response(200, json=[insights(1)])
+
+    await graph_client(handler).get_images_insights_async(TOKEN, ["1"])
+
+
+@pytest.mark.asyncio
+async def test_media_ids_missing_from_the_answer_get_an_error() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=[insights(1)])
+
+    items = await graph_client(handler).get_images_insights_async(TOKEN, ["1", "2", "3"])
+    assert [item["media_id"] for item in items] == ["1", "2", "3"]
+    assert items[0]["error"] is None
+    assert items[1]["error"] == items[2]["error"] == "Missing from the batch response"
+
+
+@pytest.mark.asyncio
+async def test_rejected_batch_fails_every_media() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(400, json={"error": {"message": "Invalid token", "type": "OAuthException", "code": 190}})
+
+    items = await graph_client(handler).get_images_insights_async(TOKEN, ["1", "2"])
+    assert [item["status_code"] for item in items] == [None, None]
+    assert all("Invalid token" in item["error"] for item in items)
+
+
+@pytest.mark.asyncio
+async def test_large_requests_are_split_into_bounded_batches() -> None:
+    in_flight, most_in_flight, sizes = 0, 0, []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, most_in_flight
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        batch = sub_requests(request)
+        sizes.append(len(batch))
+        return httpx.Response(200, json=[insights(1) for _ in batch])
+
+    media_ids = [str(index) for index in range(120)]
+    items = await graph_client(handler, batch_concurrency=2).get_images_insights_async(TOKEN, media_ids)
+    assert [item["media_id"] for item in items] == media_ids
+    assert sorted(sizes) == [20, 50, 50]
+    assert most_in_flight == 2
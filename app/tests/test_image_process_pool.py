@@ -0,0 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.instagram_image_normalisation import ImageProcessPool
+
+
+def test_warm_up_and_first_use_share_one_pool() -> None:
+    image_process_pool = ImageProcessPool(max_workers=1)
+    with ThreadPoolExecutor(max_workers=8) as threads:
+        pools = list(threads.map(lambda _: image_process_pool.start(), range(8)))
+    assert all(pool is pools[0] for pool in pools)
+    image_process_pool.shutdown()
+
+
+def test_no_pool_is_created_once_shut_down() -> None:
+    image_process_pool = ImageProcessPool(max_workers=1)
+    image_process_pool.shutdown()  # before the warm-up got to it
+    with pytest.raises(RuntimeError):
+        image_process_pool.start()
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Any, Dict, Iterator, List
+
+import pytest
+from PIL import Image
+from sqlalchemy import create_engine, orm
+from sqlalchemy.pool import StaticPool
+
+from app.infrastructure.aws.s3 import S3Service
+from app.infrastructure.db.database import Base
+from app.models.db.image_upload import ImageUpload
+from app.repositories.image_upload_repository import ImageUploadRepository
+from app.services import instagram_media_upload_service
+from app.services.content_hash_index import ContentHashIndex
+from app.services.instagram_media_upload_service import InvalidImageError, MediaUploadService
+from benchmarks.fake_s3 import InMemoryS3
+
+BUCKET = "bucket"
+
+
+class RecordingS3(InMemoryS3):
+    """Records the operations `S3Service` runs"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.operations: List[str] = []
+
+
+class RecordingS3Service(S3Service):
+    def call(self, operation: str, *args: Any, **kwargs: Any) -> Any:
+        self.s3_client.operations.append(operation)
+        return super().call(operation, *args, **kwargs)
+
+
+def image(width: int, height: int, image_format: str = "PNG") -> bytes:
+    random.seed(width * height)
+    picture = Image.frombytes("RGB", (width, height), bytes(random.getrandbits(8) for _ in range(width * height * 3)))
+    output = BytesIO()
+    picture.save(output, image_format)
+    return output.getvalue()
+
+
+@pytest.fixture
+def s3_client() -> RecordingS3:
+    return RecordingS3()
+
+
+@pytest.fixture
+def repository() -> ImageUploadRepository:
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[ImageUpload.__table__])
+    session_maker = orm.sessionmaker(bind=engine, autoflush=False)
+
+    @contextmanager
+    def session_factory() -> Iterator[orm.Session]:
+        with session_maker() as session:
+            yield session
+
+    return ImageUploadRepository(session_factory)
+
+
+@pytest.fixture
+def service(s3_client: RecordingS3, repository: ImageUploadRepository, monkeypatch) -> Iterator[MediaUploadService]:
+    monkeypatch.setattr(instagram_media_upload_service, "S3_MIN_PART_SIZE", 1024)  # multipart from 1 KiB
+    s3 = RecordingS3Service(s3_client)
+    pool = ThreadPoolExecutor(max_workers=1)
+    yield MediaUploadService(
+        s3,
+        repository,
+        ContentHashIndex(repository, s3, bloom_capacity=1000, bloom_error_rate=0.01, bloom_sync_interval=0),
+        part_size=1024,
+        image_process_pool=pool,
+        thumbnail_sizes=[64, 32],
+    )
+    pool.shutdown()
+
+
+def stored(s3_client: RecordingS3) -> Dict[str, bytes]:
+    return {key: body for (_, key), body in s3_client.objects.items()}
+
+
+def test_small_upload_is_put_under_its_content_hash(service, s3_client) -> None:
+    body = image(8, 8)
+    assert len(body) < 1024
+    result = service.upload_file_to_s3(BytesIO(body), "user", BUCKET, ".png")
+    key = f"user/user/{hashlib.sha256(body).hexdigest()}.png"
+    assert result.s3_bucket_path_key == key
+    assert stored(s3_client)[key] == body
+    assert "create_multipart_upload" not in s3_client.operations
+    derivative = Image.open(BytesIO(stored(s3_client)[result.instagram_ready_path]))
+    assert derivative.format == "JPEG"
+
+
+def test_big_upload_is_streamed_in_parts_then_moved(service, s3_client, repository) -> None:
+    body = image(40, 40)
+    assert len(body) > 2 * 1024
+    result = service.upload_file_to_s3(BytesIO(body), "user", BUCKET, ".png")
+    key = f"user/user/{hashlib.sha256(body).hexdigest()}.png"
+    assert result.s3_bucket_path_key == key
+    assert stored(s3_client)[key] == body
+    assert s3_client.operations.count("upload_part") == -(-len(body) // 1024)
+    assert not any(key.startswith("tmp/") for key in stored(s3_client))  # the temporary object is deleted
+    assert s3_client.multipart_uploads == {}
+    assert repository.exists(key)
+    assert result.instagram_ready_path in stored(s3_client)
+
+
+def test_same_content_is_stored_once(service, s3_client) -> None:
+    body = image(40, 40)
+    service.upload_file_to_s3(BytesIO(body), "user", BUCKET, ".png")
+    s3_client.operations.clear()
+    result = service.upload_file_to_s3(BytesIO(body), "user", BUCKET, ".png")
+    assert "copy_object" not in s3_client.operations
+    assert "put_object" not in s3_client.operations  # the derivative is reused as well
+    assert result.instagram_ready_url is not None
+
+
+def test_invalid_image_is_rejected_before_anything_is_stored(service, s3_client) -> None:
+    with pytest.raises(InvalidImageError):
+        service.upload_file_to_s3(BytesIO(os.urandom(4096)), "user", BUCKET, ".png")
+    assert s3_client.objects == {}
+
+
+def test_thumbnails_are_made_from_the_streamed_original(service, s3_client, repository) -> None:
+    body = image(200, 100)
+    result = service.upload_file_to_s3(BytesIO(body), "user", BUCKET, ".png")
+    upload = repository.page("user", 1)[0]
+    assert service.store_thumbnails(BUCKET, upload) == [32, 64]
+    content_hash = result.s3_bucket_path_key.split("/")[-1].split(".")[0]
+    thumbnail = Image.open(BytesIO(stored(s3_client)[f"user/user/{content_hash}.thumbnail_64.jpg"]))
+    assert thumbnail.size == (64, 32)
+    assert repository.page("user", 1)[0].thumbnail_sizes == [32, 64]
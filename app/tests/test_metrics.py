@@ -0,0 +1,90 @@
+import json
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from app.infrastructure.monitoring.metrics import EXITED_FILE, Counter, Gauge, Histogram, MetricsRegistry
+
+
+@pytest.fixture
+def exited_pid() -> int:
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+
+def registry() -> MetricsRegistry:
+    metrics_registry = MetricsRegistry()
+    metrics_registry.register(Counter("calls_total", "Calls", ("endpoint",)))
+    metrics_registry.register(Gauge("calls_in_flight", "Calls in flight", ("endpoint",)))
+    metrics_registry.register(Histogram("call_duration_seconds", "Call duration", ("endpoint",), buckets=(0.1, 1)))
+    return metrics_registry
+
+
+def worker_file(directory: Path, pid: int, calls: float, in_flight: float) -> None:
+    (directory / f"worker-{pid}.json").write_text(json.dumps({
+        "calls_total": [[["me"], [calls]]],
+        "calls_in_flight": [[["me"], [in_flight]]],
+    }))
+
+
+def sample(rendered: str, name: str) -> str:
+    return next(line for line in rendered.splitlines() if line.startswith(name)).split(" ")[-1]
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    metrics_registry = registry()
+    histogram = metrics_registry.metrics["call_duration_seconds"]
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, endpoint="me")
+    rendered = metrics_registry.render()
+    assert 'call_duration_seconds_bucket{endpoint="me",le="0.1"} 1' in rendered
+    assert 'call_duration_seconds_bucket{endpoint="me",le="1.0"} 2' in rendered
+    assert 'call_duration_seconds_bucket{endpoint="me",le="+Inf"} 3' in rendered
+    assert 'call_duration_seconds_count{endpoint="me"} 3' in rendered
+
+
+def test_counter_only_goes_up() -> None:
+    with pytest.raises(ValueError):
+        Counter("calls_total", "Calls").dec()
+
+
+def test_scrape_sums_the_workers(tmp_path: Path) -> None:
+    metrics_registry = registry()
+    metrics_registry.metrics["calls_total"].inc(endpoint="me")
+    metrics_registry.share(str(tmp_path), interval=60)
+    try:
+        worker_file(tmp_path, os.getppid(), calls=2, in_flight=3)
+        rendered = metrics_registry.render()
+    finally:
+        metrics_registry.stop()
+    assert sample(rendered, 'calls_total{endpoint="me"}') == "3.0"
+    assert sample(rendered, 'calls_in_flight{endpoint="me"}') == "3.0"
+
+
+def test_exited_workers_are_folded_into_one_file(tmp_path: Path, exited_pid: int) -> None:
+    metrics_registry = registry()
+    metrics_registry.directory = str(tmp_path)
+    worker_file(tmp_path, exited_pid, calls=2, in_flight=3)
+    assert sample(metrics_registry.render(), 'calls_total{endpoint="me"}') == "2.0"
+    worker_file(tmp_path, exited_pid, calls=5, in_flight=1)  # the next worker with the same pid exited too
+    rendered = metrics_registry.render()
+    assert sample(rendered, 'calls_total{endpoint="me"}') == "7.0"
+    assert 'calls_in_flight{endpoint="me"}' not in rendered  # only held while the worker ran
+    assert sorted(os.listdir(tmp_path)) == [EXITED_FILE, "exited.lock"]
+
+
+def test_merge_which_died_after_writing_counts_once(tmp_path: Path, exited_pid: int) -> None:
+    metrics_registry = registry()
+    metrics_registry.directory = str(tmp_path)
+    worker_file(tmp_path, exited_pid, calls=2, in_flight=0)
+    metrics_registry.merge_exited()
+    # as if the merge had died before removing the file it counted
+    (tmp_path / "merging-1-1.json").write_text(json.dumps({"calls_total": [[["me"], [2]]]}))
+    exited = json.loads((tmp_path / EXITED_FILE).read_text())
+    exited["merged"] = ["merging-1-1.json"]
+    (tmp_path / EXITED_FILE).write_text(json.dumps(exited))
+    assert sample(metrics_registry.render(), 'calls_total{endpoint="me"}') == "2.0"
+    assert not (tmp_path / "merging-1-1.json").exists()
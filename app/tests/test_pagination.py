@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator
+
+import pytest
+from sqlalchemy import create_engine, orm
+from sqlalchemy.pool import StaticPool
+
+from app.infrastructure.db.database import Base
+from app.models.common.pagination import decode_cursor, encode_cursor
+from app.models.db.image_publishing_metadata import InstagramImagePublishingMetadata
+from app.repositories.instagram_image_upload_history_repository import InstagramImageUploadMetadataRepository
+
+STARTED_AT = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def repository() -> InstagramImageUploadMetadataRepository:
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[InstagramImagePublishingMetadata.__table__])
+    session_maker = orm.sessionmaker(bind=engine, autoflush=False)
+
+    @contextmanager
+    def session_factory() -> Iterator[orm.Session]:
+        with session_maker() as session:
+            yield session
+
+    with session_factory() as session:
+        for index in range(7):
+            session.add(InstagramImagePublishingMetadata(
+                id=index + 1,
+                auth_id="user" if index != 3 else "other user",
+                instagram_business_account_id="17841400000000001" if index % 2 else "17841400000000002",
+                instagram_media_container_id=f"container{index}",
+                instagram_media_published_id=f"media{index}",
+                # two publications per second, the id breaks the tie
+                created_at=STARTED_AT + timedelta(seconds=index // 2),
+            ))
+        session.commit()
+    return InstagramImageUploadMetadataRepository(session_factory)
+
+
+def test_cursor_round_trip() -> None:
+    cursor = encode_cursor(["2026-01-01T12:00:00", 42])
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ["2026-01-01T12:00:00", 42]
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor({"id": 1})[:-1], "e30"])
+def test_invalid_cursor(cursor: str) -> None:
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_seek_pages_newest_first(repository: InstagramImageUploadMetadataRepository) -> None:
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = repository.seek_page(2, cursor, sort_by=InstagramImagePublishingMetadata.created_at)
+        ids += [item.id for item in page.items]
+        pages += 1
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert ids == [7, 6, 5, 4, 3, 2, 1]
+    assert pages == 4
+
+
+def test_seek_ascending_with_exact_count(repository: InstagramImageUploadMetadataRepository) -> None:
+    query = InstagramImagePublishingMetadata.auth_id == "user"
+    first = repository.seek_page(
+        4, sort_by=InstagramImagePublishingMetadata.created_at, descending=False, query=query, count="exact"
+    )
+    assert [item.id for item in first.items] == [1, 2, 3, 5]
+    assert first.total == 6
+    second = repository.seek_page(
+        4, first.next_cursor, sort_by=InstagramImagePublishingMetadata.created_at, descending=False, query=query
+    )
+    assert [item.id for item in second.items] == [6, 7]
+    assert second.next_cursor is None
+
+
+def test_seek_rejects_a_foreign_cursor(repository: InstagramImageUploadMetadataRepository) -> None:
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        repository.seek_page(2, encode_cursor(["yesterday"]), sort_by=InstagramImagePublishingMetadata.created_at)
+
+
+@pytest.mark.asyncio
+async def test_history_of_one_business_account(repository: InstagramImageUploadMetadataRepository) -> None:
+    page = await repository.history_async("user", 1, None, "17841400000000001")
+    assert [item.id for item in page.items] == [6]
+    following = await repository.history_async("user", 1, page.next_cursor, "17841400000000001")
+    assert [item.id for item in following.items] == [2]
+    assert following.next_cursor is None
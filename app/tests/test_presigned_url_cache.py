@@ -0,0 +1,67 @@
+from typing import List
+
+import pytest
+
+from app.infrastructure.aws.presigned_url_cache import PresignedUrlCache
+from app.infrastructure.aws.s3 import S3Service
+from benchmarks.fake_s3 import InMemoryS3
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingS3(InMemoryS3):
+    def __init__(self) -> None:
+        super().__init__()
+        self.signed: List[str] = []
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        self.signed.append(Params["Key"])
+        return f"{super().generate_presigned_url(ClientMethod, Params, ExpiresIn)}&n={len(self.signed)}"
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def s3_client() -> CountingS3:
+    return CountingS3()
+
+
+@pytest.fixture
+def s3(s3_client: CountingS3, clock: FakeClock) -> S3Service:
+    return S3Service(s3_client, PresignedUrlCache(max_size=10, expiration=3600, min_remaining=600, clock=clock))
+
+
+def test_only_the_misses_are_signed_in_order(s3, s3_client) -> None:
+    first = s3.create_pre_signed_urls("bucket", ["a", "b"])
+    urls = s3.create_pre_signed_urls("bucket", ["c", "a", "c", "b"])
+    assert urls[1] == first[0] and urls[3] == first[1]
+    assert urls[0] == urls[2]
+    assert s3_client.signed == ["a", "b", "c"]
+
+
+def test_url_is_signed_again_once_too_little_validity_is_left(s3, s3_client, clock) -> None:
+    url = s3.create_pre_signed_url("bucket", "a")
+    clock.now += 3600 - 600 - 1
+    assert s3.create_pre_signed_url("bucket", "a") == url
+    clock.now += 1
+    assert s3.create_pre_signed_url("bucket", "a") != url
+    assert s3_client.signed == ["a", "a"]
+
+
+def test_buckets_do_not_share_urls(s3, s3_client) -> None:
+    assert s3.create_pre_signed_url("bucket", "a") != s3.create_pre_signed_url("other", "a")
+
+
+def test_other_expiration_is_not_cached(s3, s3_client) -> None:
+    s3.create_pre_signed_url("bucket", "a", expiration=60)
+    s3.create_pre_signed_url("bucket", "a", expiration=60)
+    assert s3_client.signed == ["a", "a"]
@@ -0,0 +1,222 @@
+from datetime import datetime, timezone
+from typing import Any, List
+
+import pytest
+import pytest_asyncio
+from cryptography.fernet import Fernet
+
+from app.infrastructure.meta.instagram_platform.graph_api import InstagramGraphApiClient
+from app.infrastructure.token_cipher import ENCRYPTED_PREFIX, TokenCipher
+from app.models.db.instagram_publish_job import InstagramPublishJob, PublishJobStatus
+from app.models.schemas.instagram import PostImageToInstagramBusinessAccountInput
+from app.services.instagram_media_publish_job_service import MediaPublishJobService
+
+TOKEN = "EAAG-user-token"
+
+
+class FakeGraphApiClient:
+    """Answers every call with the next payload queued for it"""
+
+    def __init__(self) -> None:
+        self.answers: dict[str, List[Any]] = {"create": [], "status": [], "publish": [], "recent": []}
+        self.tokens: List[str] = []
+
+    async def answer(self, call: str, token: str) -> dict:
+        self.tokens.append(token)
+        payload = self.answers[call].pop(0)
+        if isinstance(payload, Exception):
+            raise payload
+        return {"url": call, "json_data": payload}
+
+    async def create_image_container_async(self, token, instagram_business_account_id, image_url, caption):
+        return await self.answer("create", token)
+
+    async def get_container_status_async(self, token, container_id):
+        return await self.answer("status", token)
+
+    async def publish_image_async(self, token, instagram_business_account_id, container_id):
+        return await self.answer("publish", token)
+
+    async def get_recent_medias_async(self, token, instagram_business_account_id, limit):
+        return await self.answer("recent", token)
+
+    media_timestamp = staticmethod(InstagramGraphApiClient.media_timestamp)
+
+
+class FakePublishJobRepository:
+    def __init__(self) -> None:
+        self.saved: List[str] = []  # status of the job at every save
+
+    def add(self, job: InstagramPublishJob) -> InstagramPublishJob:
+        return job
+
+    def save(self, job: InstagramPublishJob) -> InstagramPublishJob:
+        self.saved.append(job.status)
+        return job
+
+
+class FakeMetadataRepository:
+    def __init__(self, saved: List[str]) -> None:
+        self.rows: List[Any] = []
+        self.saved = saved
+
+    async def add_async(self, row: Any) -> Any:
+        self.saved.append("metadata")
+        self.rows.append(row)
+        return row
+
+
+@pytest.fixture
+def graph() -> FakeGraphApiClient:
+    return FakeGraphApiClient()
+
+
+@pytest.fixture
+def jobs() -> FakePublishJobRepository:
+    return FakePublishJobRepository()
+
+
+@pytest.fixture
+def metadata(jobs: FakePublishJobRepository) -> FakeMetadataRepository:
+    return FakeMetadataRepository(jobs.saved)
+
+
+@pytest.fixture
+def service(
+        graph: FakeGraphApiClient, jobs: FakePublishJobRepository, metadata: FakeMetadataRepository
+) -> MediaPublishJobService:
+    return MediaPublishJobService(
+        instagram_graph_api_client=graph,
+        publish_job_repository=jobs,
+        image_upload_metadata_repository=metadata,
+        initial_poll_delay=2,
+        max_poll_delay=60,
+        poll_backoff_factor=1.5,
+        max_polls=3,
+        lease=120,
+        token_cipher=TokenCipher(Fernet.generate_key().decode()),
+        call_deadline=50,
+    )
+
+
+@pytest_asyncio.fixture
+async def job(service: MediaPublishJobService) -> InstagramPublishJob:
+    input_params = PostImageToInstagramBusinessAccountInput(
+        instagram_business_account_id="17841400000000001",
+        image_url="https://bucket.s3.amazonaws.com/image.jpg",
+        caption="caption",
+    )
+    return await service.submit(input_params, TOKEN, auth_id="user")
+
+
+def error(code: int, **fields: Any) -> dict:
+    return {"error": {"message": "error", "type": "OAuthException", "code": code, **fields}}
+
+
+@pytest.mark.asyncio
+async def test_submit_stores_the_token_encrypted(job: InstagramPublishJob) -> None:
+    assert job.status == PublishJobStatus.PENDING.value
+    assert job.access_token.startswith(ENCRYPTED_PREFIX) and TOKEN not in job.access_token
+
+
+@pytest.mark.asyncio
+async def test_pending_job_creates_its_container(service, graph, job) -> None:
+    graph.answers["create"].append({"id": "container"})
+    await service.run(job)
+    assert job.status == PublishJobStatus.IN_PROGRESS.value
+    assert job.instagram_media_container_id == "container"
+    assert job.attempts == 0 and job.next_run_at > datetime.now(timezone.utc)
+    assert graph.tokens == [TOKEN]
+
+
+@pytest.mark.asyncio
+async def test_job_in_progress_polls_until_published(service, graph, jobs, job) -> None:
+    graph.answers["create"].append({"id": "container"})
+    graph.answers["status"] += [{"status_code": "IN_PROGRESS"}, {"status_code": "FINISHED"}]
+    graph.answers["publish"].append({"id": "media"})
+    for _ in range(3):
+        await service.run(job)
+    assert job.status == PublishJobStatus.PUBLISHED.value
+    assert job.instagram_media_published_id == "media"
+    assert job.access_token is None and job.error is None
+    # the published id is saved before the metadata, a retry could not find it again
+    assert jobs.saved[-3:] == [PublishJobStatus.PUBLISHED.value, "metadata", PublishJobStatus.PUBLISHED.value]
+
+
+@pytest.mark.asyncio
+async def test_polling_a_container_in_progress_is_not_an_error(service, graph, job) -> None:
+    job.instagram_media_container_id = "container"
+    job.status = PublishJobStatus.IN_PROGRESS.value
+    job.error = "an error of a previous attempt"
+    graph.answers["status"].append({"status_code": "IN_PROGRESS"})
+    await service.run(job)
+    assert job.status == PublishJobStatus.IN_PROGRESS.value
+    assert job.attempts == 1 and job.error is None
+
+
+@pytest.mark.asyncio
+async def test_container_published_by_a_run_which_died(service, graph, metadata, job) -> None:
+    job.instagram_media_container_id = "container"
+    job.status = PublishJobStatus.IN_PROGRESS.value
+    job.created_at = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    graph.answers["status"].append({"status_code": "PUBLISHED"})
+    graph.answers["recent"].append({"data": [
+        {"id": "later media", "caption": "caption", "timestamp": "2026-01-01T12:30:00+0000"},
+        {"id": "other caption", "caption": "other", "timestamp": "2026-01-01T12:20:00+0000"},
+        {"id": "media", "caption": "caption", "timestamp": "2026-01-01T12:10:00+0000"},
+        {"id": "older media", "caption": "caption", "timestamp": "2025-12-31T12:00:00+0000"},
+    ]})
+    await service.run(job)
+    assert job.status == PublishJobStatus.PUBLISHED.value
+    assert job.instagram_media_published_id == "media"
+    assert [row.instagram_media_published_id for row in metadata.rows] == ["media"]
+    assert metadata.rows[0].instagram_media_container_id == "container"
+    assert metadata.rows[0].created_at.tzinfo is not None
+
+
+@pytest.mark.asyncio
+async def test_published_container_waits_for_its_media_to_be_listed(service, graph, metadata, job) -> None:
+    job.instagram_media_container_id = "container"
+    job.status = PublishJobStatus.IN_PROGRESS.value
+    graph.answers["status"].append({"status_code": "PUBLISHED"})
+    graph.answers["recent"].append({"data": [{"id": "other", "caption": "other caption"}]})
+    await service.run(job)
+    assert job.status == PublishJobStatus.IN_PROGRESS.value
+    assert job.attempts == 1 and job.error is None
+    assert metadata.rows == []
+
+
+@pytest.mark.asyncio
+async def test_expired_container_fails_the_job(service, graph, job) -> None:
+    job.instagram_media_container_id = "container"
+    graph.answers["status"].append({"status_code": "EXPIRED"})
+    await service.run(job)
+    assert job.status == PublishJobStatus.FAILED.value
+    assert job.access_token is None
+
+
+@pytest.mark.asyncio
+async def test_graph_error_fails_the_job(service, graph, job) -> None:
+    graph.answers["create"].append(error(100))
+    await service.run(job)
+    assert job.status == PublishJobStatus.FAILED.value
+    assert "100" in job.error
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("payload", [error(4), error(80002), error(2), error(1, is_transient=True)])
+async def test_throttling_and_transient_errors_retry(service, graph, job, payload) -> None:
+    graph.answers["create"].append(payload)
+    await service.run(job)
+    assert job.status == PublishJobStatus.PENDING.value
+    assert job.attempts == 1 and job.error
+    assert job.access_token is not None
+
+
+@pytest.mark.asyncio
+async def test_retries_give_up_after_max_polls(service, graph, job) -> None:
+    graph.answers["create"] += [error(2), RuntimeError("connection reset"), error(4)]
+    for _ in range(3):
+        await service.run(job)
+    assert job.status == PublishJobStatus.FAILED.value
+    assert job.error.startswith("Gave up after 3 attempts")
@@ -0,0 +1,148 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.services.publishing_metadata_write_behind import PublishingMetadataWriteBehind
+
+
+class FakeMetadataRepository:
+    """Inserts the rows of `add_many` unless the DB is down or a row is `rejected`"""
+
+    def __init__(self) -> None:
+        self.rows: List[Dict[str, Any]] = []
+        self.down = False
+        self.rejected: set = set()
+        self.calls = 0
+
+    def add_many(self, rows: List[Dict[str, Any]]) -> int:
+        self.calls += 1
+        if self.down:
+            raise OperationalError("INSERT", {}, Exception("connection refused"))
+        if any(row["instagram_media_container_id"] in self.rejected for row in rows):
+            raise IntegrityError("INSERT", {}, Exception("null value"))
+        self.rows.extend(rows)
+        return len(rows)
+
+
+def row(container_id: str) -> Dict[str, Any]:
+    return {
+        "instagram_business_account_id": "business",
+        "auth_id": "user",
+        "instagram_media_container_id": container_id,
+        "instagram_media_published_id": f"media-{container_id}",
+        "created_at": "2026-01-01T12:00:00+00:00",
+    }
+
+
+def ids(rows: List[Dict[str, Any]]) -> List[str]:
+    return [row["instagram_media_container_id"] for row in rows]
+
+
+@pytest.fixture
+def repository() -> FakeMetadataRepository:
+    return FakeMetadataRepository()
+
+
+@pytest.fixture
+def spill_path(tmp_path: Path) -> Path:
+    return tmp_path / "var" / "spill.jsonl"
+
+
+@pytest.fixture
+def write_behind(repository: FakeMetadataRepository, spill_path: Path) -> PublishingMetadataWriteBehind:
+    return PublishingMetadataWriteBehind(repository, max_size=100, batch_size=2, linger=0.01, spill_path=str(spill_path))
+
+
+@pytest.mark.asyncio
+async def test_rows_are_inserted_in_batches_and_drained_on_stop(write_behind, repository) -> None:
+    write_behind.start()
+    for container_id in "abcde":
+        assert await write_behind.put(row(container_id)) is True
+    await write_behind.stop()
+    assert ids(repository.rows) == list("abcde")
+    assert repository.rows[0]["created_at"].tzinfo is not None
+    assert await write_behind.put(row("f")) is False
+
+
+@pytest.mark.asyncio
+async def test_rejected_batch_is_inserted_row_by_row(write_behind, repository) -> None:
+    repository.rejected = {"b"}
+    assert await write_behind.insert([row("a"), row("b"), row("c")]) is True
+    assert ids(repository.rows) == ["a", "c"]
+
+
+@pytest.mark.asyncio
+async def test_rows_are_spilled_while_the_db_is_down_then_replayed(write_behind, repository, spill_path) -> None:
+    repository.down = True
+    await write_behind.flush([row("a"), row("b")])
+    await write_behind.flush([row("c")])
+    assert ids(repository.rows) == []
+    repository.down = False
+    await write_behind.flush([row("d")])
+    assert ids(repository.rows) == ["d", "a", "b", "c"]
+    assert not spill_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_replay_stopping_halfway_keeps_every_spilled_row(write_behind, repository, spill_path) -> None:
+    write_behind.spill([row("a"), row("b"), row("c")])
+    add_many = repository.add_many
+
+    def down_after_the_first_batch(rows: List[Dict[str, Any]]) -> int:
+        repository.down = repository.calls >= 1
+        return add_many(rows)
+
+    repository.add_many = down_after_the_first_batch
+    await write_behind.replay_spill()
+    assert ids(repository.rows) == ["a", "b"]
+    assert ids(json.loads(line) for line in spill_path.read_text().splitlines()) == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_rows_spilled_during_a_replay_are_kept(write_behind, repository, spill_path) -> None:
+    write_behind.spill([row("a")])
+    add_many = repository.add_many
+
+    def another_worker_spills(rows: List[Dict[str, Any]]) -> int:
+        write_behind.spill([row("z")])
+        repository.add_many = add_many
+        return add_many(rows)
+
+    repository.add_many = another_worker_spills
+    await write_behind.replay_spill()
+    assert ids(repository.rows) == ["a"]
+    assert ids(json.loads(line) for line in spill_path.read_text().splitlines()) == ["z"]
+
+
+@pytest.mark.asyncio
+async def test_corrupt_line_is_skipped(write_behind, repository, spill_path) -> None:
+    write_behind.spill([row("a")])
+    with spill_path.open("a") as spill_file:
+        spill_file.write('{"instagram_media_cont\n')
+    write_behind.spill([row("b")])
+    await write_behind.replay_spill()
+    assert ids(repository.rows) == ["a", "b"]
+    assert not spill_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_only_one_process_replays_at_a_time(write_behind, repository, spill_path) -> None:
+    write_behind.spill([row("a")])
+    other_process = PublishingMetadataWriteBehind(repository, 100, 2, 0.01, str(spill_path))
+    with other_process.locked(other_process.replay_lock_path):
+        await write_behind.replay_spill()
+    assert ids(repository.rows) == []
+    await write_behind.replay_spill()
+    assert ids(repository.rows) == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_failed_replay_does_not_stop_the_buffer(write_behind, repository, spill_path) -> None:
+    spill_path.mkdir(parents=True)  # cannot be read as a file
+    write_behind.start()
+    assert await write_behind.put(row("a")) is True
+    await write_behind.stop()
+    assert ids(repository.rows) == ["a"]
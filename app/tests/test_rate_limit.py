@@ -0,0 +1,135 @@
+import json
+
+import pytest
+
+from app.infrastructure.meta.instagram_platform.rate_limit import (
+    APP_USAGE_HEADER,
+    BUSINESS_USAGE_HEADER,
+    GraphApiRateLimitedError,
+    GraphApiRateLimiter,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def limiter(clock: FakeClock) -> GraphApiRateLimiter:
+    return GraphApiRateLimiter(
+        max_rate=10,
+        burst=5,
+        min_rate=1,
+        soft_limit=50,
+        hard_limit=90,
+        throttle_cooldown=60,
+        max_wait=30,
+        max_businesses=2,
+        clock=clock,
+    )
+
+
+def throttled(code: int) -> dict:
+    return {"error": {"message": "throttled", "type": "OAuthException", "code": code}}
+
+
+def test_burst_then_max_rate(limiter: GraphApiRateLimiter) -> None:
+    assert [limiter.reserve() for _ in range(5)] == [0.0] * 5
+    assert limiter.reserve() == pytest.approx(0.1)
+
+
+def test_tokens_come_back_with_time(limiter: GraphApiRateLimiter, clock: FakeClock) -> None:
+    for _ in range(5):
+        limiter.reserve()
+    clock.now += 0.5
+    assert [limiter.reserve() for _ in range(5)] == [0.0] * 5
+
+
+def test_rate_decreases_between_soft_and_hard_limit(limiter: GraphApiRateLimiter) -> None:
+    limiter.update({APP_USAGE_HEADER: json.dumps({"call_count": 70, "total_time": 10, "total_cputime": 10})})
+    assert limiter.rate_for(limiter.app_budget) == pytest.approx(5)
+    limiter.update({APP_USAGE_HEADER: json.dumps({"call_count": 95})})
+    assert limiter.rate_for(limiter.app_budget) == 1
+
+
+def test_batch_costs_its_sub_requests(limiter: GraphApiRateLimiter) -> None:
+    assert limiter.reserve(cost=5) == 0.0
+    assert limiter.reserve(cost=5) == pytest.approx(0.5)
+
+
+def test_rejected_reservation_is_refunded(limiter: GraphApiRateLimiter) -> None:
+    with pytest.raises(GraphApiRateLimitedError):
+        limiter.reserve(cost=400)
+    assert limiter.reserve(cost=5) == 0.0
+
+
+@pytest.mark.parametrize("code", [4, 17])
+def test_app_throttling_holds_every_call(limiter: GraphApiRateLimiter, clock: FakeClock, code: int) -> None:
+    limiter.update({}, throttled(code), business_id="17841400000000001")
+    with pytest.raises(GraphApiRateLimitedError) as raised:
+        limiter.reserve("17841400000000002")
+    assert raised.value.retry_after == pytest.approx(60)
+    clock.now += 61
+    assert limiter.reserve("17841400000000002") == 0.0
+
+
+def test_business_throttling_holds_that_business_only(limiter: GraphApiRateLimiter) -> None:
+    usage = {"17841400000000001": [{"type": "instagram", "call_count": 100, "estimated_time_to_regain_access": 5}]}
+    limiter.update({BUSINESS_USAGE_HEADER: json.dumps(usage)}, throttled(80002), business_id="17841400000000001")
+    with pytest.raises(GraphApiRateLimitedError) as raised:
+        limiter.reserve("17841400000000001")
+    assert raised.value.retry_after == pytest.approx(300)
+    assert limiter.reserve("17841400000000002") == 0.0
+    assert limiter.reserve() == 0.0
+
+
+def test_business_throttling_without_header_uses_the_cooldown(limiter: GraphApiRateLimiter, clock: FakeClock) -> None:
+    limiter.update({}, throttled(613), business_id="17841400000000001")
+    with pytest.raises(GraphApiRateLimitedError):
+        limiter.reserve("17841400000000001")
+    clock.now += 35
+    assert limiter.reserve("17841400000000001") == pytest.approx(25)
+    assert limiter.reserve("17841400000000002") == 0.0
+
+
+def test_other_errors_do_not_throttle(limiter: GraphApiRateLimiter) -> None:
+    limiter.update({}, throttled(190), business_id="17841400000000001")
+    assert limiter.reserve("17841400000000001") == 0.0
+    assert limiter.snapshot()["business"] == {}
+
+
+def usage(*business_ids: str) -> dict:
+    return {BUSINESS_USAGE_HEADER: json.dumps({
+        business_id: [{"type": "instagram", "call_count": 10}] for business_id in business_ids
+    })}
+
+
+def test_least_recently_reported_business_is_forgotten(limiter: GraphApiRateLimiter) -> None:
+    limiter.update(usage("1", "2"))
+    limiter.update(usage("1"))
+    limiter.update(usage("3"))
+    assert sorted(limiter.snapshot()["business"]) == ["1", "3"]
+
+
+def test_business_is_forgotten_after_the_usage_window(limiter: GraphApiRateLimiter, clock: FakeClock) -> None:
+    limiter.update(usage("1"))
+    clock.now += 3601
+    assert limiter.snapshot()["business"] == {}
+
+
+def test_held_business_is_kept_while_it_is_held(limiter: GraphApiRateLimiter, clock: FakeClock) -> None:
+    regain = {"1": [{"type": "instagram", "call_count": 100, "estimated_time_to_regain_access": 90}]}
+    limiter.update({BUSINESS_USAGE_HEADER: json.dumps(regain)}, throttled(80002))
+    clock.now += 3601
+    assert list(limiter.snapshot()["business"]) == ["1"]
+    with pytest.raises(GraphApiRateLimitedError):
+        limiter.reserve("1")
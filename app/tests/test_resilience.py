@@ -0,0 +1,187 @@
+from typing import Any, List
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.infrastructure.meta.instagram_platform.graph_api import GraphApiRequest, InstagramGraphApiClient
+from app.infrastructure.meta.instagram_platform.resilience import (
+    CircuitBreaker,
+    GraphApiResilience,
+    GraphApiUnavailableError,
+    RetryPolicy,
+    deadline,
+    remaining_time,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def response(status_code: int, **error: Any) -> httpx.Response:
+    return httpx.Response(status_code, json={"error": error} if error else {"id": "1"})
+
+
+@pytest.mark.parametrize(("outcome", "retryable"), [
+    (httpx.ReadTimeout("read"), True),
+    (httpx.ConnectError("refused"), True),
+    (response(500), True),
+    (response(400, code=2), True),
+    (response(400, code=100, is_transient=True), True),
+    (response(400, code=100), False),
+    (response(200), False),
+])
+def test_idempotent_calls_retry_on_failures(outcome: Any, retryable: bool) -> None:
+    assert RetryPolicy.is_retryable(outcome) is retryable
+
+
+@pytest.mark.parametrize(("outcome", "retryable"), [
+    (httpx.ConnectError("refused"), True),
+    (httpx.ConnectTimeout("connect"), True),
+    (httpx.PoolTimeout("pool"), True),
+    (httpx.ReadTimeout("read"), False),
+    (httpx.RemoteProtocolError("closed"), False),
+    (response(500), False),
+    (response(400, code=2), False),
+    (response(500, code=1, is_transient=True), True),
+])
+def test_other_calls_retry_only_when_not_carried_out(outcome: Any, retryable: bool) -> None:
+    assert RetryPolicy.is_retryable(outcome, idempotent=False) is retryable
+
+
+def test_backoff_is_capped() -> None:
+    policy = RetryPolicy(max_attempts=10, base_delay=0.2, max_delay=1)
+    assert all(0 <= policy.delay(attempt) <= 1 for attempt in range(1, 10) for _ in range(20))
+
+
+def test_circuit_opens_after_consecutive_failures() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30, clock=clock)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow() is None
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() == pytest.approx(30)
+
+
+def test_half_open_circuit_lets_one_probe_through() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow() is None
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() == 30  # the others fail fast while the probe is out
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 31
+    assert breaker.allow() is None
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_nested_deadline_only_shrinks() -> None:
+    assert remaining_time() is None
+    with deadline(10):
+        with deadline(60):
+            assert remaining_time() <= 10
+        with deadline(1):
+            assert remaining_time() <= 1
+    assert remaining_time() is None
+
+
+def test_endpoint_name_hides_ids() -> None:
+    assert GraphApiResilience.endpoint_name("GET", "17841400000000001/insights") == "GET {id}/insights"
+    assert GraphApiResilience.endpoint_name("POST", "/17841400000000001/media_publish") == "POST {id}/media_publish"
+
+
+class Transport:
+    """Answers every attempt with the next outcome, an exception is raised as the transport failure"""
+
+    def __init__(self, *outcomes: Any) -> None:
+        self.outcomes: List[Any] = list(outcomes)
+        self.attempts = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.attempts += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def graph_client(transport: Transport) -> InstagramGraphApiClient:
+    return InstagramGraphApiClient(
+        environment="test",
+        http_client=httpx.Client(transport=httpx.MockTransport(transport)),
+        async_http_client=httpx.AsyncClient(transport=httpx.MockTransport(transport)),
+        resilience=GraphApiResilience(RetryPolicy(max_attempts=3, base_delay=0, max_delay=0), 5, 30),
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_is_retried_after_a_read_timeout() -> None:
+    transport = Transport(httpx.ReadTimeout("read"), response(502), response(200))
+    client = graph_client(transport)
+    result = await client.get_container_status_async("token", "17841400000000009")
+    assert result["json_data"] == {"id": "1"}
+    assert transport.attempts == 3
+
+
+@pytest.mark.asyncio
+async def test_publish_is_not_sent_again_after_a_read_timeout() -> None:
+    transport = Transport(httpx.ReadTimeout("read"), response(200))
+    client = graph_client(transport)
+    with pytest.raises(HTTPException) as raised:
+        await client.publish_image_async("token", "17841400000000001", "17841400000000009")
+    assert raised.value.status_code == 503
+    assert transport.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_container_creation_is_sent_again_when_it_could_not_connect() -> None:
+    transport = Transport(httpx.ConnectError("refused"), response(200))
+    client = graph_client(transport)
+    result = await client.create_image_container_async("token", "17841400000000001", "https://image", None)
+    assert result["json_data"] == {"id": "1"}
+    assert transport.attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_5xx_of_a_publish_goes_back_to_the_caller() -> None:
+    transport = Transport(response(500, code=1, message="An unknown error occurred"), response(200))
+    client = graph_client(transport)
+    result = await client.publish_image_async("token", "17841400000000001", "17841400000000009")
+    assert result["json_data"]["error"]["code"] == 1
+    assert transport.attempts == 1
+
+
+def test_batch_of_gets_is_idempotent() -> None:
+    assert GraphApiRequest("GET", "https://graph.facebook.com/v18.0/1").idempotent is True
+    assert GraphApiRequest("POST", "https://graph.facebook.com/v18.0/1/media").idempotent is False
+
+
+def test_open_circuit_fails_fast() -> None:
+    transport = Transport(*[response(503)] * 6)
+    client = graph_client(transport)
+    client.resilience.failure_threshold = 2
+    with pytest.raises(HTTPException):
+        client.get_container_status("token", "17841400000000009")
+    with pytest.raises(HTTPException) as raised:
+        client.get_container_status("token", "17841400000000008")
+    assert raised.value.status_code == 503 and "Retry-After" in raised.value.headers
+    assert transport.attempts == 2
+
+
+def test_retries_stop_at_the_deadline() -> None:
+    resilience = GraphApiResilience(RetryPolicy(max_attempts=5, base_delay=10, max_delay=10), 5, 30)
+    with deadline(0.5), pytest.raises(GraphApiUnavailableError):
+        for attempt in range(1, 6):
+            resilience.after_attempt("GET me", response(503), attempt)
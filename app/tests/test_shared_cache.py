@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+from typing import Iterator
+
+import pytest
+
+from app.infrastructure.cache.backends import CacheBackend, InProcessCacheBackend, SQLiteCacheBackend
+from app.infrastructure.cache.redis_backend import RedisCacheBackend
+from app.infrastructure.cache.shared_cache import SharedCache
+from benchmarks.fake_redis import FakeRedis
+
+
+@pytest.fixture(scope="module")
+def redis_url() -> Iterator[str]:
+    """benchmarks/fake_redis served from a thread of its own"""
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(FakeRedis().serve, "127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{server.sockets[0].getsockname()[1]}/0"
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request: pytest.FixtureRequest, tmp_path) -> Iterator[CacheBackend]:
+    if request.param == "memory":
+        backend = InProcessCacheBackend(max_size=100)
+    elif request.param == "sqlite":
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_size=100)
+    else:
+        backend = RedisCacheBackend(request.getfixturevalue("redis_url"))
+        backend.command("FLUSHDB")  # the server outlives every test of the module
+    yield backend
+    backend.close()
+
+
+def shared(backend: CacheBackend) -> SharedCache:
+    return SharedCache(backend, {"default": 60}, key_prefix="test", lock_timeout=1, ttl_jitter=0)
+
+
+class FailingBackend(CacheBackend):
+    name = "failing"
+
+    def get(self, key):
+        raise ConnectionError("down")
+
+    set = add = delete = get
+
+
+def test_set_get_delete(backend: CacheBackend) -> None:
+    assert backend.get("key") is None
+    backend.set("key", b"value", 60)
+    assert backend.get("key") == b"value"
+    assert backend.delete("key") is True
+    assert backend.get("key") is None
+    assert backend.delete("key") is False
+
+
+def test_add_only_sets_a_missing_key(backend: CacheBackend) -> None:
+    assert backend.add("lock", b"1", 60) is True
+    assert backend.add("lock", b"2", 60) is False
+    assert backend.get("lock") == b"1"
+
+
+def test_entries_expire(backend: CacheBackend) -> None:
+    backend.set("key", b"value", 0.05)
+    backend.add("lock", b"1", 0.05)
+    time.sleep(0.1)
+    assert backend.get("key") is None
+    assert backend.add("lock", b"2", 60) is True
+
+
+def test_sqlite_is_shared_by_every_backend_on_the_file(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite3")
+    first, second = SQLiteCacheBackend(path, max_size=100), SQLiteCacheBackend(path, max_size=100)
+    first.set("key", b"value", 60)
+    assert second.get("key") == b"value"
+    assert second.add("key", b"other", 60) is False
+
+
+def test_sqlite_keeps_max_size_rows(tmp_path) -> None:
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_size=3, purge_every=5)
+    for index in range(5):
+        backend.set(f"key{index}", b"value", 60 + index)
+    assert backend.stats()["size"] == 3
+    assert backend.get("key0") is None and backend.get("key4") == b"value"
+
+
+@pytest.mark.asyncio
+async def test_namespace_round_trip(backend: CacheBackend) -> None:
+    tokens = shared(backend).namespace("tokens")
+    await tokens.set_async("abc", {"user": {"id": "1"}})
+    assert await tokens.get_async("abc") == {"user": {"id": "1"}}
+    assert tokens.key("abc") == "test:tokens:abc"
+    assert await tokens.delete_async("abc") is True
+    assert await tokens.get_async("abc") is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once(backend: CacheBackend) -> None:
+    accounts = shared(backend).namespace("accounts")
+    loads = 0
+
+    async def load() -> dict:
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.05)
+        return {"pages": ["1"]}
+
+    results = await asyncio.gather(*[accounts.get_or_load_async("user", load) for _ in range(5)])
+    assert results == [{"pages": ["1"]}] * 5
+    assert loads == 1
+    assert await accounts.get_or_load_async("user", load) == {"pages": ["1"]}
+    assert loads == 1
+
+
+@pytest.mark.asyncio
+async def test_workers_wait_for_the_value_another_one_loads(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite3")
+    first = shared(SQLiteCacheBackend(path, max_size=100)).namespace("accounts")
+    second = shared(SQLiteCacheBackend(path, max_size=100)).namespace("accounts")
+    loads = []
+
+    async def load(worker: str) -> str:
+        loads.append(worker)
+        await asyncio.sleep(0.2)
+        return worker
+
+    results = await asyncio.gather(
+        first.get_or_load_async("user", lambda: load("first")),
+        second.get_or_load_async("user", lambda: load("second")),
+    )
+    assert len(loads) == 1
+    assert results == loads * 2
+
+
+@pytest.mark.asyncio
+async def test_failed_load_caches_nothing(backend: CacheBackend) -> None:
+    accounts = shared(backend).namespace("accounts")
+
+    async def failing() -> dict:
+        raise RuntimeError("Graph is down")
+
+    async def load() -> dict:
+        return {"pages": []}
+
+    with pytest.raises(RuntimeError):
+        await accounts.get_or_load_async("user", failing)
+    assert await accounts.get_or_load_async("user", load) == {"pages": []}
+
+
+@pytest.mark.asyncio
+async def test_failing_backend_reads_as_a_miss() -> None:
+    cache = shared(FailingBackend())
+    tokens = cache.namespace("tokens")
+
+    async def load() -> str:
+        return "loaded"
+
+    assert await tokens.get_async("abc") is None
+    assert await tokens.get_or_load_async("abc", load) == "loaded"
+    assert await tokens.claim_async("abc", 10) is True
+
+
+def test_redis_url_scheme_is_checked() -> None:
+    with pytest.raises(ValueError):
+        RedisCacheBackend("http://127.0.0.1:6379/0")
+
+
+def test_rediss_never_falls_back_to_plaintext(redis_url: str) -> None:
+    backend = RedisCacheBackend(redis_url.replace("redis://", "rediss://"), timeout=0.5)
+    with pytest.raises(OSError):  # the TLS handshake fails against a plaintext server
+        backend.get("key")
+    assert backend.stats()["tls"] is True
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from app.infrastructure.meta.instagram_platform.single_flight import SingleFlight
+
+
+class CountingCall:
+    def __init__(self, result: str = "answer", error: Exception = None) -> None:
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one() -> None:
+    single_flight = SingleFlight()
+    call = CountingCall()
+    callers = [asyncio.ensure_future(single_flight.do("key", call, "me")) for _ in range(3)]
+    await asyncio.sleep(0)
+    call.release.set()
+    assert await asyncio.gather(*callers) == ["answer"] * 3
+    assert call.calls == 1
+    assert single_flight._calls == {} and single_flight._waiters == {}
+
+
+@pytest.mark.asyncio
+async def test_other_keys_do_not_share() -> None:
+    single_flight = SingleFlight()
+    call = CountingCall()
+    call.release.set()
+    await asyncio.gather(single_flight.do("a", call), single_flight.do("b", call))
+    assert call.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_error_reaches_every_caller_and_is_not_kept() -> None:
+    single_flight = SingleFlight()
+    call = CountingCall(error=RuntimeError("Graph is down"))
+    callers = [asyncio.ensure_future(single_flight.do("key", call)) for _ in range(2)]
+    await asyncio.sleep(0)
+    call.release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    call.error = None
+    assert await single_flight.do("key", call) == "answer"
+    assert call.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_others() -> None:
+    single_flight = SingleFlight()
+    call = CountingCall()
+    first = asyncio.ensure_future(single_flight.do("key", call))
+    second = asyncio.ensure_future(single_flight.do("key", call))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    call.release.set()
+    assert await second == "answer"
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_disabled_calls_every_time() -> None:
+    single_flight = SingleFlight(enabled=False)
+    call = CountingCall()
+    call.release.set()
+    await asyncio.gather(single_flight.do("key", call), single_flight.do("key", call))
+    assert call.calls == 2
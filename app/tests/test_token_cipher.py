@@ -0,0 +1,43 @@
+import pytest
+from cryptography.fernet import Fernet
+
+from app.infrastructure.token_cipher import ENCRYPTED_PREFIX, TokenCipher, TokenCipherError
+
+
+def test_round_trip() -> None:
+    cipher = TokenCipher(Fernet.generate_key().decode())
+    encrypted = cipher.encrypt("EAAG-user-token")
+    assert encrypted.startswith(ENCRYPTED_PREFIX) and "EAAG" not in encrypted
+    assert cipher.decrypt(encrypted) == "EAAG-user-token"
+    assert cipher.encrypt(None) is None and cipher.decrypt(None) is None
+
+
+def test_value_stored_before_encryption_is_read_as_is() -> None:
+    assert TokenCipher(Fernet.generate_key().decode()).decrypt("EAAG-user-token") == "EAAG-user-token"
+
+
+def test_rotated_key_still_decrypts() -> None:
+    old, new = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+    encrypted = TokenCipher(old).encrypt("token")
+    rotated = TokenCipher(f"{new}, {old}")
+    assert rotated.decrypt(encrypted) == "token"
+    assert TokenCipher(new).decrypt(rotated.encrypt("token")) == "token"
+    with pytest.raises(TokenCipherError, match="cannot be decrypted"):
+        TokenCipher(new).decrypt(encrypted)
+
+
+@pytest.mark.parametrize("keys", [None, "", " , "])
+def test_missing_key_is_rejected(keys) -> None:
+    with pytest.raises(TokenCipherError, match="set OTHER_TOKEN_KEY"):
+        TokenCipher(keys, setting="OTHER_TOKEN_KEY")
+
+
+@pytest.mark.parametrize("keys", [
+    "<PUBLISH_JOBS_TOKEN_KEY>",
+    "a passphrase",
+    Fernet.generate_key().decode()[:-4],
+    f"{Fernet.generate_key().decode()},<PUBLISH_JOBS_TOKEN_KEY>",
+])
+def test_value_which_is_not_a_fernet_key_is_rejected(keys: str) -> None:
+    with pytest.raises(TokenCipherError, match="PUBLISH_JOBS_TOKEN_KEY holds a value which is not a Fernet key"):
+        TokenCipher(keys)
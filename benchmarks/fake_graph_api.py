@@ -0,0 +1,192 @@
+"""
+Local stand-in of the Graph API endpoints called by the app, to benchmark it offline:
+
+    uvicorn benchmarks.fake_graph_api:app --port 8900
+
+Behaviour is set through the environment:
+- FAKE_GRAPH_LATENCY / FAKE_GRAPH_LATENCY_JITTER: seconds every answer is delayed by, ± a uniform jitter
+- FAKE_GRAPH_ERROR_RATE: share of calls answered with a transient 500 error
+- FAKE_GRAPH_CALL_BUDGET: calls per FAKE_GRAPH_USAGE_WINDOW seconds reported as 100% in `X-App-Usage`,
+  once it is exceeded calls get the rate limit error (code 4)
+- FAKE_GRAPH_MEDIA_COUNT: medias of every business account, served FAKE_GRAPH_MEDIA_PAGE_SIZE at a time
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+INVALID_TOKEN = "invalid"
+
+
+@dataclass
+class FakeGraphApiSettings:
+    latency: float = 0.05
+    latency_jitter: float = 0.02
+    error_rate: float = 0.0
+    call_budget: int = 0  # 0 for no limit
+    usage_window: float = 60.0
+    media_count: int = 200
+    media_page_size: int = 25
+
+    @classmethod
+    def from_env(cls) -> "FakeGraphApiSettings":
+        return cls(
+            latency=float(os.getenv("FAKE_GRAPH_LATENCY", cls.latency)),
+            latency_jitter=float(os.getenv("FAKE_GRAPH_LATENCY_JITTER", cls.latency_jitter)),
+            error_rate=float(os.getenv("FAKE_GRAPH_ERROR_RATE", cls.error_rate)),
+            call_budget=int(os.getenv("FAKE_GRAPH_CALL_BUDGET", cls.call_budget)),
+            usage_window=float(os.getenv("FAKE_GRAPH_USAGE_WINDOW", cls.usage_window)),
+            media_count=int(os.getenv("FAKE_GRAPH_MEDIA_COUNT", cls.media_count)),
+            media_page_size=int(os.getenv("FAKE_GRAPH_MEDIA_PAGE_SIZE", cls.media_page_size)),
+        )
+
+
+class FakeGraphApi:
+    def __init__(self, settings: FakeGraphApiSettings) -> None:
+        self.settings = settings
+        self.calls: deque[float] = deque()  # call times within the usage window
+        self.counter = 0
+
+    def next_id(self) -> str:
+        self.counter += 1
+        return f"{int(time.time() * 1000)}{self.counter:06d}"
+
+    def call_count(self) -> float:
+        """Usage % of the window, as Meta reports it"""
+        now = time.monotonic()
+        self.calls.append(now)
+        while self.calls and self.calls[0] < now - self.settings.usage_window:
+            self.calls.popleft()
+        if not self.settings.call_budget:
+            return 0.0
+        return min(100.0, 100.0 * len(self.calls) / self.settings.call_budget)
+
+    async def answer(self, params: dict[str, str], handle: Any) -> JSONResponse:
+        """Delay, inject errors and report the usage around the handler of a call"""
+        delay = self.settings.latency + random.uniform(-1, 1) * self.settings.latency_jitter
+        await asyncio.sleep(max(delay, 0.0))
+        usage = self.call_count()
+        headers = {"x-app-usage": json.dumps({"call_count": usage, "total_time": usage / 2, "total_cputime": usage / 2})}
+        if params.get("access_token") == INVALID_TOKEN:
+            return JSONResponse(self.error(190, "Invalid OAuth access token.", "OAuthException"), 400, headers)
+        if usage >= 100:
+            return JSONResponse(self.error(4, "Application request limit reached"), 400, headers)
+        if random.random() < self.settings.error_rate:
+            return JSONResponse(self.error(2, "Service temporarily unavailable", transient=True), 500, headers)
+        status_code, payload = handle()
+        return JSONResponse(payload, status_code, headers)
+
+    @staticmethod
+    def error(code: int, message: str, type_: str = "GraphMethodException", transient: bool = False) -> dict[str, Any]:
+        return {"error": {"message": message, "type": type_, "code": code, "is_transient": transient}}
+
+    def me(self, params: dict[str, str]) -> tuple[int, Any]:
+        token = params.get("access_token", "")
+        return 200, {
+            "id": f"user_{zlib.crc32(token.encode())}",
+            "name": "Benchmark User",
+            "permissions": {"data": [{"permission": "instagram_basic", "status": "granted"}]},
+        }
+
+    def pages(self) -> tuple[int, Any]:
+        return 200, {"data": [
+            {"id": f"10{index}", "name": f"Page {index}", "instagram_business_account": {"id": f"1784{index}"}}
+            for index in range(3)
+        ]}
+
+    def node(self, node_id: str, params: dict[str, str]) -> tuple[int, Any]:
+        if "status_code" in params.get("fields", ""):  # a media container
+            return 200, {"id": node_id, "status_code": "FINISHED", "status": "Finished: Media has been uploaded"}
+        return 200, {"id": node_id, "about": "Benchmark page", "instagram_business_account": {"id": f"1784{node_id}"}}
+
+    def medias(self, base_url: str, account_id: str, params: dict[str, str]) -> tuple[int, Any]:
+        limit = min(int(params.get("limit", self.settings.media_page_size)), 100)
+        offset = int(params.get("after", 0))
+        end = min(offset + limit, self.settings.media_count)
+        now = int(time.time())
+        payload: dict[str, Any] = {"data": [
+            {
+                "id": f"{account_id}{index:06d}",
+                "permalink": f"https://www.instagram.com/p/{account_id}{index}/",
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S+0000", time.gmtime(now - index * 3600)),
+            }
+            for index in range(offset, end)
+        ]}
+        if end < self.settings.media_count:
+            query = "&".join(f"{key}={value}" for key, value in {**params, "after": end}.items())
+            payload["paging"] = {"cursors": {"after": str(end)}, "next": f"{base_url}?{query}"}
+        return 200, payload
+
+    @staticmethod
+    def insights(media_id: str) -> tuple[int, Any]:
+        seed = sum(map(ord, media_id))
+        return 200, {"data": [
+            {"name": metric, "period": "lifetime", "values": [{"value": seed % modulo}], "id": f"{media_id}/insights/{metric}"}
+            for metric, modulo in (("likes", 500), ("comments", 50), ("reach", 5000), ("impressions", 9000))
+        ]}
+
+    def route(self, method: str, path: str, params: dict[str, str], base_url: str) -> tuple[int, Any]:
+        """Handler of a call to `path`, without the version: `me`, `{id}/insights`..."""
+        segments = [segment for segment in path.strip("/").split("/") if segment]
+        if segments == ["me"]:
+            return self.me(params)
+        if segments == ["me", "accounts"]:
+            return self.pages()
+        if len(segments) == 1:
+            return self.node(segments[0], params)
+        node_id, edge = segments[0], segments[1]
+        if edge == "insights":
+            return self.insights(node_id)
+        if edge == "media" and method == "POST":
+            return 200, {"id": self.next_id()}
+        if edge == "media":
+            return self.medias(base_url, node_id, params)
+        if edge == "media_publish":
+            return 200, {"id": self.next_id()}
+        return 404, self.error(803, f"Unknown path {path}")
+
+    def batch(self, batch: list[dict[str, str]]) -> tuple[int, Any]:
+        answers = []
+        for sub_request in batch:
+            url = urlsplit(sub_request["relative_url"])
+            path = url.path.split("/", 1)[1] if url.path.startswith("v") else url.path
+            status_code, body = self.route(sub_request.get("method", "GET"), path, dict(parse_qsl(url.query)), "")
+            answers.append({"code": status_code, "headers": [], "body": json.dumps(body)})
+        return 200, answers
+
+
+def create_app(settings: Optional[FakeGraphApiSettings] = None) -> FastAPI:
+    fake_graph_api = FakeGraphApi(settings or FakeGraphApiSettings.from_env())
+    fast_api_app = FastAPI()
+    fast_api_app.state.fake_graph_api = fake_graph_api
+
+    async def params_of(request: Request) -> dict[str, str]:
+        params = dict(request.query_params)
+        if request.method == "POST":
+            params.update({key: value for key, value in (await request.form()).items() if isinstance(value, str)})
+        return params
+
+    @fast_api_app.post("/")
+    async def batch(request: Request) -> JSONResponse:
+        params = await params_of(request)
+        return await fake_graph_api.answer(params, lambda: fake_graph_api.batch(json.loads(params.get("batch", "[]"))))
+
+    @fast_api_app.api_route("/{version}/{path:path}", methods=["GET", "POST"])
+    async def call(version: str, path: str, request: Request) -> JSONResponse:
+        params = await params_of(request)
+        base_url = str(request.url.replace(query=""))
+        return await fake_graph_api.answer(params, lambda: fake_graph_api.route(request.method, path, params, base_url))
+
+    return fast_api_app
+
+
+app = create_app()
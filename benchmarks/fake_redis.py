@@ -0,0 +1,96 @@
+"""
+Local stand-in of a Redis server, the commands the Redis cache backend sends and nothing more:
+
+    python -m benchmarks.fake_redis --port 6399
+    CACHE_BACKEND=redis CACHE_REDIS_URL=redis://127.0.0.1:6399/0 ...
+
+Data lives in memory, in one keyspace whatever the selected db, keys expire when read.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+Value = Tuple[bytes, Optional[float]]  # value, monotonic expiry
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.data: Dict[bytes, Value] = {}
+
+    def lookup(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, arguments: List[bytes]) -> bytes:
+        command = arguments[0].upper()
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command in (b"AUTH", b"SELECT", b"QUIT"):
+            return b"+OK\r\n"
+        if command == b"GET":
+            return self.bulk(self.lookup(arguments[1]))
+        if command == b"SET":
+            return self.set(arguments[1], arguments[2], [argument.upper() for argument in arguments[3:]])
+        if command == b"DEL":
+            deleted = sum(self.lookup(key) is not None and self.data.pop(key) is not None for key in arguments[1:])
+            return b":%d\r\n" % deleted
+        if command == b"EXISTS":
+            return b":%d\r\n" % sum(self.lookup(key) is not None for key in arguments[1:])
+        if command == b"FLUSHDB":
+            self.data.clear()
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % command
+
+    def set(self, key: bytes, value: bytes, options: List[bytes]) -> bytes:
+        expires_at = None
+        if b"PX" in options:
+            expires_at = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+        elif b"EX" in options:
+            expires_at = time.monotonic() + int(options[options.index(b"EX") + 1])
+        exists = self.lookup(key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return b"$-1\r\n"
+        self.data[key] = (value, expires_at)
+        return b"+OK\r\n"
+
+    @staticmethod
+    def bulk(value: Optional[bytes]) -> bytes:
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    return
+                arguments = []
+                for _ in range(int(header[1:])):
+                    length = int((await reader.readline())[1:])
+                    arguments.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(self.execute(arguments))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def main(host: str, port: int) -> None:
+    server = await asyncio.start_server(FakeRedis().serve, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port))
@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import uuid
+from io import BytesIO
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+
+from botocore.exceptions import ClientError
+
+
+class InMemoryS3:
+    """
+    The subset of the boto3 S3 client used by `S3Service`, keeping the objects in memory.
+    Each process gets its own store, enough for a benchmark where a worker reads back what it wrote.
+    """
+
+    def __init__(self, endpoint: str = "http://s3.local") -> None:
+        self.endpoint = endpoint
+        self.objects: Dict[tuple[str, str], bytes] = {}
+        self.multipart_uploads: Dict[str, Dict[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def not_found(self, operation: str, key: str) -> ClientError:
+        return ClientError({"Error": {"Code": "404", "Message": f"{key} not found"}}, operation)
+
+    def head_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        body = self.objects.get((Bucket, Key))
+        if body is None:
+            raise self.not_found("HeadObject", Key)
+        return {"ContentLength": len(body), "ETag": hashlib.md5(body).hexdigest()}
+
+    def get_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        body = self.objects.get((Bucket, Key))
+        if body is None:
+            raise self.not_found("GetObject", Key)
+        return {"Body": BytesIO(body), "ContentLength": len(body)}
+
+    def download_fileobj(self, Bucket: str, Key: str, Fileobj: BinaryIO, **kwargs: Any) -> None:
+        Fileobj.write(self.get_object(Bucket, Key)["Body"].read())
+
+    def put_object(self, Body: bytes, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        with self._lock:
+            self.objects[(Bucket, Key)] = bytes(Body)
+        return {"ETag": hashlib.md5(Body).hexdigest()}
+
+    def upload_fileobj(self, Fileobj: BinaryIO, Bucket: str, Key: str, **kwargs: Any) -> None:
+        self.put_object(Fileobj.read(), Bucket, Key)
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self.multipart_uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Body: bytes, Bucket: str, Key: str, UploadId: str, PartNumber: int) -> Dict[str, Any]:
+        with self._lock:
+            self.multipart_uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": hashlib.md5(Body).hexdigest()}
+
+    def complete_multipart_upload(
+            self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        with self._lock:
+            parts = self.multipart_uploads.pop(UploadId)
+            self.objects[(Bucket, Key)] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+        return {"Bucket": Bucket, "Key": Key}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> Dict[str, Any]:
+        with self._lock:
+            self.multipart_uploads.pop(UploadId, None)
+        return {}
+
+    def copy_object(self, Bucket: str, Key: str, CopySource: Dict[str, str]) -> Dict[str, Any]:
+        body = self.objects.get((CopySource["Bucket"], CopySource["Key"]))
+        if body is None:
+            raise self.not_found("CopyObject", CopySource["Key"])
+        return self.put_object(body, Bucket, Key)
+
+    def delete_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod: str, Params: Dict[str, str], ExpiresIn: int = 3600) -> str:
+        return f"{self.endpoint}/{Params['Bucket']}/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+    def list_objects_v2(
+            self, Bucket: str, Prefix: str = "", ContinuationToken: Optional[str] = None, MaxKeys: int = 1000
+    ) -> Dict[str, Any]:
+        keys = sorted(key for bucket, key in list(self.objects) if bucket == Bucket and key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response: Dict[str, Any] = {
+            "Contents": [{"Key": key, "Size": len(self.objects[(Bucket, key)])} for key in page],
+            "KeyCount": len(page),
+            "IsTruncated": start + MaxKeys < len(keys),
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + MaxKeys)
+        return response
+
+    def get_paginator(self, operation_name: str) -> "InMemoryS3Paginator":
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(operation_name)
+        return InMemoryS3Paginator(self)
+
+
+class InMemoryS3Paginator:
+    def __init__(self, s3: InMemoryS3) -> None:
+        self.s3 = s3
+
+    def paginate(self, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+        token = None
+        while True:
+            page = self.s3.list_objects_v2(**kwargs, **({"ContinuationToken": token} if token else {}))
+            yield page
+            token = page.get("NextContinuationToken")
+            if not token:
+                return
@@ -0,0 +1,162 @@
+import asyncio
+import itertools
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, Callable, Dict, List
+
+import httpx
+from PIL import Image
+
+API_V1_STR = "/api/v1"
+TOKENS = [f"benchmark-token-{index}" for index in range(20)]
+BUSINESS_ACCOUNT_IDS = [f"1784{index}" for index in range(3)]
+MEDIA_IDS = [f"{1790000 + index}" for index in range(500)]
+
+RequestFactory = Callable[[int], Dict[str, Any]]  # request number -> `httpx.AsyncClient.request` kwargs
+
+
+def auth_header(number: int) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {TOKENS[number % len(TOKENS)]}"}
+
+
+def random_images(count: int, size: int = 640) -> List[bytes]:
+    """Distinct JPEGs, so that every upload goes all the way instead of hitting the content hash index"""
+    images = []
+    for _ in range(count):
+        image = Image.effect_noise((size, size), random.uniform(10, 100)).convert("RGB")
+        buffer = BytesIO()
+        image.save(buffer, "JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    build_request: RequestFactory
+
+
+def scenarios() -> Dict[str, Scenario]:
+    images: List[bytes] = []
+
+    def upload(number: int) -> Dict[str, Any]:
+        if not images:  # generated on first use only, it takes a while
+            images.extend(random_images(64))
+        return {
+            "method": "POST",
+            "url": f"{API_V1_STR}/image",
+            "headers": auth_header(number),
+            "files": {"image_file": (f"benchmark-{number}.jpg", images[number % len(images)], "image/jpeg")},
+        }
+
+    return {scenario.name: scenario for scenario in [
+        Scenario("auth", "POST /auth/facebook, token verification", lambda number: {
+            "method": "POST",
+            "url": f"{API_V1_STR}/auth/facebook",
+            "headers": auth_header(number),
+        }),
+        Scenario("publish", "POST /instagram/images, publish job submission", lambda number: {
+            "method": "POST",
+            "url": f"{API_V1_STR}/instagram/images",
+            "headers": auth_header(number),
+            "json": {
+                "instagram_business_account_id": BUSINESS_ACCOUNT_IDS[number % len(BUSINESS_ACCOUNT_IDS)],
+                "image_url": f"https://images.local/benchmark-{number}.jpg",
+                "caption": f"Benchmark post {number}",
+            },
+        }),
+        Scenario("insights", "GET /instagram/images/{media_id}/insights, snapshot read-through", lambda number: {
+            "method": "GET",
+            "url": f"{API_V1_STR}/instagram/images/{random.choice(MEDIA_IDS)}/insights",
+            "headers": auth_header(number),
+        }),
+        Scenario("medias", "GET /instagram/medias, first page of an account", lambda number: {
+            "method": "GET",
+            "url": f"{API_V1_STR}/instagram/medias",
+            "headers": auth_header(number),
+            "params": {"instagram_business_account_id": BUSINESS_ACCOUNT_IDS[number % len(BUSINESS_ACCOUNT_IDS)]},
+        }),
+        Scenario("upload", "POST /image, 640px JPEG upload", upload),
+    ]}
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    workers: int
+    concurrency: int
+    duration: float = 0.0
+    latencies: List[float] = field(default_factory=list)  # seconds, successful requests only
+    errors: Dict[str, int] = field(default_factory=dict)  # status code or exception name -> count
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies) + sum(self.errors.values())
+
+    @property
+    def requests_per_second(self) -> float:
+        return len(self.latencies) / self.duration if self.duration else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Nearest-rank percentile of the latencies, in milliseconds"""
+        if not self.latencies:
+            return math.nan
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)] * 1000
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "scenario": self.scenario,
+            "workers": self.workers,
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rps": round(self.requests_per_second, 1),
+            "p50_ms": round(self.percentile(50), 1),
+            "p95_ms": round(self.percentile(95), 1),
+            "p99_ms": round(self.percentile(99), 1),
+        }
+
+
+async def run_scenario(
+        base_url: str,
+        scenario: Scenario,
+        workers: int,
+        concurrency: int,
+        duration: float,
+        warmup: float,
+) -> ScenarioResult:
+    """
+    `concurrency` clients send requests back to back for `warmup` + `duration` seconds,
+    only the requests started after the warmup are measured
+    """
+    result = ScenarioResult(scenario.name, workers, concurrency)
+    numbers = itertools.count()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started_at = time.perf_counter()
+        measure_from = started_at + warmup
+        stop_at = measure_from + duration
+
+        async def user() -> None:
+            while (sent_at := time.perf_counter()) < stop_at:
+                request = scenario.build_request(next(numbers))
+                try:
+                    response = await client.request(**request)
+                    outcome = None if response.is_success else str(response.status_code)
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                if sent_at < measure_from:
+                    continue
+                if outcome is None:
+                    result.latencies.append(time.perf_counter() - sent_at)
+                else:
+                    result.errors[outcome] = result.errors.get(outcome, 0) + 1
+
+        await asyncio.gather(*[user() for _ in range(concurrency)])
+        result.duration = time.perf_counter() - measure_from
+    return result
@@ -0,0 +1,25 @@
+"""
+The app wired to the offline stand-ins, served by the benchmark like production would:
+
+    GRAPH_API_DOMAIN=http://127.0.0.1:8900/ DB_URL=sqlite:///bench.db \
+    gunicorn benchmarks.offline_app:app -k uvicorn.workers.UvicornWorker -w 4
+
+No AWS credentials are needed: STS and S3 are replaced before the app is created.
+"""
+from dependency_injector import containers, providers
+
+from app.container.containers import Container
+from benchmarks.fake_s3 import InMemoryS3
+
+
+@containers.override(Container)
+class OfflineContainer(containers.DeclarativeContainer):
+    sts_client = providers.Object(None)
+    temp_credentials = providers.Object(None)
+    session = providers.Object(None)
+    s3_client = providers.Singleton(InMemoryS3)
+
+
+from app.main import app  # noqa: E402  the container has to be overridden before the app is created
+
+__all__ = ["app"]
@@ -0,0 +1,181 @@
+"""
+Offline load test of the app: starts the fake Graph API, then the app under gunicorn for every
+worker count, runs the load scenarios against it and reports latency percentiles and throughput.
+
+    python -m benchmarks.run --workers 1,2,4 --duration 20 --concurrency 32
+
+S3 is kept in memory and the DB defaults to a throwaway SQLite file per worker count. SQLite ignores the
+row locks the publish job workers rely on, pass --db-url to use a local Postgres for numbers worth comparing.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+from cryptography.fernet import Fernet
+
+from benchmarks.load import ScenarioResult, run_scenario, scenarios
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma separated gunicorn worker counts")
+    parser.add_argument("--scenarios", default=",".join(scenarios()), help="comma separated scenarios")
+    parser.add_argument("--concurrency", type=int, default=32, help="clients sending requests back to back")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before each scenario")
+    parser.add_argument("--port", type=int, default=8800, help="port of the app")
+    parser.add_argument("--graph-port", type=int, default=8900, help="port of the fake Graph API")
+    parser.add_argument("--graph-latency", type=float, default=0.05, help="seconds added to every Graph call")
+    parser.add_argument("--graph-latency-jitter", type=float, default=0.02)
+    parser.add_argument("--graph-error-rate", type=float, default=0.0, help="share of Graph calls failing with a 500")
+    parser.add_argument("--graph-call-budget", type=int, default=0, help="Graph calls a minute before throttling")
+    parser.add_argument("--cache", default="memory", choices=["memory", "sqlite", "redis"],
+                        help="cache backend, redis is served by the local stand-in")
+    parser.add_argument("--redis-port", type=int, default=6399, help="port of the Redis stand-in")
+    parser.add_argument("--db-url", default=None, help="defaults to a new SQLite file")
+    parser.add_argument("--report", type=Path, default=None, help="also write the results to this JSON file")
+    return parser.parse_args()
+
+
+def start(command: List[str], env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    log_file = log_path.open("w")
+    return subprocess.Popen(
+        command, cwd=ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT, start_new_session=True
+    )
+
+
+def stop(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, log_path: Path, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited, see {log_path}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not answer within {timeout}s, see {log_path}")
+
+
+def create_schema(env: Dict[str, str]) -> None:
+    """Once before the workers start, so that they do not race to create the tables"""
+    subprocess.run(
+        [sys.executable, "-c", "from app.infrastructure.db.database import Database; import os; "
+                               "Database(os.environ['DB_URL']).create_database()"],
+        cwd=ROOT, env=env, check=True,
+    )
+
+
+def format_report(results: List[ScenarioResult]) -> str:
+    header = f"{'scenario':<10} {'workers':>7} {'requests':>9} {'errors':>7} {'req/s':>9} " \
+             f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        summary = result.summary()
+        lines.append(
+            f"{summary['scenario']:<10} {summary['workers']:>7} {summary['requests']:>9} "
+            f"{sum(summary['errors'].values()):>7} {summary['rps']:>9} "
+            f"{summary['p50_ms']:>9} {summary['p95_ms']:>9} {summary['p99_ms']:>9}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    args = parse_args()
+    available = scenarios()
+    selected = [available[name] for name in args.scenarios.split(",")]
+    worker_counts = [int(count) for count in args.workers.split(",")]
+    work_dir = Path(tempfile.mkdtemp(prefix="benchmark-"))
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "ENV_NAME": "production",  # production logging, no debug dump of every Graph call
+        "GRAPH_API_DOMAIN": f"http://127.0.0.1:{args.graph_port}/",
+        "GRAPH_API_HTTP2": "false",
+        "PUBLISH_JOBS_TOKEN_KEY": Fernet.generate_key().decode(),
+        "ACCOUNT_DISCOVERY_TOKEN_KEY": Fernet.generate_key().decode(),
+        "PUBLISH_METADATA_SPILL_PATH": str(work_dir / "publishing_metadata_spill.jsonl"),
+        "CACHE_BACKEND": args.cache,
+        "CACHE_REDIS_URL": f"redis://127.0.0.1:{args.redis_port}/0",
+        "FAKE_GRAPH_LATENCY": str(args.graph_latency),
+        "FAKE_GRAPH_LATENCY_JITTER": str(args.graph_latency_jitter),
+        "FAKE_GRAPH_ERROR_RATE": str(args.graph_error_rate),
+        "FAKE_GRAPH_CALL_BUDGET": str(args.graph_call_budget),
+    }
+    graph_log = work_dir / "fake_graph_api.log"
+    fake_graph_api = start(
+        [sys.executable, "-m", "uvicorn", "benchmarks.fake_graph_api:app", "--port", str(args.graph_port),
+         "--log-level", "warning"],
+        env, graph_log,
+    )
+    fake_redis = None
+    if args.cache == "redis":
+        fake_redis = start(
+            [sys.executable, "-m", "benchmarks.fake_redis", "--port", str(args.redis_port)],
+            env, work_dir / "fake_redis.log",
+        )
+    results: List[ScenarioResult] = []
+    try:
+        wait_until_ready(f"http://127.0.0.1:{args.graph_port}/docs", fake_graph_api, graph_log)
+        for workers in worker_counts:
+            # every worker count starts from an empty DB and cache, the runs are comparable
+            app_env = {
+                **env,
+                "DB_URL": args.db_url or f"sqlite:///{work_dir / f'benchmark_{workers}_workers.db'}",
+                "CACHE_SQLITE_PATH": str(work_dir / f"cache_{workers}_workers.sqlite3"),
+                "CACHE_KEY_PREFIX": f"benchmark-{workers}-workers",
+            }
+            create_schema(app_env)
+            app_log = work_dir / f"app_{workers}_workers.log"
+            app = start(
+                [sys.executable, "-m", "gunicorn", "benchmarks.offline_app:app", "-k", "uvicorn.workers.UvicornWorker",
+                 "-w", str(workers), "-b", f"127.0.0.1:{args.port}", "--log-level", "warning"],
+                app_env, app_log,
+            )
+            try:
+                wait_until_ready(f"http://127.0.0.1:{args.port}/docs", app, app_log)
+                for scenario in selected:
+                    result = asyncio.run(run_scenario(
+                        f"http://127.0.0.1:{args.port}", scenario, workers, args.concurrency, args.duration, args.warmup
+                    ))
+                    print(f"{scenario.name} with {workers} workers: {json.dumps(result.summary())}", flush=True)
+                    results.append(result)
+            finally:
+                stop(app)
+    finally:
+        stop(fake_graph_api)
+        if fake_redis is not None:
+            stop(fake_redis)
+    print()
+    print(format_report(results))
+    print(f"\nlogs in {work_dir}")
+    if args.report is not None:
+        report: Dict[str, Any] = {"arguments": {key: str(value) for key, value in vars(args).items()},
+                                  "results": [result.summary() for result in results]}
+        args.report.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()